@@ -1,16 +1,30 @@
 # camera_clip.py
 
+import io
 import time
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import cv2
+import numpy as np
 from imutils.video import VideoStream
 from datetime import datetime, timedelta
 from typing import Optional
+from camera_health import CAMERA_HEALTH, CameraUnavailable
+from camera_routes import CAMERA_ROUTES
+from config import EXIT_FRAME_STREAMING
 from logger import logger
+from metrics import LatencyWindow
+from rtsp_streams import STREAM_MANAGER
 import os
 os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = "timeout;5000" # 5 seconds 
 
+try:
+    import av
+except Exception:  # pragma: no cover - optional dep
+    av = None  # type: ignore
+
 def is_valid_mp4(path: str) -> bool:
     """Return True if the file at ``path`` can be opened and read as MP4."""
     if not os.path.isfile(path):
@@ -38,6 +52,23 @@ VIDEO_CLIPS_DIR = "video_clips"
 os.makedirs(VIDEO_CLIPS_DIR, exist_ok=True)
 
 
+def _clip_params(start_dt: datetime, end_dt: datetime, segment_name: str) -> dict:
+    """Query parameters of a ``dataloader.cgi`` clip download."""
+    return {
+        "dw":        "sd",
+        "filename":  segment_name,
+        "starttime": start_dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "endtime":   end_dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "index":     0,
+        "sid":       0,
+    }
+
+
+def _record_http_failure(camera_ip: str, op: str, exc: Exception) -> None:
+    kind = "connect" if isinstance(exc, requests.ConnectionError) else "read"
+    CAMERA_HEALTH.record(camera_ip, op, False, kind=kind, error=type(exc).__name__)
+
+
 def request_camera_clip(
     camera_ip: str,
     username: str,
@@ -51,15 +82,17 @@ def request_camera_clip(
     Attempt up to 3 times (0, +5s, +5s) to fetch a 20 s MP4 from the camera.
     Uses a 30 second read timeout each attempt.
     Returns the saved filepath on success, or None on permanent failure.
+    Returns None at once, and stops retrying, while the camera's circuit is
+    open.  Each attempt uses the address ``CAMERA_ROUTES`` currently prefers.
     """
-    base_params = {
-        "dw":        "sd",
-        "filename":  segment_name,
-        "starttime": start_dt.strftime("%Y-%m-%d %H:%M:%S"),
-        "endtime":   end_dt.strftime("%Y-%m-%d %H:%M:%S"),
-        "index":     0,
-        "sid":       0,
-    }
+    host = CAMERA_ROUTES.resolve(camera_ip, "http")
+    try:
+        CAMERA_HEALTH.check(host)
+    except CameraUnavailable as e:
+        logger.warning(f"{e}; skipping clip download")
+        return None
+
+    base_params = _clip_params(start_dt, end_dt, segment_name)
     out_name = (
         f"{VIDEO_CLIPS_DIR}/clip_"
         f"{start_dt.strftime('%Y%m%d_%H%M%S')}_{end_dt.strftime('%H%M%S')}"
@@ -67,14 +100,15 @@ def request_camera_clip(
     if unique_tag:
         out_name += f"_{unique_tag}"
     out_name += ".mp4"
-    url = f"http://{camera_ip}/dataloader.cgi"
 
     max_retries = 2
     for attempt in range(max_retries + 1):
+        url = f"http://{host}/dataloader.cgi"
         params = base_params | {"uuid": str(uuid.uuid4())}
+        start = time.monotonic()
         try:
             logger.debug(
-                f"Attempt {attempt+1}/{max_retries+1}: requesting clip {out_name} from {camera_ip}"
+                f"Attempt {attempt+1}/{max_retries+1}: requesting clip {out_name} from {host}"
             )
             with requests.get(
                 url,
@@ -84,6 +118,7 @@ def request_camera_clip(
                 timeout=30,
             ) as r:
                 r.raise_for_status()
+                CAMERA_HEALTH.record(host, "clip", True, time.monotonic() - start)
                 with open(out_name, "wb") as f:
                     for chunk in r.iter_content(chunk_size=8192):
                         f.write(chunk)
@@ -96,12 +131,35 @@ def request_camera_clip(
             return out_name
 
         except Exception as e:
+            if isinstance(e, requests.RequestException):
+                _record_http_failure(host, "clip", e)
             logger.error(f"Clip fetch attempt {attempt+1} failed: {e}", exc_info=True)
-            if attempt < max_retries:
-                time.sleep(5)
-            else:
+            if attempt >= max_retries:
                 logger.error(f"All {max_retries+1} attempts to fetch clip failed.")
                 return None
+            host = CAMERA_ROUTES.resolve(camera_ip, "http")
+            if not CAMERA_HEALTH.allow(host):
+                logger.error(f"Camera {host} circuit opened, giving up on clip.")
+                return None
+            time.sleep(5)
+
+
+class FetchCancelled(RuntimeError):
+    """Raised when a frame grab is abandoned through its cancel event."""
+
+
+def _open_rtsp(camera_ip: str, username: str, password: str, rtsp_path: str):
+    """Start reading ``rtsp_path`` on the camera; callers ``stop()`` the result.
+
+    With stream pooling enabled this leases a warm session from
+    ``STREAM_MANAGER`` and ``stop()`` hands it back instead of closing it.
+    """
+    if not rtsp_path.startswith("/"):
+        rtsp_path = "/" + rtsp_path
+    rtsp_url = f"rtsp://{username}:{password}@{camera_ip}:554{rtsp_path}"
+    if STREAM_MANAGER.enabled:
+        return STREAM_MANAGER.lease(rtsp_url)
+    return VideoStream(rtsp_url).start()
 
 
 def fetch_camera_frame(
@@ -110,6 +168,7 @@ def fetch_camera_frame(
     password: str,
     rtsp_path: str = "/",
     max_attempts: int = 20,
+    cancel_event: threading.Event | None = None,
 ) -> bytes:
     """Return a JPEG snapshot from the camera using RTSP.
 
@@ -117,22 +176,29 @@ def fetch_camera_frame(
     ``/Streaming/Channels/101``). The stream is opened once and up to
     ``max_attempts`` frames are read, sleeping briefly between tries, until
     a valid frame is obtained. If no frame is read the function raises
-    ``RuntimeError``.
+    ``RuntimeError``.  Setting ``cancel_event`` stops polling early with
+    ``FetchCancelled``.  With stream pooling enabled a warm session usually
+    has a frame on the first read.  Raises ``CameraUnavailable`` without
+    connecting while the camera's circuit is open.
     """
 
-    if not rtsp_path.startswith("/"):
-        rtsp_path = "/" + rtsp_path
-    rtsp_url = f"rtsp://{username}:{password}@{camera_ip}:554{rtsp_path}"
-    stream = VideoStream(rtsp_url).start()
+    host = CAMERA_ROUTES.resolve(camera_ip, "rtsp")
+    CAMERA_HEALTH.check(host)
+    start = time.monotonic()
+    stream = _open_rtsp(host, username, password, rtsp_path)
     try:
         for _ in range(max_attempts):
+            if cancel_event is not None and cancel_event.is_set():
+                raise FetchCancelled("Frame grab cancelled")
             frame = stream.read()
             if frame is not None:
+                CAMERA_HEALTH.record(host, "rtsp", True, time.monotonic() - start)
                 ok, buf = cv2.imencode(".jpg", frame)
                 if not ok:
                     raise RuntimeError("Failed to encode frame as JPEG")
                 return buf.tobytes()
             time.sleep(0.1)
+        CAMERA_HEALTH.record(host, "rtsp", False, kind="connect", error="no frame")
         raise RuntimeError(
             f"Failed to read frame from RTSP stream after {max_attempts} attempts"
         )
@@ -140,6 +206,126 @@ def fetch_camera_frame(
         stream.stop()
 
 
+def fetch_camera_burst(
+    camera_ip: str,
+    username: str,
+    password: str,
+    rtsp_path: str = "/",
+    frames: int = 5,
+    interval: float = 0.1,
+    max_attempts: int = 40,
+    cancel_event: threading.Event | None = None,
+) -> list[np.ndarray]:
+    """Return up to ``frames`` distinct decoded BGR frames from one RTSP session.
+
+    Frames are polled every ``interval`` seconds for at most ``max_attempts``
+    reads.  Raises ``RuntimeError`` if no frame at all could be read.
+    """
+
+    host = CAMERA_ROUTES.resolve(camera_ip, "rtsp")
+    CAMERA_HEALTH.check(host)
+    start = time.monotonic()
+    stream = _open_rtsp(host, username, password, rtsp_path)
+    collected: list[np.ndarray] = []
+    try:
+        for _ in range(max_attempts):
+            if cancel_event is not None and cancel_event.is_set():
+                raise FetchCancelled("Frame grab cancelled")
+            frame = stream.read()
+            # The reader thread replaces the array for every decoded frame, so
+            # an identical object means no new frame arrived yet.
+            if frame is not None and not any(frame is f for f in collected):
+                collected.append(frame)
+                if len(collected) >= frames:
+                    break
+            time.sleep(interval)
+        if not collected:
+            CAMERA_HEALTH.record(host, "rtsp", False, kind="connect", error="no frame")
+            raise RuntimeError(
+                f"Failed to read frame from RTSP stream after {max_attempts} attempts"
+            )
+        CAMERA_HEALTH.record(host, "rtsp", True, time.monotonic() - start)
+        return collected
+    finally:
+        stream.stop()
+
+
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="frame-prefetch")
+_prefetch_lock = threading.Lock()
+_prefetch_counts = {"started": 0, "hits": 0, "wasted": 0, "failed": 0}
+_prefetch_saved = 0.0
+
+
+def _count_prefetch(key: str) -> None:
+    with _prefetch_lock:
+        _prefetch_counts[key] += 1
+
+
+class FramePrefetch:
+    """Run a frame grab in the background while other work is in flight.
+
+    ``fetch`` is called as ``fetch(*args, cancel_event=..., **kwargs)`` on a
+    small shared pool.  Callers either consume the frame with ``result()``
+    or abandon it with ``cancel()``; both outcomes are counted.
+    """
+
+    def __init__(self, fetch, *args, **kwargs):
+        self._cancel = threading.Event()
+        self._started_at = time.monotonic()
+        self._finished_at: float | None = None
+        self._settled = False
+        self._future = _PREFETCH_POOL.submit(self._run, fetch, args, kwargs)
+        _count_prefetch("started")
+
+    def _run(self, fetch, args, kwargs) -> bytes:
+        try:
+            return fetch(*args, cancel_event=self._cancel, **kwargs)
+        finally:
+            self._finished_at = time.monotonic()
+
+    def result(self, timeout: float | None = None) -> bytes:
+        """Return the prefetched frame, waiting for it if needed."""
+        global _prefetch_saved
+        wait_start = time.monotonic()
+        try:
+            frame = self._future.result(timeout=timeout)
+        except Exception:
+            self._settle("failed")
+            raise
+        # Time the caller did not have to spend opening the stream itself.
+        fetch_time = (self._finished_at or wait_start) - self._started_at
+        saved = fetch_time - (time.monotonic() - wait_start)
+        with _prefetch_lock:
+            _prefetch_saved += max(0.0, saved)
+        self._settle("hits")
+        return frame
+
+    def cancel(self) -> None:
+        """Abandon the grab; an RTSP read in progress stops at its next poll."""
+        if self._settled:
+            return
+        self._cancel.set()
+        self._future.cancel()
+        self._settle("wasted")
+
+    def _settle(self, outcome: str) -> None:
+        if not self._settled:
+            self._settled = True
+            _count_prefetch(outcome)
+
+
+def prefetch_stats() -> dict:
+    with _prefetch_lock:
+        counts = dict(_prefetch_counts)
+        saved = _prefetch_saved
+    settled = counts["hits"] + counts["wasted"]
+    return {
+        **counts,
+        "hit_rate": round(counts["hits"] / settled, 4) if settled else 0.0,
+        "saved_seconds": round(saved, 3),
+    }
+
+
 def frame_from_video(path: str) -> bytes:
     """Return the first frame of a video file encoded as JPEG bytes."""
 
@@ -159,17 +345,154 @@ def frame_from_video(path: str) -> bytes:
         cap.release()
 
 
+class _ResponseReader(io.RawIOBase):
+    """Read-only, non-seekable file over a streamed ``requests`` response."""
+
+    def __init__(self, response, chunk_size: int = 16384):
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        self._pending = b""
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(buf), len(self._pending))
+        buf[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        self.bytes_read += n
+        return n
+
+
+_exit_lock = threading.Lock()
+_exit_counts = {
+    mode: {"frames": 0, "failed": 0, "bytes": 0}
+    for mode in ("stream", "download")
+}
+_exit_latency = {"stream": LatencyWindow(), "download": LatencyWindow()}
+_exit_fallbacks = 0
+
+
+def _record_exit(mode: str, ok: bool, nbytes: int, seconds: float) -> None:
+    with _exit_lock:
+        counts = _exit_counts[mode]
+        counts["frames" if ok else "failed"] += 1
+        counts["bytes"] += nbytes
+    if ok:
+        _exit_latency[mode].add(seconds)
+
+
+def exit_frame_stats() -> dict:
+    """Bytes transferred and time-to-frame of EXIT frame extraction per mode."""
+    with _exit_lock:
+        counts = {mode: dict(c) for mode, c in _exit_counts.items()}
+        fallbacks = _exit_fallbacks
+    for mode, c in counts.items():
+        c["avg_bytes"] = round(c["bytes"] / c["frames"]) if c["frames"] else 0
+        c["time_to_frame"] = _exit_latency[mode].snapshot()
+    return {
+        "streaming": EXIT_FRAME_STREAMING and av is not None,
+        "fallbacks": fallbacks,
+        **counts,
+    }
+
+
+def stream_clip_frame(
+    camera_ip: str,
+    username: str,
+    password: str,
+    start_dt: datetime,
+    end_dt: datetime,
+    offset: float = 0.0,
+    timeout: float = 30,
+) -> bytes:
+    """Return the clip frame at or just before ``offset`` seconds as JPEG.
+
+    The ``dataloader.cgi`` response is demuxed and decoded with PyAV while it
+    downloads, and the transfer is closed as soon as the frame is known, so
+    only the start of the clip crosses the network.
+    """
+    if av is None:
+        raise RuntimeError("PyAV is not installed")
+    host = CAMERA_ROUTES.resolve(camera_ip, "http")
+    CAMERA_HEALTH.check(host)
+    start = time.monotonic()
+    params = _clip_params(start_dt, end_dt, start_dt.strftime("%Y%m%d%H%M%S"))
+    params["uuid"] = str(uuid.uuid4())
+    reader = None
+    try:
+        with requests.get(
+            f"http://{host}/dataloader.cgi",
+            params=params,
+            auth=(username, password),
+            stream=True,
+            timeout=timeout,
+        ) as r:
+            r.raise_for_status()
+            CAMERA_HEALTH.record(host, "clip", True, time.monotonic() - start)
+            reader = _ResponseReader(r)
+            best = None
+            with av.open(reader, mode="r") as container:
+                for frame in container.decode(video=0):
+                    t = frame.time or 0.0
+                    if best is None or t <= offset:
+                        best = frame
+                    if t >= offset:
+                        break
+            if best is None:
+                raise RuntimeError("No video frame in exit clip")
+            ok, buf = cv2.imencode(".jpg", best.to_ndarray(format="bgr24"))
+            if not ok:
+                raise RuntimeError("Failed to encode frame as JPEG")
+    except Exception as e:
+        if isinstance(e, requests.RequestException):
+            _record_http_failure(host, "clip", e)
+        _record_exit("stream", False, reader.bytes_read if reader else 0, time.monotonic() - start)
+        raise
+    _record_exit("stream", True, reader.bytes_read, time.monotonic() - start)
+    return buf.tobytes()
+
+
 def fetch_exit_frame(
     camera_ip: str,
     username: str,
     password: str,
     event_time: datetime,
 ) -> bytes:
-    """Return a JPEG frame from 1 second before ``event_time`` via clip download."""
+    """Return a JPEG frame from 1 second before ``event_time`` via clip download.
+
+    With PyAV installed (and ``EXIT_FRAME_STREAMING`` on) the frame is
+    decoded from the streamed response, stopping the download early; the
+    full download is the fallback.
+    """
+    global _exit_fallbacks
 
     start_dt = event_time - timedelta(seconds=0)
     end_dt = start_dt + timedelta(seconds=5)
 
+    if EXIT_FRAME_STREAMING and av is not None:
+        try:
+            return stream_clip_frame(
+                camera_ip,
+                username,
+                password,
+                start_dt,
+                end_dt,
+                offset=(event_time - start_dt).total_seconds(),
+            )
+        except CameraUnavailable:
+            raise
+        except Exception:
+            logger.warning("Streaming exit frame failed, downloading the clip", exc_info=True)
+            with _exit_lock:
+                _exit_fallbacks += 1
+
+    start = time.monotonic()
     clip_path = request_camera_clip(
         camera_ip=camera_ip,
         username=username,
@@ -179,10 +502,17 @@ def fetch_exit_frame(
         segment_name=start_dt.strftime("%Y%m%d%H%M%S"),
     )
     if not clip_path:
+        _record_exit("download", False, 0, time.monotonic() - start)
         raise RuntimeError("Failed to fetch exit clip")
 
+    nbytes = os.path.getsize(clip_path)
     try:
         frame_bytes = frame_from_video(clip_path)
+    except Exception:
+        _record_exit("download", False, nbytes, time.monotonic() - start)
+        raise
+    else:
+        _record_exit("download", True, nbytes, time.monotonic() - start)
         return frame_bytes
     finally:
         try:
@@ -0,0 +1,252 @@
+# camera_health.py
+
+import socket
+import threading
+import time
+from datetime import datetime
+
+from config import (
+    CAMERA_BREAKER_FAILURES,
+    CAMERA_BREAKER_COOLDOWN,
+    CAMERA_PROBE_INTERVAL,
+)
+from logger import logger
+from metrics import LatencyWindow
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CameraUnavailable(RuntimeError):
+    """Raised instead of contacting a camera whose circuit is open."""
+
+
+def tcp_probe(ip: str, ports=(554, 80), timeout: float = 2.0) -> bool:
+    """Return True if any of ``ports`` accepts a TCP connection."""
+    for port in ports:
+        try:
+            with socket.create_connection((ip, port), timeout=timeout):
+                return True
+        except OSError:
+            continue
+    return False
+
+
+class _Entry:
+    def __init__(self):
+        self.state = CLOSED
+        self.consecutive = 0
+        self.successes = 0
+        self.connect_failures = 0
+        self.read_failures = 0
+        self.rejected = 0
+        self.opened_at: float | None = None
+        self.trial_at: float | None = None
+        self.last_ok: datetime | None = None
+        self.last_failure: datetime | None = None
+        self.last_error: str | None = None
+        self.latency: dict[str, LatencyWindow] = {}
+
+
+class CameraHealth:
+    """Connect/read outcomes and latency per camera IP, with a circuit breaker.
+
+    After ``failure_threshold`` consecutive failures a camera's circuit opens
+    and ``check`` raises ``CameraUnavailable`` at once instead of letting the
+    caller wait on timeouts.  A background thread probes open cameras every
+    ``probe_interval`` seconds; one that answers on TCP, or has been open for
+    ``cooldown`` seconds, is half open: a single trial call goes through while
+    the others are still rejected, and only a real frame or clip closes the
+    circuit (a failed trial reopens it).  A trial that
+    never reports back is replaced after another ``cooldown``.
+    ``failure_threshold=0`` only records outcomes and never opens.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        cooldown: float = 60.0,
+        probe_interval: float = 10.0,
+        probe=tcp_probe,
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self._probe = probe
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._prober: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def _entry(self, ip: str) -> _Entry:
+        entry = self._entries.get(ip)
+        if entry is None:
+            entry = self._entries[ip] = _Entry()
+        return entry
+
+    def _rejecting(self, entry: _Entry | None, now: float) -> bool:
+        if entry is None or entry.state == CLOSED:
+            return False
+        if entry.state == OPEN:
+            return now - entry.opened_at < self.cooldown
+        return entry.trial_at is not None and now - entry.trial_at < self.cooldown
+
+    def allow(self, ip: str) -> bool:
+        """Return False while the circuit of ``ip`` is open.
+
+        Once the cooldown has passed, only the caller that gets True may
+        contact the camera until it records an outcome.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(ip)
+            if entry is None or entry.state == CLOSED:
+                return True
+            if self._rejecting(entry, now):
+                entry.rejected += 1
+                return False
+            entry.state = HALF_OPEN
+            entry.trial_at = now
+            return True
+
+    def is_open(self, ip: str) -> bool:
+        """True while calls to ``ip`` would be rejected (no state change)."""
+        with self._lock:
+            return self._rejecting(self._entries.get(ip), time.monotonic())
+
+    def check(self, ip: str) -> None:
+        """Raise ``CameraUnavailable`` if the circuit of ``ip`` is open."""
+        if not self.allow(ip):
+            raise CameraUnavailable(f"Camera {ip} is unavailable (circuit open)")
+
+    def record(
+        self,
+        ip: str,
+        op: str,
+        ok: bool,
+        seconds: float | None = None,
+        kind: str = "read",
+        error: str | None = None,
+    ) -> None:
+        """Record the outcome of one ``op`` (``rtsp``, ``clip``) on ``ip``.
+
+        ``kind`` tells a failure to connect (``connect``) from a failure once
+        connected (``read``).
+        """
+        opened = False
+        with self._lock:
+            entry = self._entry(ip)
+            if seconds is not None and ok:
+                latency = entry.latency.get(op)
+                if latency is None:
+                    latency = entry.latency[op] = LatencyWindow()
+                latency.add(seconds)
+            if ok:
+                entry.successes += 1
+                entry.consecutive = 0
+                entry.last_ok = datetime.now()
+                entry.state = CLOSED
+                entry.opened_at = None
+                entry.trial_at = None
+                return
+            if kind == "connect":
+                entry.connect_failures += 1
+            else:
+                entry.read_failures += 1
+            entry.consecutive += 1
+            entry.last_failure = datetime.now()
+            entry.last_error = f"{op}: {error}" if error else op
+            if (
+                self.failure_threshold > 0
+                and entry.consecutive >= self.failure_threshold
+                and entry.state != OPEN
+            ):
+                entry.state = OPEN
+                entry.opened_at = time.monotonic()
+                entry.trial_at = None
+                opened = True
+        if opened:
+            logger.warning("Camera %s circuit opened after %d failures", ip, self.failure_threshold)
+            self._ensure_prober()
+
+    def probe_open(self) -> None:
+        """Probe every open camera once and half-open the circuits that answer.
+
+        Accepting a TCP connection does not prove the camera streams, so the
+        next call is the trial that decides whether the circuit closes.
+        """
+        with self._lock:
+            ips = [ip for ip, e in self._entries.items() if e.state == OPEN]
+        for ip in ips:
+            try:
+                alive = self._probe(ip)
+            except Exception:
+                alive = False
+            if not alive:
+                continue
+            with self._lock:
+                entry = self._entry(ip)
+                if entry.state != OPEN:
+                    continue
+                entry.state = HALF_OPEN
+                entry.trial_at = None
+            logger.info("Camera %s answered probe, circuit half open", ip)
+
+    def _run_prober(self) -> None:
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.probe_open()
+            except Exception:
+                logger.error("Camera health probe failed", exc_info=True)
+
+    def _ensure_prober(self) -> None:
+        if self._prober is not None or self.probe_interval <= 0:
+            return
+        with self._lock:
+            if self._prober is None:
+                self._stop.clear()
+                self._prober = threading.Thread(target=self._run_prober, name="camera-probe", daemon=True)
+                self._prober.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._prober = None
+
+    def snapshot(self, ip: str) -> dict | None:
+        """Health of one camera IP, or ``None`` if it was never contacted."""
+        with self._lock:
+            entry = self._entries.get(ip)
+            if entry is None:
+                return None
+            latency = dict(entry.latency)
+            data = {
+                "state": entry.state,
+                "consecutive_failures": entry.consecutive,
+                "successes": entry.successes,
+                "connect_failures": entry.connect_failures,
+                "read_failures": entry.read_failures,
+                "rejected": entry.rejected,
+                "open_for_s": (
+                    round(time.monotonic() - entry.opened_at, 1) if entry.opened_at is not None else None
+                ),
+                "last_ok": entry.last_ok.isoformat() if entry.last_ok else None,
+                "last_failure": entry.last_failure.isoformat() if entry.last_failure else None,
+                "last_error": entry.last_error,
+            }
+        data["latency"] = {op: window.snapshot() for op, window in latency.items()}
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            states = [e.state for e in self._entries.values()]
+            rejected = sum(e.rejected for e in self._entries.values())
+        return {
+            "failure_threshold": self.failure_threshold,
+            "cooldown": self.cooldown,
+            "tracked": len(states),
+            "open": states.count(OPEN),
+            "half_open": states.count(HALF_OPEN),
+            "rejected": rejected,
+        }
+
+
+CAMERA_HEALTH = CameraHealth(CAMERA_BREAKER_FAILURES, CAMERA_BREAKER_COOLDOWN, CAMERA_PROBE_INTERVAL)
@@ -0,0 +1,216 @@
+# camera_routes.py
+
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from camera_health import CAMERA_HEALTH
+from config import CAMERA_ROUTE_INTERVAL, CAMERA_ROUTE_SWITCH_MARGIN
+from logger import logger
+
+SERVICES = {"rtsp": 554, "http": 80}
+
+
+def _first_request(ip: str, service: str) -> bytes:
+    if service == "rtsp":
+        return f"OPTIONS rtsp://{ip}:554/ RTSP/1.0\r\nCSeq: 1\r\n\r\n".encode()
+    return f"HEAD /dataloader.cgi HTTP/1.0\r\nHost: {ip}\r\n\r\n".encode()
+
+
+def measure_route(ip: str, service: str, timeout: float = 2.0) -> dict | None:
+    """Connect and first-byte latency in seconds of ``service`` on ``ip``.
+
+    A minimal RTSP ``OPTIONS`` or HTTP ``HEAD`` request is sent; any answer
+    counts (an authentication error still proves the route works).  Returns
+    ``None`` when the route does not answer within ``timeout``.
+    """
+    start = time.monotonic()
+    try:
+        with socket.create_connection((ip, SERVICES[service]), timeout=timeout) as sock:
+            connected = time.monotonic()
+            sock.sendall(_first_request(ip, service))
+            if not sock.recv(1):
+                return None
+            answered = time.monotonic()
+    except OSError:
+        return None
+    return {"connect": connected - start, "first_byte": answered - start}
+
+
+class _Route:
+    def __init__(self, p_ip: str, vpn_ip: str):
+        self.addresses = (p_ip, vpn_ip)
+        self.chosen = {service: p_ip for service in SERVICES}
+        self.measured: dict[tuple[str, str], dict | None] = {}
+        self.switches = 0
+
+
+class CameraRoutes:
+    """Pick the faster of a camera's public and VPN address per service.
+
+    Cameras are identified by ``p_ip`` as everywhere else; ``register`` adds
+    their ``vpn_ip``.  Every ``interval`` seconds both addresses are measured
+    for RTSP and for HTTP (``dataloader.cgi``) in the background.  A route is
+    only replaced by one that answers at least ``switch_margin`` faster, or
+    when it stops answering.  ``resolve`` returns the chosen address, and
+    fails over to the other one while the chosen address's circuit is open.
+    ``interval=0`` disables selection and ``resolve`` returns ``p_ip``.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.0,
+        switch_margin: float = 0.2,
+        measure=measure_route,
+        health=CAMERA_HEALTH,
+        max_workers: int = 8,
+    ):
+        self.interval = interval
+        self.switch_margin = switch_margin
+        self._measure = measure
+        self._health = health
+        self._max_workers = max_workers
+        self._routes: dict[str, _Route] = {}
+        self._lock = threading.Lock()
+        self._loader = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._counts = {"measurements": 0, "unreachable": 0, "switches": 0, "failovers": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def register(self, p_ip: str, vpn_ip: str | None) -> None:
+        """Record (or drop, when ``vpn_ip`` is empty) the VPN address of a camera."""
+        with self._lock:
+            if not vpn_ip or vpn_ip == p_ip:
+                self._routes.pop(p_ip, None)
+            elif p_ip not in self._routes or self._routes[p_ip].addresses[1] != vpn_ip:
+                self._routes[p_ip] = _Route(p_ip, vpn_ip)
+
+    def resolve(self, camera_ip: str, service: str = "rtsp") -> str:
+        """Address to contact the camera known as ``camera_ip`` on ``service``."""
+        if not self.enabled:
+            return camera_ip
+        with self._lock:
+            route = self._routes.get(camera_ip)
+            if route is None:
+                return camera_ip
+            chosen = route.chosen[service]
+            other = next(a for a in route.addresses if a != chosen)
+        if self._health.is_open(chosen) and not self._health.is_open(other):
+            with self._lock:
+                self._counts["failovers"] += 1
+            return other
+        return chosen
+
+    def _update(self, p_ip: str, service: str, results: dict) -> None:
+        with self._lock:
+            route = self._routes.get(p_ip)
+            if route is None:
+                return
+            for address, result in results.items():
+                route.measured[(address, service)] = result
+            current = route.chosen[service]
+            other = next(a for a in route.addresses if a != current)
+            cur, alt = results.get(current), results.get(other)
+            if alt is None:
+                return
+            if cur is not None and alt["first_byte"] >= cur["first_byte"] * (1 - self.switch_margin):
+                return
+            route.chosen[service] = other
+            route.switches += 1
+            self._counts["switches"] += 1
+        logger.info("Camera %s now uses %s for %s", p_ip, other, service)
+
+    def measure_all(self) -> None:
+        """Measure both addresses of every registered camera once."""
+        if self._loader is not None:
+            try:
+                for p_ip, vpn_ip in self._loader():
+                    self.register(p_ip, vpn_ip)
+            except Exception:
+                logger.error("Failed loading camera routes", exc_info=True)
+        with self._lock:
+            jobs = [
+                (p_ip, service, address)
+                for p_ip, route in self._routes.items()
+                for service in SERVICES
+                for address in route.addresses
+            ]
+        if not jobs:
+            return
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="route-probe") as pool:
+            measured = list(pool.map(lambda job: self._measure(job[2], job[1]), jobs))
+        grouped: dict[tuple[str, str], dict] = {}
+        for (p_ip, service, address), result in zip(jobs, measured):
+            grouped.setdefault((p_ip, service), {})[address] = result
+        with self._lock:
+            self._counts["measurements"] += len(jobs)
+            self._counts["unreachable"] += sum(1 for r in measured if r is None)
+        for (p_ip, service), results in grouped.items():
+            self._update(p_ip, service, results)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.measure_all()
+            except Exception:
+                logger.error("Camera route measurement failed", exc_info=True)
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self, loader=None) -> None:
+        """Measure in the background; ``loader()`` yields ``(p_ip, vpn_ip)`` pairs."""
+        self._loader = loader
+        if self._thread is None and self.enabled:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="camera-routes", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def snapshot(self, p_ip: str) -> dict | None:
+        """Chosen address and last measurements per service for one camera."""
+
+        def _ms(result):
+            if result is None:
+                return None
+            return {k: round(v * 1000.0, 1) for k, v in result.items()}
+
+        with self._lock:
+            route = self._routes.get(p_ip)
+            if route is None:
+                return None
+            return {
+                service: {
+                    "chosen": route.chosen[service],
+                    "measured": {
+                        address: _ms(route.measured.get((address, service)))
+                        for address in route.addresses
+                    },
+                }
+                for service in SERVICES
+            } | {"switches": route.switches}
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            via_vpn = sum(
+                1 for route in self._routes.values() if route.chosen["rtsp"] == route.addresses[1]
+            )
+            cameras = len(self._routes)
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "cameras": cameras,
+            "rtsp_via_vpn": via_vpn,
+            **counts,
+        }
+
+
+CAMERA_ROUTES = CameraRoutes(CAMERA_ROUTE_INTERVAL, CAMERA_ROUTE_SWITCH_MARGIN)
@@ -20,11 +20,226 @@ OCR_TOKEN = os.environ.get("OCR_TOKEN")
 # credentials.  The global constants previously defined here have been
 # deprecated.
 
+# ─────────────────────────────────────────────────────────────────────────────
+# OCR engine endpoints
+# ─────────────────────────────────────────────────────────────────────────────
+# `OCR_URLS` may list several comma separated endpoints.  Requests go to the
+# fastest healthy endpoint and are hedged to the next one when they run past
+# the observed p95 (disable with `OCR_HEDGE=0`).  Timeouts adapt to recent
+# latency between `OCR_MIN_TIMEOUT` and `OCR_MAX_TIMEOUT` seconds.
+OCR_URLS = [
+    u.strip()
+    for u in os.environ.get(
+        "OCR_URLS",
+        "https://parkonic.cloud/ParkonicJLT/anpr/engine/process",
+    ).split(",")
+    if u.strip()
+]
+OCR_HEDGE_ENABLED = os.environ.get("OCR_HEDGE", "1") != "0"
+OCR_MIN_TIMEOUT = float(os.environ.get("OCR_MIN_TIMEOUT", "2"))
+OCR_MAX_TIMEOUT = float(os.environ.get("OCR_MAX_TIMEOUT", "10"))
+OCR_MAX_ATTEMPTS = int(os.environ.get("OCR_MAX_ATTEMPTS", "3"))
+
+# OCR engine selection.  `OCR_POLICY` is one of ``cloud`` (default),
+# ``local``, ``local_first``, ``cloud_first`` or ``local_then_cloud`` (use the
+# local read unless its confidence is below `LOCAL_OCR_MIN_CONFIDENCE`).  The
+# local engine is an ONNX CRNN at `LOCAL_OCR_MODEL_PATH` decoding characters
+# from `LOCAL_OCR_CHARSET`; `LOCAL_OCR_CITY` is reported as ``cityName``.
+OCR_POLICY = os.environ.get("OCR_POLICY", "cloud")
+LOCAL_OCR_MODEL_PATH = os.environ.get("LOCAL_OCR_MODEL_PATH", "")
+LOCAL_OCR_CHARSET = os.environ.get(
+    "LOCAL_OCR_CHARSET", "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ-"
+)
+LOCAL_OCR_CITY = os.environ.get("LOCAL_OCR_CITY", "")
+LOCAL_OCR_MIN_CONFIDENCE = int(os.environ.get("LOCAL_OCR_MIN_CONFIDENCE", "7"))
+
+# Size/quality budget for outbound images.  Plate crops sent to OCR and the
+# images uploaded with park-in are scaled to at most `*_IMAGE_MAX_DIM` pixels
+# on the longest side and re-encoded as JPEG at `*_IMAGE_QUALITY`, lowering
+# the quality (then the size) until they fit `*_IMAGE_MAX_BYTES`.  Disable
+# with `IMAGE_BUDGET=0`.
+IMAGE_BUDGET_ENABLED = os.environ.get("IMAGE_BUDGET", "1") != "0"
+OCR_IMAGE_MAX_DIM = int(os.environ.get("OCR_IMAGE_MAX_DIM", "640"))
+OCR_IMAGE_QUALITY = int(os.environ.get("OCR_IMAGE_QUALITY", "90"))
+OCR_IMAGE_MAX_BYTES = int(os.environ.get("OCR_IMAGE_MAX_BYTES", "150000"))
+PARKIN_IMAGE_MAX_DIM = int(os.environ.get("PARKIN_IMAGE_MAX_DIM", "1280"))
+PARKIN_IMAGE_QUALITY = int(os.environ.get("PARKIN_IMAGE_QUALITY", "80"))
+PARKIN_IMAGE_MAX_BYTES = int(os.environ.get("PARKIN_IMAGE_MAX_BYTES", "200000"))
+
+# JPEG decoder for snapshots: ``auto`` uses libjpeg-turbo through PyTurboJPEG
+# when installed (reduced-scale and ROI-only decoding) and OpenCV otherwise
+# (reduced-scale decoding only); ``opencv`` forces OpenCV.
+IMAGE_DECODER = os.environ.get("IMAGE_DECODER", "auto")
+
+# Successful reads are cached per spot by a perceptual hash of the plate crop
+# so that re-reported cars do not hit the paid OCR engine again.  Set
+# `OCR_CACHE_SIZE=0` to disable.
+OCR_CACHE_SIZE = int(os.environ.get("OCR_CACHE_SIZE", "512"))
+OCR_CACHE_TTL = float(os.environ.get("OCR_CACHE_TTL", "600"))
+OCR_CACHE_MAX_DISTANCE = int(os.environ.get("OCR_CACHE_MAX_DISTANCE", "8"))
+
+# Grab the fallback RTSP frame speculatively while the first OCR request is in
+# flight.  Set `FRAME_PREFETCH=0` to only grab it after an UNREAD result.
+FRAME_PREFETCH_ENABLED = os.environ.get("FRAME_PREFETCH", "1") != "0"
+
+# How the UNREAD fallback reads a fresh frame: ``single`` grabs one frame,
+# ``best_frame`` grabs a burst of `OCR_BURST_FRAMES` frames, runs the plate
+# detector on all of them in one batch and sends only the sharpest, largest
+# plate crop to OCR.
+OCR_FALLBACK_MODE = os.environ.get("OCR_FALLBACK_MODE", "single")
+OCR_BURST_FRAMES = int(os.environ.get("OCR_BURST_FRAMES", "5"))
+
+# Keep up to `RTSP_STREAM_POOL` RTSP sessions open between frame grabs so the
+# newest frame is already decoded when it is asked for (`0` opens a stream per
+# grab).  Sessions unused for `RTSP_STREAM_IDLE` seconds are closed, and one
+# whose frame has not changed for `RTSP_STREAM_STALE` seconds is reopened.
+RTSP_STREAM_POOL = int(os.environ.get("RTSP_STREAM_POOL", "0"))
+RTSP_STREAM_IDLE = float(os.environ.get("RTSP_STREAM_IDLE", "60"))
+RTSP_STREAM_STALE = float(os.environ.get("RTSP_STREAM_STALE", "5"))
+
+# Decode the EXIT frame from the `dataloader.cgi` response while it downloads
+# and drop the connection once the frame is found (needs PyAV).  Set
+# `EXIT_FRAME_STREAMING=0` to always download the whole clip first.
+EXIT_FRAME_STREAMING = os.environ.get("EXIT_FRAME_STREAMING", "1") != "0"
+
+# A camera IP with `CAMERA_BREAKER_FAILURES` consecutive failed grabs or clip
+# downloads is skipped for `CAMERA_BREAKER_COOLDOWN` seconds, or until it
+# answers a TCP probe (sent every `CAMERA_PROBE_INTERVAL` seconds).  Set
+# `CAMERA_BREAKER_FAILURES=0` to only record camera health.
+CAMERA_BREAKER_FAILURES = int(os.environ.get("CAMERA_BREAKER_FAILURES", "3"))
+CAMERA_BREAKER_COOLDOWN = float(os.environ.get("CAMERA_BREAKER_COOLDOWN", "60"))
+CAMERA_PROBE_INTERVAL = float(os.environ.get("CAMERA_PROBE_INTERVAL", "10"))
+
+# Cameras with a `vpn_ip` are measured over both addresses every
+# `CAMERA_ROUTE_INTERVAL` seconds (`0` always uses `p_ip`), separately for
+# RTSP and `dataloader.cgi`.  The other address is chosen when the current one
+# stops answering or the other is at least `CAMERA_ROUTE_SWITCH_MARGIN`
+# (a fraction) faster to its first byte.
+CAMERA_ROUTE_INTERVAL = float(os.environ.get("CAMERA_ROUTE_INTERVAL", "0"))
+CAMERA_ROUTE_SWITCH_MARGIN = float(os.environ.get("CAMERA_ROUTE_SWITCH_MARGIN", "0.2"))
+
+# `/camera-frames` grabs at most `CAMERA_FRAMES_CONCURRENCY` frames at once
+# across all requests and gives up on a camera after `CAMERA_FRAMES_TIMEOUT`
+# seconds.
+CAMERA_FRAMES_CONCURRENCY = int(os.environ.get("CAMERA_FRAMES_CONCURRENCY", "8"))
+CAMERA_FRAMES_TIMEOUT = float(os.environ.get("CAMERA_FRAMES_TIMEOUT", "15"))
+
+# `/cameras/{id}/frame` serves a frame grabbed within the last
+# `FRAME_PREVIEW_TTL` seconds, and concurrent requests for one camera share a
+# single grab.  Scaled previews are cached with it, up to
+# `FRAME_PREVIEW_MAX_ENTRIES` frames and previews in total.
+FRAME_PREVIEW_TTL = float(os.environ.get("FRAME_PREVIEW_TTL", "2"))
+FRAME_PREVIEW_MAX_ENTRIES = int(os.environ.get("FRAME_PREVIEW_MAX_ENTRIES", "256"))
+
+# Spot bboxes are cached per camera for `SPOT_INDEX_TTL` seconds; the /spots
+# endpoints refresh the cache immediately.
+SPOT_INDEX_TTL = float(os.environ.get("SPOT_INDEX_TTL", "300"))
+
+# Skip OCR and ticketing when a spot still shows the car of its last accepted
+# image.  The previous image's SIFT features and hash are kept per spot (at
+# most `SPOT_FEATURE_CACHE_SIZE` in memory, persisted as ``.npz`` files in
+# ``spot_last``) so each check only extracts features from the new frame.
+SAME_CAR_CHECK = os.environ.get("SAME_CAR_CHECK", "0") == "1"
+SPOT_FEATURE_CACHE_SIZE = int(os.environ.get("SPOT_FEATURE_CACHE_SIZE", "512"))
+
+# Stages of the same-car comparison, cheapest first.  ``hash`` decides on
+# perceptual-hash distance, ``orb`` on ORB matches (Hamming distance) and
+# ``sift`` on SIFT + RANSAC; a stage that is not confident passes the pair on.
+# Pairs no stage decides are treated as different cars.
+SAME_CAR_STAGES = os.environ.get("SAME_CAR_STAGES", "hash,orb,sift")
+# dHash distance (of 64 bits) from which the hash stage calls a different car.
+SAME_CAR_DHASH_DIFFERENT = int(os.environ.get("SAME_CAR_DHASH_DIFFERENT", "22"))
+# ORB decides only with at least `SAME_CAR_ORB_MIN_MATCHES` good matches:
+# same car at an inlier ratio >= `SAME_CAR_ORB_SAME_RATIO`, different below
+# `SAME_CAR_ORB_DIFFERENT_RATIO`.
+SAME_CAR_ORB_MIN_MATCHES = int(os.environ.get("SAME_CAR_ORB_MIN_MATCHES", "30"))
+SAME_CAR_ORB_SAME_RATIO = float(os.environ.get("SAME_CAR_ORB_SAME_RATIO", "0.6"))
+SAME_CAR_ORB_DIFFERENT_RATIO = float(os.environ.get("SAME_CAR_ORB_DIFFERENT_RATIO", "0.2"))
+
 # ─────────────────────────────────────────────────────────────────────────────
 # YOLO model path (on CPU)
 # ─────────────────────────────────────────────────────────────────────────────
 YOLO_MODEL_PATH = "models/car.pt"
 
+# Candidate detector weights (``POST /detector/candidate``) are only loaded
+# from inside this directory; ultralytics unpickles them.
+DETECTOR_WEIGHTS_DIR = os.environ.get("DETECTOR_WEIGHTS_DIR", "models")
+
+# Run the plate detector only on the camera-reported vehicle box (intersected
+# with the spot bbox, padded by `VEHICLE_ROI_MARGIN`) instead of the whole spot
+# crop.  Falls back to the full crop when the box is missing, implausible or
+# yields no plate.  Disabled by default; enable with `VEHICLE_ROI=1`.
+VEHICLE_ROI_ENABLED = os.environ.get("VEHICLE_ROI", "0") == "1"
+VEHICLE_ROI_MARGIN = float(os.environ.get("VEHICLE_ROI_MARGIN", "0.1"))
+
+# Short-circuit ENTRY events whose spot crop barely differs from the last
+# processed one, before the detector, enhancement and OCR run.  Crops are
+# compared as `MOTION_GATE_THUMB` px grayscale thumbnails with
+# `MOTION_GATE_METHOD` (``absdiff``: mean absolute difference in grey levels,
+# ``ssim``: 1 - SSIM).  Scores below the threshold count as unchanged.
+# `MOTION_GATE_THRESHOLD` defaults to 4 grey levels for ``absdiff`` and 0.05
+# for ``ssim`` and can be overridden per camera/spot with ``motion_threshold``
+# / ``motion_threshold_overrides`` in location parameters.
+MOTION_GATE_ENABLED = os.environ.get("MOTION_GATE", "0") == "1"
+MOTION_GATE_METHOD = os.environ.get("MOTION_GATE_METHOD", "absdiff")
+_motion_threshold = os.environ.get("MOTION_GATE_THRESHOLD", "")
+MOTION_GATE_THRESHOLD = float(_motion_threshold) if _motion_threshold else None
+MOTION_GATE_THUMB = int(os.environ.get("MOTION_GATE_THUMB", "64"))
+
+# Run the plate detector once on the whole camera frame and assign the plates
+# to every spot of that camera instead of one pass per spot crop.  Results are
+# shared for `FRAME_ANALYSIS_WINDOW` seconds; a plate belongs to a spot when at
+# least `FRAME_ANALYSIS_MIN_CONTAINMENT` of its box lies inside the spot.
+CAMERA_FRAME_ANALYSIS = os.environ.get("CAMERA_FRAME_ANALYSIS", "0") == "1"
+FRAME_ANALYSIS_WINDOW = float(os.environ.get("FRAME_ANALYSIS_WINDOW", "2"))
+FRAME_ANALYSIS_MIN_CONTAINMENT = float(os.environ.get("FRAME_ANALYSIS_MIN_CONTAINMENT", "0.6"))
+# Skip an entry event before any model runs when its spot crop's
+# `SPOT_HASH_BITS`-bit average hash (64 or 256) is within
+# `FRAME_CHANGE_MAX_DISTANCE` bits of the last accepted crop of that spot.
+# With `CAMERA_FRAME_ANALYSIS` the whole-frame detector is also skipped when
+# no spot crop of the camera changed since the last analysed frame.
+FRAME_CHANGE_GATE = os.environ.get("FRAME_CHANGE_GATE", "0") == "1"
+FRAME_CHANGE_MAX_DISTANCE = int(os.environ.get("FRAME_CHANGE_MAX_DISTANCE", "2"))
+SPOT_HASH_BITS = int(os.environ.get("SPOT_HASH_BITS", "64"))
+
+# Cheaper model answering only "is a vehicle in this spot?" for EXIT checks
+# and occupancy sweeps.  `PRESENCE_MODEL_PATH` may point to a small YOLO
+# classifier (classes named ``empty``/``vacant`` mean a free spot) or a small
+# detector.  When unset the plate detector answers the check at the camera's
+# input size and any box counts as a vehicle, unless `PRESENCE_IMGSZ` opts in
+# to a reduced input size (with `PRESENCE_CONF` applied).  `PRESENCE_IMGSZ`
+# also sets the presence model's input size.  `PRESENCE_SHADOW_RATE` is the
+# fraction of checks also run through the full detector to measure agreement
+# and latency.
+PRESENCE_MODEL_PATH = os.environ.get("PRESENCE_MODEL_PATH", "")
+PRESENCE_IMGSZ = int(os.environ.get("PRESENCE_IMGSZ", "0"))
+PRESENCE_CONF = float(os.environ.get("PRESENCE_CONF", "0.25"))
+PRESENCE_SHADOW_RATE = float(os.environ.get("PRESENCE_SHADOW_RATE", "0"))
+
+# Periodic occupancy sweep for spots with open tickets, every
+# `OCCUPANCY_SWEEP_INTERVAL` seconds (`0` disables).  One frame is grabbed per
+# camera and all its ticketed spots are checked in one presence inference.
+# A spot found empty `OCCUPANCY_SWEEP_CONFIRMATIONS` sweeps in a row has its
+# ticket closed (`OCCUPANCY_SWEEP_ACTION=close`) or only flagged (``flag``).
+# At most `OCCUPANCY_SWEEP_WORKERS` cameras are grabbed at once, and at most
+# `OCCUPANCY_SWEEP_PER_POLE` per pole.
+OCCUPANCY_SWEEP_INTERVAL = float(os.environ.get("OCCUPANCY_SWEEP_INTERVAL", "0"))
+OCCUPANCY_SWEEP_ACTION = os.environ.get("OCCUPANCY_SWEEP_ACTION", "flag")
+OCCUPANCY_SWEEP_CONFIRMATIONS = int(os.environ.get("OCCUPANCY_SWEEP_CONFIRMATIONS", "2"))
+OCCUPANCY_SWEEP_WORKERS = int(os.environ.get("OCCUPANCY_SWEEP_WORKERS", "4"))
+OCCUPANCY_SWEEP_PER_POLE = int(os.environ.get("OCCUPANCY_SWEEP_PER_POLE", "1"))
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CPU thread budget
+# ─────────────────────────────────────────────────────────────────────────────
+# Cores shared by torch, OpenCV and ONNX Runtime (`0` = all cores the process
+# may run on).  `INFERENCE_WORKERS` is the number of threads that run models
+# concurrently; each gets an equal share of the budget as intra-op threads.
+# `CPU_PIN_CORES` optionally pins the process to cores such as ``"0-3"``.
+CPU_THREAD_BUDGET = int(os.environ.get("CPU_THREAD_BUDGET", "0"))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+CPU_PIN_CORES = os.environ.get("CPU_PIN_CORES", "")
+
 # RealESRGAN model weights path
 REAL_ESRGAN_MODEL_PATH = os.environ.get(
     "REAL_ESRGAN_MODEL_PATH",
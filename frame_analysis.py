@@ -0,0 +1,218 @@
+# frame_analysis.py
+
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from metrics import LatencyWindow
+
+
+def _as_numpy(values) -> np.ndarray:
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return np.asarray(values, dtype=np.float32)
+
+
+def boxes_from_results(results) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(xyxy (N, 4), conf (N,))`` arrays from detector results."""
+    if not results or not results[0].boxes:
+        return np.zeros((0, 4), np.float32), np.zeros((0,), np.float32)
+    boxes = results[0].boxes
+    xyxy = _as_numpy(boxes.xyxy).reshape(-1, 4)
+    conf = getattr(boxes, "conf", None)
+    conf = _as_numpy(conf).reshape(-1) if conf is not None else np.ones(len(xyxy), np.float32)
+    return xyxy, conf
+
+
+def overlap_matrices(boxes: np.ndarray, spots: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """IoU and containment of every box against every spot.
+
+    ``boxes`` is ``(N, 4)`` and ``spots`` is ``(M, 4)`` in ``x1, y1, x2, y2``.
+    Returns two ``(N, M)`` arrays: IoU, and the fraction of each box's area
+    lying inside each spot.
+    """
+    b = boxes[:, None, :]
+    s = spots[None, :, :]
+    iw = np.clip(np.minimum(b[..., 2], s[..., 2]) - np.maximum(b[..., 0], s[..., 0]), 0, None)
+    ih = np.clip(np.minimum(b[..., 3], s[..., 3]) - np.maximum(b[..., 1], s[..., 1]), 0, None)
+    inter = iw * ih
+    box_area = ((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))[:, None]
+    spot_area = ((spots[:, 2] - spots[:, 0]) * (spots[:, 3] - spots[:, 1]))[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = np.where(inter > 0, inter / (box_area + spot_area - inter), 0.0)
+        containment = np.where(box_area > 0, inter / box_area, 0.0)
+    return iou, containment
+
+
+def assign_to_spots(
+    boxes: np.ndarray,
+    conf: np.ndarray,
+    spots: np.ndarray,
+    min_containment: float = 0.6,
+) -> np.ndarray:
+    """Return for each spot the index of its best box, or ``-1``.
+
+    A box belongs to the spot containing the largest share of it (ties go to
+    the higher IoU) when that share is at least ``min_containment``.  Each
+    spot keeps its most confident box.
+    """
+    best = np.full(len(spots), -1, dtype=np.int64)
+    if len(boxes) == 0 or len(spots) == 0:
+        return best
+    iou, containment = overlap_matrices(boxes, spots)
+    owner = np.argmax(containment + 1e-6 * iou, axis=1)
+    owned = containment[np.arange(len(boxes)), owner] >= min_containment
+    # Visit boxes from least to most confident so the best one wins.
+    for i in np.argsort(conf):
+        if owned[i]:
+            best[owner[i]] = i
+    return best
+
+
+@dataclass
+class SpotDetection:
+    spot_number: int
+    occupied: bool
+    plate_box: tuple[int, int, int, int] | None  # frame coordinates
+    confidence: float | None
+
+
+class CameraFrameAnalyzer:
+    """Run the detector once per camera frame and share it across spots.
+
+    The result for a camera is reused for ``window`` seconds, and callers
+    arriving while an analysis for the same camera is running wait for it
+    instead of starting their own inference.  With a ``hashes`` table the
+    result is also reused after the window when no spot crop has changed by
+    more than ``max_change`` hash bits since the last analysed frame.
+    """
+
+    def __init__(
+        self,
+        detect,
+        window: float = 2.0,
+        min_containment: float = 0.6,
+        hashes=None,
+        max_change: int = 2,
+    ):
+        self._detect = detect
+        self.window = window
+        self.min_containment = min_containment
+        self.hashes = hashes
+        self.max_change = max_change
+        self._gate_latency = LatencyWindow()
+        self._geometry: dict[int, tuple] = {}
+        self._results: dict[int, tuple[float, dict[int, SpotDetection]]] = {}
+        self._camera_locks: dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._latency = LatencyWindow()
+        self._counts = {
+            "analyses": 0,
+            "reused": 0,
+            "spot_lookups": 0,
+            "plates_assigned": 0,
+            "fallbacks": 0,
+            "unchanged_frames": 0,
+        }
+
+    def _camera_lock(self, camera_id: int) -> threading.Lock:
+        with self._lock:
+            return self._camera_locks.setdefault(camera_id, threading.Lock())
+
+    def _fresh(self, camera_id: int) -> dict[int, SpotDetection] | None:
+        entry = self._results.get(camera_id)
+        if entry is not None and time.monotonic() - entry[0] <= self.window:
+            return entry[1]
+        return None
+
+    def analyze(self, camera_id: int, frame: np.ndarray, spots, imgsz: int | None = None) -> dict[int, SpotDetection]:
+        """Return ``{spot_number: SpotDetection}`` for every spot of the camera.
+
+        ``spots`` is a sequence of objects with ``spot_number`` and ``bbox``.
+        """
+        with self._camera_lock(camera_id):
+            cached = self._fresh(camera_id)
+            if cached is not None:
+                with self._lock:
+                    self._counts["reused"] += 1
+                return cached
+
+            keys = packed = None
+            if self.hashes is not None:
+                start = time.monotonic()
+                keys = [(camera_id, s.spot_number) for s in spots]
+                packed = self.hashes.hash_frame(frame, spots)
+                changed = self.hashes.changed(keys, packed, self.max_change)
+                self._gate_latency.add(time.monotonic() - start)
+                geometry = tuple((s.spot_number, tuple(s.bbox)) for s in spots)
+                previous = self._results.get(camera_id)
+                if (
+                    previous is not None
+                    and not changed.any()
+                    and self._geometry.get(camera_id) == geometry
+                ):
+                    self._results[camera_id] = (time.monotonic(), previous[1])
+                    with self._lock:
+                        self._counts["unchanged_frames"] += 1
+                    return previous[1]
+
+            start = time.monotonic()
+            boxes, conf = boxes_from_results(self._detect(frame, imgsz))
+            spot_boxes = np.array([s.bbox for s in spots], dtype=np.float32).reshape(-1, 4)
+            best = assign_to_spots(boxes, conf, spot_boxes, self.min_containment)
+            self._latency.add(time.monotonic() - start)
+
+            result = {}
+            for spot, idx in zip(spots, best):
+                if idx < 0:
+                    result[spot.spot_number] = SpotDetection(spot.spot_number, False, None, None)
+                else:
+                    box = tuple(int(v) for v in boxes[idx])
+                    result[spot.spot_number] = SpotDetection(
+                        spot.spot_number, True, box, float(conf[idx])
+                    )
+            self._results[camera_id] = (time.monotonic(), result)
+            if packed is not None:
+                self.hashes.update(keys, packed)
+                self._geometry[camera_id] = geometry
+            with self._lock:
+                self._counts["analyses"] += 1
+                self._counts["plates_assigned"] += int((best >= 0).sum())
+            return result
+
+    def spot(self, camera_id: int, spot_number: int, frame: np.ndarray, spots, imgsz: int | None = None):
+        with self._lock:
+            self._counts["spot_lookups"] += 1
+        return self.analyze(camera_id, frame, spots, imgsz).get(spot_number)
+
+    def record_fallback(self) -> None:
+        """Count a spot that needed its own detection pass after all."""
+        with self._lock:
+            self._counts["fallbacks"] += 1
+
+    def invalidate(self, camera_id: int | None = None) -> None:
+        with self._lock:
+            if camera_id is None:
+                self._results.clear()
+            else:
+                self._results.pop(camera_id, None)
+        if self.hashes is not None:
+            self.hashes.forget(camera_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts["spot_lookups"]
+        return {
+            **counts,
+            "inferences_saved": counts["reused"],
+            "reuse_rate": round(counts["reused"] / lookups, 4) if lookups else None,
+            "latency": self._latency.snapshot(),
+            "change_gate": {
+                "enabled": self.hashes is not None,
+                "max_change": self.max_change,
+                "latency": self._gate_latency.snapshot(),
+            },
+        }
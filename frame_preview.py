@@ -0,0 +1,134 @@
+# frame_preview.py
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import cv2
+
+from config import FRAME_PREVIEW_TTL, FRAME_PREVIEW_MAX_ENTRIES
+from image_decode import decode, image_size
+from metrics import LatencyWindow
+
+
+def scale_jpeg(data: bytes, width: int | None = None, quality: int | None = None) -> bytes:
+    """Re-encode a JPEG at most ``width`` pixels wide and at ``quality``.
+
+    Frames narrower than ``width`` are not enlarged.  The frame is decoded at
+    the smallest JPEG scale that is still at least ``width`` wide.
+    """
+    max_dim = None
+    if width:
+        w, h = image_size(data)
+        max_dim = math.ceil(width * max(w, h) / w)
+    rgb = decode(data, max_dim=max_dim, op="preview")
+    if rgb is None:
+        raise ValueError("Cannot decode frame")
+    h, w = rgb.shape[:2]
+    if width and w > width:
+        rgb = cv2.resize(rgb, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if quality else []
+    ok, buf = cv2.imencode(".jpg", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise RuntimeError("Failed to encode preview")
+    return buf.tobytes()
+
+
+class FramePreviews:
+    """Short-lived cache of camera frames with single-flight grabs.
+
+    ``get(key, grab)`` returns the frame grabbed for ``key`` within the last
+    ``ttl`` seconds.  Otherwise it calls ``grab()``, and concurrent callers
+    for the same key wait for that one grab instead of starting their own.
+    Scaled variants (``width``/``quality``) are derived from the cached frame
+    and cached alongside it.  Failed grabs are not cached.  ``ttl=0`` still
+    coalesces concurrent requests but keeps nothing.
+    """
+
+    def __init__(self, ttl: float = 2.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._frames: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+        self._grab_latency = LatencyWindow()
+        self._counts = {"requests": 0, "hits": 0, "misses": 0, "coalesced": 0, "scaled": 0, "errors": 0}
+
+    def _store(self, key: tuple, grabbed_at: float, data: bytes) -> None:
+        if self.ttl <= 0:
+            return
+        self._frames[key] = (grabbed_at, data)
+        self._frames.move_to_end(key)
+        while len(self._frames) > self.max_entries:
+            self._frames.popitem(last=False)
+
+    def _frame(self, key, grab) -> tuple[float, bytes]:
+        """Return ``(grabbed_at, jpeg)`` for ``key``, grabbing at most once at a time."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._frames.get((key,))
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._counts["hits"] += 1
+                return entry
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self._counts["misses"] += 1
+            else:
+                self._counts["coalesced"] += 1
+        if not owner:
+            return future.result()
+
+        start = time.monotonic()
+        try:
+            data = grab()
+        except BaseException as exc:
+            with self._lock:
+                self._counts["errors"] += 1
+                del self._inflight[key]
+            future.set_exception(exc)
+            raise
+        self._grab_latency.add(time.monotonic() - start)
+        result = (time.monotonic(), data)
+        with self._lock:
+            self._store((key,), *result)
+            del self._inflight[key]
+        future.set_result(result)
+        return result
+
+    def get(self, key, grab, width: int | None = None, quality: int | None = None) -> bytes:
+        """JPEG frame for ``key``, scaled when ``width`` or ``quality`` is given."""
+        with self._lock:
+            self._counts["requests"] += 1
+        grabbed_at, data = self._frame(key, grab)
+        if not width and not quality:
+            return data
+        variant = (key, width, quality)
+        with self._lock:
+            entry = self._frames.get(variant)
+            if entry is not None and entry[0] == grabbed_at:
+                return entry[1]
+        scaled = scale_jpeg(data, width, quality)
+        with self._lock:
+            self._counts["scaled"] += 1
+            self._store(variant, grabbed_at, scaled)
+        return scaled
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            entries = len(self._frames)
+        served = counts["hits"] + counts["misses"] + counts["coalesced"]
+        return {
+            "ttl": self.ttl,
+            "entries": entries,
+            **counts,
+            "hit_rate": round((counts["hits"] + counts["coalesced"]) / served, 4) if served else 0.0,
+            "grab_latency": self._grab_latency.snapshot(),
+        }
+
+
+FRAME_PREVIEWS = FramePreviews(FRAME_PREVIEW_TTL, FRAME_PREVIEW_MAX_ENTRIES)
@@ -0,0 +1,174 @@
+# image_budget.py
+
+import base64
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from config import (
+    IMAGE_BUDGET_ENABLED,
+    OCR_IMAGE_MAX_DIM,
+    OCR_IMAGE_QUALITY,
+    OCR_IMAGE_MAX_BYTES,
+    PARKIN_IMAGE_MAX_DIM,
+    PARKIN_IMAGE_QUALITY,
+    PARKIN_IMAGE_MAX_BYTES,
+)
+from logger import logger
+
+
+class ImageBudget:
+    """Resize and re-encode outbound images to a size and quality budget.
+
+    Images are scaled so their longest side is at most ``max_dim`` and saved
+    as JPEG at ``quality``.  While the result is larger than ``max_bytes`` the
+    quality is lowered in steps down to ``min_quality`` and then the image is
+    scaled down further.  JPEGs already within the budget are passed through
+    untouched.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_dim: int,
+        quality: int,
+        max_bytes: int,
+        min_quality: int = 50,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.max_dim = max_dim
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.min_quality = min(min_quality, quality)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counts = {"images": 0, "reencoded": 0, "bytes_in": 0, "bytes_out": 0, "cache_hits": 0}
+
+    def _save(self, img: Image.Image, quality: int) -> bytes:
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality, optimize=True)
+        return buf.getvalue()
+
+    def _encode(self, data: bytes) -> tuple[bytes, bool]:
+        img = Image.open(io.BytesIO(data))
+        too_big = self.max_dim > 0 and max(img.size) > self.max_dim
+        if img.format == "JPEG" and not too_big and len(data) <= self.max_bytes:
+            return data, False
+
+        if too_big and img.format == "JPEG":
+            # Let libjpeg decode at a reduced scale that still covers max_dim.
+            scale = self.max_dim / max(img.size)
+            img.draft("RGB", (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        img = img.convert("RGB")
+        if too_big:
+            img.thumbnail((self.max_dim, self.max_dim), Image.LANCZOS)
+        resized = too_big
+        quality = self.quality
+        out = self._save(img, quality)
+        while len(out) > self.max_bytes:
+            if quality > self.min_quality:
+                quality = max(self.min_quality, quality - 10)
+            elif min(img.size) > 32:
+                img = img.resize((max(1, int(img.width * 0.8)), max(1, int(img.height * 0.8))), Image.LANCZOS)
+                resized = True
+            else:
+                break
+            out = self._save(img, quality)
+        if not resized and len(out) >= len(data):
+            return data, False
+        return out, True
+
+    def encode(self, data: bytes) -> bytes:
+        """Return ``data`` re-encoded to fit the budget (or unchanged)."""
+        if not self.enabled:
+            return data
+        try:
+            out, reencoded = self._encode(data)
+        except Exception:
+            logger.error("Image budget %s: re-encoding failed", self.name, exc_info=True)
+            out, reencoded = data, False
+        with self._lock:
+            self._counts["images"] += 1
+            self._counts["reencoded"] += int(reencoded)
+            self._counts["bytes_in"] += len(data)
+            self._counts["bytes_out"] += len(out)
+        return out
+
+    def _hit(self) -> None:
+        with self._lock:
+            self._counts["cache_hits"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["saved_ratio"] = (
+            round(1 - counts["bytes_out"] / counts["bytes_in"], 4) if counts["bytes_in"] else None
+        )
+        return {
+            "enabled": self.enabled,
+            "max_dim": self.max_dim,
+            "quality": self.quality,
+            "max_bytes": self.max_bytes,
+            **counts,
+        }
+
+
+OCR_BUDGET = ImageBudget(
+    "ocr", OCR_IMAGE_MAX_DIM, OCR_IMAGE_QUALITY, OCR_IMAGE_MAX_BYTES, enabled=IMAGE_BUDGET_ENABLED
+)
+PARKIN_BUDGET = ImageBudget(
+    "park_in",
+    PARKIN_IMAGE_MAX_DIM,
+    PARKIN_IMAGE_QUALITY,
+    PARKIN_IMAGE_MAX_BYTES,
+    enabled=IMAGE_BUDGET_ENABLED,
+)
+
+# Encoded images keyed by (budget, path, mtime, size).  Snapshot folders are
+# per event, so a retry or a second upload of the same event reuses the
+# encoding instead of re-reading and re-compressing the file.
+_ENCODED: OrderedDict[tuple, bytes] = OrderedDict()
+_ENCODED_MAX = 128
+_encoded_lock = threading.Lock()
+
+
+def budget_file(path: str, budget: ImageBudget) -> bytes:
+    """Return the bytes of the image at ``path`` encoded for ``budget``."""
+    st = os.stat(path)
+    key = (budget.name, os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _encoded_lock:
+        cached = _ENCODED.get(key)
+        if cached is not None:
+            _ENCODED.move_to_end(key)
+    if cached is not None:
+        budget._hit()
+        return cached
+
+    with open(path, "rb") as f:
+        out = budget.encode(f.read())
+    with _encoded_lock:
+        _ENCODED[key] = out
+        while len(_ENCODED) > _ENCODED_MAX:
+            _ENCODED.popitem(last=False)
+    return out
+
+
+def budget_b64(path: str, budget: ImageBudget) -> str:
+    """Return the budgeted image at ``path`` as a base64 string."""
+    return base64.b64encode(budget_file(path, budget)).decode("utf-8")
+
+
+def budget_b64_data(data_b64: str, budget: ImageBudget) -> str:
+    """Return a base64 image (e.g. a stored ticket image) encoded for ``budget``."""
+    if not budget.enabled:
+        return data_b64
+    return base64.b64encode(budget.encode(base64.b64decode(data_b64))).decode("utf-8")
+
+
+def image_budget_stats() -> dict:
+    return {"ocr": OCR_BUDGET.stats(), "park_in": PARKIN_BUDGET.stats()}
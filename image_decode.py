@@ -0,0 +1,247 @@
+# image_decode.py
+
+import argparse
+import io
+import math
+import threading
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from config import IMAGE_DECODER
+from logger import logger
+from metrics import LatencyWindow
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY, TJPF_RGB
+except Exception:  # pragma: no cover - optional dep
+    TurboJPEG = None  # type: ignore
+
+
+REDUCTIONS = (1, 2, 4, 8)
+_CV_REDUCED = {
+    (2, False): cv2.IMREAD_REDUCED_COLOR_2,
+    (4, False): cv2.IMREAD_REDUCED_COLOR_4,
+    (8, False): cv2.IMREAD_REDUCED_COLOR_8,
+    (2, True): cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    (4, True): cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    (8, True): cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+# MCU width/height per libjpeg-turbo subsampling (444, 422, 420, gray, 440, 411).
+_MCU = {0: (8, 8), 1: (16, 8), 2: (16, 16), 3: (8, 8), 4: (8, 16), 5: (32, 8)}
+
+_turbo = None
+_turbo_lock = threading.Lock()
+
+
+def _turbojpeg():
+    """Shared ``TurboJPEG`` handle, or ``None`` when unavailable or disabled."""
+    global _turbo
+    if TurboJPEG is None or IMAGE_DECODER == "opencv":
+        return None
+    with _turbo_lock:
+        if _turbo is None:
+            try:
+                _turbo = TurboJPEG()
+            except Exception:
+                logger.warning("libjpeg-turbo not usable, decoding with OpenCV", exc_info=True)
+                _turbo = False
+    return _turbo or None
+
+
+def is_jpeg(data: bytes) -> bool:
+    return data[:2] == b"\xff\xd8"
+
+
+def image_size(data: bytes) -> tuple[int, int]:
+    """``(width, height)`` from the image header without decoding pixels."""
+    turbo = _turbojpeg()
+    if turbo is not None and is_jpeg(data):
+        width, height, _, _ = turbo.decode_header(data)
+        return width, height
+    return Image.open(io.BytesIO(data)).size
+
+
+def reduction_for(width: int, height: int, max_dim: int | None) -> int:
+    """Largest JPEG scale-down (1, 2, 4 or 8) keeping the long side >= ``max_dim``."""
+    if not max_dim:
+        return 1
+    longest = max(width, height)
+    best = 1
+    for r in REDUCTIONS:
+        if math.ceil(longest / r) >= max_dim:
+            best = r
+    return best
+
+
+class _DecodeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency: dict[str, LatencyWindow] = defaultdict(LatencyWindow)
+        self._counts: dict[str, dict] = defaultdict(
+            lambda: {"images": 0, "errors": 0, "reduced": 0, "roi": 0, "pixels": 0, "backend": {}}
+        )
+
+    def record(self, op: str, seconds: float, backend: str, out, reduction: int = 1, roi: bool = False):
+        with self._lock:
+            c = self._counts[op]
+            c["images"] += 1
+            c["reduced"] += int(reduction > 1)
+            c["roi"] += int(roi)
+            c["pixels"] += int(out.shape[0] * out.shape[1]) if out is not None else 0
+            c["errors"] += int(out is None)
+            c["backend"][backend] = c["backend"].get(backend, 0) + 1
+            latency = self._latency[op]
+        latency.add(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            ops = {op: {**c, "backend": dict(c["backend"])} for op, c in self._counts.items()}
+            latency = dict(self._latency)
+        for op, c in ops.items():
+            c["latency"] = latency[op].snapshot()
+        return ops
+
+
+_STATS = _DecodeStats()
+
+
+def _cv_decode(data: bytes, reduction: int, gray: bool) -> np.ndarray | None:
+    flag = _CV_REDUCED.get((reduction, gray), cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR)
+    arr = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if arr is None or gray:
+        return arr
+    return cv2.cvtColor(arr, cv2.COLOR_BGR2RGB)
+
+
+def decode(data: bytes, *, max_dim: int | None = None, gray: bool = False, op: str = "decode") -> np.ndarray | None:
+    """Decode image bytes to an RGB (or grayscale) array.
+
+    With ``max_dim`` JPEGs are decoded at the smallest 1/2, 1/4 or 1/8 scale
+    whose longest side is still at least ``max_dim``, skipping most of the
+    IDCT work; callers resize the rest of the way.  Returns ``None`` if the
+    data cannot be decoded.
+    """
+    start = time.monotonic()
+    turbo = _turbojpeg() if is_jpeg(data) else None
+    backend = "turbojpeg" if turbo is not None else "opencv"
+    reduction = 1
+    out = None
+    try:
+        if max_dim:
+            reduction = reduction_for(*image_size(data), max_dim)
+        if turbo is not None:
+            out = turbo.decode(
+                data,
+                pixel_format=TJPF_GRAY if gray else TJPF_RGB,
+                scaling_factor=(1, reduction),
+            )
+            if gray and out.ndim == 3:
+                out = out[:, :, 0]
+        else:
+            out = _cv_decode(data, reduction, gray)
+    except Exception:
+        logger.error("Failed to decode image", exc_info=True)
+        out = None
+    _STATS.record(op, time.monotonic() - start, backend, out, reduction)
+    return out
+
+
+def decode_roi(data: bytes, bbox, *, gray: bool = False, op: str = "roi") -> np.ndarray | None:
+    """Decode only the ``x1, y1, x2, y2`` region of an image at full scale.
+
+    With libjpeg-turbo the JPEG is losslessly cropped to the MCU-aligned
+    region first, so blocks outside it are never decoded; otherwise the whole
+    image is decoded and sliced.  The region is clipped to the image.
+    """
+    start = time.monotonic()
+    turbo = _turbojpeg() if is_jpeg(data) else None
+    backend = "turbojpeg" if turbo is not None else "opencv"
+    out = None
+    try:
+        x1, y1, x2, y2 = (int(v) for v in bbox)
+        if turbo is not None:
+            width, height, subsample, _ = turbo.decode_header(data)
+            x1, x2 = max(0, min(x1, width)), max(0, min(x2, width))
+            y1, y2 = max(0, min(y1, height)), max(0, min(y2, height))
+            if x2 > x1 and y2 > y1:
+                mcu_w, mcu_h = _MCU.get(subsample, (16, 16))
+                ax, ay = x1 - x1 % mcu_w, y1 - y1 % mcu_h
+                cropped = turbo.crop(data, ax, ay, x2 - ax, y2 - ay)
+                full = turbo.decode(cropped, pixel_format=TJPF_GRAY if gray else TJPF_RGB)
+                if gray and full.ndim == 3:
+                    full = full[:, :, 0]
+                out = full[y1 - ay:y2 - ay, x1 - ax:x2 - ax]
+        else:
+            full = _cv_decode(data, 1, gray)
+            if full is not None:
+                h, w = full.shape[:2]
+                out = full[max(0, y1):min(y2, h), max(0, x1):min(x2, w)]
+        if out is not None and out.size == 0:
+            out = None
+    except Exception:
+        logger.error("Failed to decode image region", exc_info=True)
+        out = None
+    _STATS.record(op, time.monotonic() - start, backend, out, roi=True)
+    return out
+
+
+def read_image(path: str, **kwargs) -> np.ndarray | None:
+    """``decode`` the file at ``path``; ``None`` if it cannot be read."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return decode(data, **kwargs)
+
+
+def decode_stats() -> dict:
+    """Per-operation decode counts, backend use and latency."""
+    return {
+        "backend": "turbojpeg" if _turbojpeg() is not None else "opencv",
+        "operations": _STATS.snapshot(),
+    }
+
+
+def _bench(label: str, func, repeat: int) -> None:
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = func()
+    ms = (time.perf_counter() - start) * 1000.0 / repeat
+    shape = "x".join(map(str, out.shape[:2])) if out is not None else "-"
+    print(f"  {label:<22} {ms:8.2f} ms  {shape}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark snapshot decoding paths")
+    parser.add_argument("images", nargs="+", help="JPEG snapshots to decode")
+    parser.add_argument("--max-dim", type=int, default=800, help="target size for reduced decoding")
+    parser.add_argument("--roi", default="", help="x1,y1,x2,y2 region for ROI decoding")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    roi = [int(v) for v in args.roi.split(",")] if args.roi else None
+    print(f"decoder: {decode_stats()['backend']}")
+    for path in args.images:
+        with open(path, "rb") as f:
+            data = f.read()
+        print(path)
+        _bench("PIL full RGB", lambda: np.asarray(Image.open(io.BytesIO(data)).convert("RGB")), args.repeat)
+        _bench("full RGB", lambda: decode(data, op="bench"), args.repeat)
+        _bench(f"reduced >= {args.max_dim}", lambda: decode(data, max_dim=args.max_dim, op="bench"), args.repeat)
+        _bench(
+            f"reduced gray >= {args.max_dim}",
+            lambda: decode(data, max_dim=args.max_dim, gray=True, op="bench"),
+            args.repeat,
+        )
+        if roi:
+            _bench("ROI RGB", lambda: decode_roi(data, roi, op="bench"), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
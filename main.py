@@ -8,11 +8,12 @@ import base64
 from datetime import datetime, timedelta
 import uuid
 import asyncio
+import time
 from queue import Queue
-from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import ThreadPoolExecutor, Future, wait
 import threading
 
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, Depends, Query
 from fastapi.responses import JSONResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.requests import ClientDisconnect
@@ -39,26 +40,80 @@ from models import (
     Role,
     Permission,
 )
-from ocr_processor import process_plate_and_issue_ticket, spot_has_car
+from ocr_processor import (
+    process_plate_and_issue_ticket,
+    spot_has_car,
+    vehicles_present,
+    detector_stats,
+    roi_stats,
+    same_car_stats,
+    motion_gate_stats,
+    load_candidate,
+    candidate_stats,
+    discard_candidate,
+    promote_candidate,
+)
+from ocr_client import ocr_stats
+from ocr_engines import OCR_ENGINES
+from image_budget import PARKIN_BUDGET, budget_b64, budget_b64_data, image_budget_stats
+from image_decode import decode_stats
+from metrics import NETWORK_STATS
+from spot_index import SPOT_INDEX
+from ocr_cache import OCR_CACHE
+from rtsp_streams import STREAM_MANAGER
+from camera_health import CAMERA_HEALTH, CameraUnavailable
+from camera_routes import CAMERA_ROUTES
+from frame_preview import FRAME_PREVIEWS
 from camera_clip import (
     request_camera_clip,
     is_valid_mp4,
     fetch_camera_frame,
-    fetch_exit_frame
+    fetch_exit_frame,
+    prefetch_stats,
+    exit_frame_stats,
+    FetchCancelled,
 )
 from logger import logger
-from utils import is_same_image
-
-from config import API_POLE_ID, API_LOCATION_ID
+from utils import (
+    parse_location_params,
+    resolve_detector_imgsz,
+    resolve_motion_threshold,
+)
+from thread_budget import apply_thread_budget, thread_layout
+
+from config import (
+    API_POLE_ID,
+    API_LOCATION_ID,
+    OCCUPANCY_SWEEP_INTERVAL,
+    OCCUPANCY_SWEEP_ACTION,
+    OCCUPANCY_SWEEP_CONFIRMATIONS,
+    OCCUPANCY_SWEEP_WORKERS,
+    OCCUPANCY_SWEEP_PER_POLE,
+    CAMERA_FRAMES_CONCURRENCY,
+    CAMERA_FRAMES_TIMEOUT,
+    DETECTOR_WEIGHTS_DIR,
+)
+from occupancy_sweep import OccupancySweep
 
 from pydantic import BaseModel
 
 app = FastAPI()
 
 # Shared thread pool for blocking tasks
-EXECUTOR = ThreadPoolExecutor(
-    max_workers=int(os.environ.get("MAX_WORKERS", "4"))
-)
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "4"))
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+@app.on_event("startup")
+def _warm_spot_index():
+    try:
+        SPOT_INDEX.load_all()
+    except Exception:
+        logger.error("Failed to preload spot index", exc_info=True)
+
+
+# Size the torch/OpenCV/ONNX thread pools so the worker threads do not
+# oversubscribe the cores.
+apply_thread_budget(io_workers=MAX_WORKERS)
 
 async def run_in_executor(func, *args):
     loop = asyncio.get_running_loop()
@@ -216,6 +271,11 @@ class ManualReviewUpdate(BaseModel):
     review_status: str | None = None
 
 
+class DetectorCandidateCreate(BaseModel):
+    path: str
+    sample_rate: float = 0.1
+
+
 class ClipRequestCreate(BaseModel):
     camera_id: int
     start: datetime
@@ -266,6 +326,7 @@ class SpotCreate(BaseModel):
 
 
 class SpotUpdate(BaseModel):
+    camera_id: int | None = None
     spot_number: int | None = None
     bbox_x1: int | None = None
     bbox_y1: int | None = None
@@ -686,6 +747,8 @@ def _process_plate_task(
     camera_pass: str,
     parkonic_api_token: str,
     rtsp_path: str = "/",
+    detector_imgsz: int | None = None,
+    motion_threshold: float | None = None,
 ):
     """Run plate processing synchronously in the worker thread."""
     process_plate_and_issue_ticket(
@@ -701,8 +764,48 @@ def _process_plate_task(
         camera_pass,
         parkonic_api_token,
         rtsp_path,
+        detector_imgsz=detector_imgsz,
+        motion_threshold=motion_threshold,
+    )
+
+
+def _close_ticket(
+    ticket: Ticket,
+    exit_time: datetime,
+    db,
+    parkonic_api_token: str | None,
+    api_pole_id: int | None,
+    parkout_time: str | None = None,
+) -> None:
+    """Set the ticket's exit time and report the park-out to Parkonic.
+
+    ``parkout_time`` is the time string sent to Parkonic; it defaults to
+    ``exit_time`` in ISO format.
+    """
+    ticket.exit_time = exit_time
+    _retry_commit(ticket, db)
+    logger.debug(
+        "Closed ticket id=%d at %s camera %d spot %d",
+        ticket.id,
+        exit_time.isoformat(),
+        ticket.camera_id,
+        ticket.spot_number,
     )
 
+    if ticket.parkonic_trip_id is not None:
+        try:
+            from api_client import park_out_request
+
+            park_out_request(
+                token=parkonic_api_token or "",
+                parkout_time=parkout_time or exit_time.isoformat(),
+                spot_number=ticket.spot_number,
+                pole_id=api_pole_id,
+                trip_id=ticket.parkonic_trip_id,
+            )
+        except Exception:
+            logger.error("park_out_request failed", exc_info=True)
+
 
 def _exit_flow(
     payload: dict,
@@ -714,6 +817,7 @@ def _exit_flow(
     cam_user: str,
     cam_pass: str,
     parkonic_api_token: str,
+    detector_imgsz: int | None = None,
 ):
     """Handle EXIT logic synchronously."""
     frame_bytes = None
@@ -735,7 +839,12 @@ def _exit_flow(
 
     if frame_bytes is not None:
         try:
-            if spot_has_car(frame_bytes, camera_id=camera_id, spot_number=spot_number):
+            if spot_has_car(
+                frame_bytes,
+                camera_id=camera_id,
+                spot_number=spot_number,
+                imgsz=detector_imgsz,
+            ):
                 logger.debug(
                     "EXIT report ignored - spot still occupied. Camera=%d, Spot=%d",
                     camera_id,
@@ -770,30 +879,14 @@ def _exit_flow(
         )
 
         if open_ticket:
-            open_ticket.exit_time = datetime.fromisoformat(payload["time"])
-            _retry_commit(open_ticket, db2)
-            logger.debug(
-                "Closed ticket id=%d at %s camera %f spot %d",
-                open_ticket.id,
-                payload["time"],
-                camera_id,
-                spot_number,
+            _close_ticket(
+                open_ticket,
+                datetime.fromisoformat(payload["time"]),
+                db2,
+                parkonic_api_token,
+                api_pole_id,
+                parkout_time=payload["time"],
             )
-
-            if open_ticket.parkonic_trip_id is not None:
-                try:
-                    from api_client import park_out_request
-
-                    park_out_request(
-                        token=parkonic_api_token or "",
-                        parkout_time=payload["time"],
-                        spot_number=spot_number,
-                        pole_id=api_pole_id,
-                        trip_id=open_ticket.parkonic_trip_id,
-                    )
-                except Exception:
-                    logger.error("park_out_request failed", exc_info=True)
-
             return JSONResponse(status_code=200, content={"message": "Exit recorded"})
         else:
             logger.debug(
@@ -814,6 +907,70 @@ def _exit_flow(
         db2.close()
 
 
+def _sweep_grab(target) -> bytes:
+    return fetch_camera_frame(
+        target.camera_ip,
+        target.camera_user,
+        target.camera_pass,
+        rtsp_path=target.rtsp_path,
+    )
+
+
+def _sweep_close(ticket_id: int, target, exit_time: datetime) -> bool:
+    """Close a ticket the occupancy sweep found empty, if it is still open."""
+    db = SessionLocal()
+    try:
+        ticket = db.query(Ticket).filter_by(id=ticket_id, exit_time=None).first()
+        if ticket is None:
+            return False
+        _close_ticket(ticket, exit_time, db, target.parkonic_api_token, target.api_pole_id)
+        return True
+    finally:
+        db.close()
+
+
+OCCUPANCY_SWEEP = OccupancySweep(
+    _sweep_grab,
+    vehicles_present,
+    _sweep_close,
+    interval=OCCUPANCY_SWEEP_INTERVAL,
+    action=OCCUPANCY_SWEEP_ACTION,
+    confirmations=OCCUPANCY_SWEEP_CONFIRMATIONS,
+    max_workers=OCCUPANCY_SWEEP_WORKERS,
+    per_pole=OCCUPANCY_SWEEP_PER_POLE,
+)
+
+
+@app.on_event("startup")
+def _start_occupancy_sweep():
+    OCCUPANCY_SWEEP.start()
+
+
+@app.on_event("shutdown")
+def _stop_occupancy_sweep():
+    OCCUPANCY_SWEEP.stop()
+
+
+def _camera_route_pairs() -> list[tuple[str, str | None]]:
+    db = SessionLocal()
+    try:
+        return [(p_ip, vpn_ip) for p_ip, vpn_ip in db.query(Camera.p_ip, Camera.vpn_ip).all()]
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def _start_camera_routes():
+    CAMERA_ROUTES.start(_camera_route_pairs)
+
+
+@app.on_event("shutdown")
+def _close_rtsp_streams():
+    STREAM_MANAGER.close_all()
+    CAMERA_HEALTH.stop()
+    CAMERA_ROUTES.stop()
+
+
 def _as_dict(model_obj):
     """Return a dict of column values for a SQLAlchemy model instance.
 
@@ -1011,6 +1168,9 @@ def _process_post_task(payload: dict, raw_body: bytes, ts: str):
         logger.error("Database error while looking up camera", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {sa_err}")
 
+    detector_imgsz = resolve_detector_imgsz(loc_params, camera_id, spot_number)
+    motion_threshold = resolve_motion_threshold(loc_params, camera_id, spot_number)
+
     if payload["occupancy"] == 0:
         return _exit_flow(
             payload,
@@ -1022,6 +1182,7 @@ def _process_post_task(payload: dict, raw_body: bytes, ts: str):
             cam_user,
             cam_pass,
             parkonic_api_token,
+            detector_imgsz,
         )
     else:
         db2 = SessionLocal()
@@ -1079,6 +1240,8 @@ def _process_post_task(payload: dict, raw_body: bytes, ts: str):
             cam_pass,
             parkonic_api_token,
             rtsp_path,
+            detector_imgsz,
+            motion_threshold,
         )
 
         return JSONResponse(status_code=200, content={"message": "Entry queued for processing"})
@@ -1394,6 +1557,32 @@ def get_camera(cam_id: int, current_user: User = Depends(get_current_user)):
         db.close()
 
 
+@app.get("/camera-health")
+def camera_health(current_user: User = Depends(get_current_user)):
+    """Connection health, circuit state and chosen route of every camera."""
+    db = SessionLocal()
+    try:
+        cams = db.query(Camera).order_by(Camera.id).all()
+        return [
+            {
+                "camera_id": cam.id,
+                "api_code": cam.api_code,
+                "pole_id": cam.pole_id,
+                "p_ip": cam.p_ip,
+                "vpn_ip": cam.vpn_ip,
+                "health": {
+                    ip: CAMERA_HEALTH.snapshot(ip) or {"state": "unknown"}
+                    for ip in (cam.p_ip, cam.vpn_ip)
+                    if ip
+                },
+                "routes": CAMERA_ROUTES.snapshot(cam.p_ip),
+            }
+            for cam in cams
+        ]
+    finally:
+        db.close()
+
+
 @app.get("/cameras/{cam_id}/clip")
 def get_camera_clip(
     cam_id: int,
@@ -1455,9 +1644,17 @@ def get_camera_clip(
 @app.get("/cameras/{cam_id}/frame")
 def get_camera_frame(
     cam_id: int,
+    width: int | None = Query(None, ge=16, le=4096),
+    quality: int | None = Query(None, ge=10, le=95),
     current_user: User = Depends(get_current_user),
 ):
-    """Return a JPEG frame captured from the camera."""
+    """Return a JPEG frame captured from the camera.
+
+    ``width`` scales the frame down to that many pixels and ``quality`` sets
+    the JPEG quality; without them the frame is returned as grabbed.  Frames
+    come from ``FRAME_PREVIEWS``, so concurrent viewers of one camera share a
+    grab and a recent frame is reused.
+    """
 
     db = SessionLocal()
     try:
@@ -1491,7 +1688,14 @@ def get_camera_frame(
         db.close()
 
     try:
-        frame_bytes = fetch_camera_frame(cam_ip, user, pwd, rtsp_path=rtsp_path)
+        frame_bytes = FRAME_PREVIEWS.get(
+            cam_id,
+            lambda: fetch_camera_frame(cam_ip, user, pwd, rtsp_path=rtsp_path),
+            width=width,
+            quality=quality,
+        )
+    except CameraUnavailable:
+        raise HTTPException(status_code=503, detail="Camera unavailable")
     except Exception:
         logger.error("Failed fetching camera frame", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to fetch frame")
@@ -1499,6 +1703,135 @@ def get_camera_frame(
     return Response(content=frame_bytes, media_type="image/jpeg")
 
 
+# Shared by all /camera-frames requests, so the pool size is a global limit on
+# concurrent RTSP grabs.
+FRAME_GRAB_POOL = ThreadPoolExecutor(
+    max_workers=CAMERA_FRAMES_CONCURRENCY, thread_name_prefix="camera-frames"
+)
+
+
+def _grab_timed(
+    cam_id: int, cam_ip: str, user: str, pwd: str, rtsp_path: str, cancel_event
+) -> tuple[bytes, float]:
+    """Frame of one camera through ``FRAME_PREVIEWS`` and the time it took.
+
+    ``cancel_event`` only stops grabs that have not started yet: a started
+    grab may be shared with other requests for the camera, so it runs to
+    completion (bounded by the grab's own timeouts).
+    """
+    if cancel_event.is_set():
+        raise FetchCancelled("Frame grab cancelled")
+    start = time.monotonic()
+    frame = FRAME_PREVIEWS.get(
+        cam_id, lambda: fetch_camera_frame(cam_ip, user, pwd, rtsp_path=rtsp_path)
+    )
+    return frame, time.monotonic() - start
+
+
+def _multipart_frames(results: list[dict], boundary: str) -> bytes:
+    parts = []
+    for res in results:
+        if res.get("image") is not None:
+            headers = "Content-Type: image/jpeg\r\n"
+            content = res["image"]
+        else:
+            headers = "Content-Type: application/json\r\n"
+            content = json.dumps({"camera_id": res["camera_id"], "error": res["error"]}).encode()
+        headers += f"X-Camera-Id: {res['camera_id']}\r\nX-Elapsed-Ms: {res['elapsed_ms']}\r\n"
+        parts.append(f"--{boundary}\r\n{headers}\r\n".encode() + content + b"\r\n")
+    return b"".join(parts) + f"--{boundary}--\r\n".encode()
+
+
+@app.get("/camera-frames")
+def get_camera_frames(
+    camera_ids: list[int] | None = Query(None),
+    pole_id: int | None = None,
+    zone_id: int | None = None,
+    format: str = "json",
+    current_user: User = Depends(get_current_user),
+):
+    """Grab frames from several cameras concurrently.
+
+    Cameras are chosen by repeated ``camera_ids``, a ``pole_id`` or a
+    ``zone_id``.  With ``format=json`` every camera gets an entry with its
+    base64 JPEG or error and the time its grab took; ``format=multipart``
+    returns a ``multipart/mixed`` body with one JPEG (or JSON error) part per
+    camera, identified by ``X-Camera-Id`` headers.  Frames go through
+    ``FRAME_PREVIEWS`` like ``/cameras/{id}/frame``, so a camera is grabbed
+    at most once at a time across both endpoints.
+    """
+    if sum(x is not None for x in (camera_ids, pole_id, zone_id)) != 1:
+        raise HTTPException(status_code=400, detail="Give exactly one of camera_ids, pole_id or zone_id")
+    if format not in ("json", "multipart"):
+        raise HTTPException(status_code=400, detail="format must be json or multipart")
+
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(Camera.id, Camera.p_ip, Location.camera_user, Location.camera_pass, Location.parameters)
+            .join(Pole, Camera.pole_id == Pole.id)
+            .join(Location, Pole.location_id == Location.id)
+        )
+        if camera_ids is not None:
+            query = query.filter(Camera.id.in_(camera_ids))
+        elif pole_id is not None:
+            query = query.filter(Camera.pole_id == pole_id)
+        else:
+            query = query.filter(Pole.zone_id == zone_id)
+        rows = query.order_by(Camera.id).all()
+    finally:
+        db.close()
+
+    start = time.monotonic()
+    cancel = threading.Event()
+    futures = {}
+    for cam_id, cam_ip, user, pwd, params in rows:
+        rtsp_path = parse_location_params(params).get("rtsp_path", "/") or "/"
+        futures[cam_id] = FRAME_GRAB_POOL.submit(
+            _grab_timed, cam_id, cam_ip, user or "", pwd or "", rtsp_path, cancel
+        )
+    wait(futures.values(), timeout=CAMERA_FRAMES_TIMEOUT)
+    # Grabs still queued give up now instead of holding the pool.
+    cancel.set()
+
+    results = []
+    for cam_id, future in futures.items():
+        res = {"camera_id": cam_id, "image": None, "error": None, "elapsed_ms": None}
+        if not future.done():
+            future.cancel()
+            res["error"] = "timeout"
+        else:
+            try:
+                frame, seconds = future.result()
+                res["image"] = frame
+                res["elapsed_ms"] = round(seconds * 1000.0, 1)
+            except CameraUnavailable:
+                res["error"] = "unavailable"
+            except FetchCancelled:
+                res["error"] = "timeout"
+            except Exception as exc:
+                logger.error("Failed fetching frame of camera %d", cam_id, exc_info=True)
+                res["error"] = str(exc) or type(exc).__name__
+        results.append(res)
+    missing = sorted(set(camera_ids or ()) - set(futures))
+    results.extend(
+        {"camera_id": cam_id, "image": None, "error": "not found", "elapsed_ms": None} for cam_id in missing
+    )
+    total_ms = round((time.monotonic() - start) * 1000.0, 1)
+
+    if format == "multipart":
+        boundary = uuid.uuid4().hex
+        return Response(
+            content=_multipart_frames(results, boundary),
+            media_type=f"multipart/mixed; boundary={boundary}",
+            headers={"X-Elapsed-Ms": str(total_ms)},
+        )
+    for res in results:
+        if res["image"] is not None:
+            res["image"] = base64.b64encode(res["image"]).decode()
+    return {"elapsed_ms": total_ms, "frames": results}
+
+
 def _process_clip_request(req_id: int, cam_ip: str, user: str, pwd: str, start_dt: datetime, end_dt: datetime):
     """Background task to fetch clip and update ClipRequest row."""
     clip_path = request_camera_clip(
@@ -1650,6 +1983,7 @@ def delete_camera(cam_id: int, current_user: User = Depends(get_current_user)):
             raise HTTPException(status_code=404, detail="Not found")
         db.delete(obj)
         _retry_commit(obj, db)
+        SPOT_INDEX.invalidate(cam_id)
         return {"status": "deleted"}
     finally:
         db.close()
@@ -1667,6 +2001,7 @@ def create_spot(
         new_obj = Spot(**spot.dict())
         db.add(new_obj)
         _retry_commit(new_obj, db)
+        SPOT_INDEX.invalidate(spot.camera_id)
         return {"id": new_obj.id}
     except SQLAlchemyError as e:
         db.rollback()
@@ -1697,6 +2032,48 @@ def get_spot(spot_id: int, current_user: User = Depends(get_current_user)):
         db.close()
 
 
+@app.put("/spots/{spot_id}")
+def update_spot(
+    spot_id: int,
+    spot: SpotUpdate,
+    current_user: User = Depends(get_current_user),
+):
+    db = SessionLocal()
+    try:
+        obj = db.query(Spot).get(spot_id)
+        if obj is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        old_camera_id = obj.camera_id
+        changes = spot.dict(exclude_unset=True)
+        if "camera_id" in changes and not db.query(Camera.id).filter(Camera.id == changes["camera_id"]).first():
+            raise HTTPException(status_code=404, detail="Camera not found")
+        for k, v in changes.items():
+            setattr(obj, k, v)
+        _retry_commit(obj, db)
+        SPOT_INDEX.invalidate(old_camera_id)
+        if obj.camera_id != old_camera_id:
+            SPOT_INDEX.invalidate(obj.camera_id)
+        return _as_dict(obj)
+    finally:
+        db.close()
+
+
+@app.delete("/spots/{spot_id}")
+def delete_spot(spot_id: int, current_user: User = Depends(get_current_user)):
+    db = SessionLocal()
+    try:
+        obj = db.query(Spot).get(spot_id)
+        if obj is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        camera_id = obj.camera_id
+        db.delete(obj)
+        _retry_commit(obj, db)
+        SPOT_INDEX.invalidate(camera_id)
+        return {"status": "deleted"}
+    finally:
+        db.close()
+
+
 @app.get("/cameras/{cam_id}/spots")
 def list_camera_spots(cam_id: int, current_user: User = Depends(get_current_user)):
     db = SessionLocal()
@@ -2005,21 +2382,21 @@ def correct_manual_review(
                 park_token = None
 
             if ticket.image_base64:
-                images_list = [ticket.image_base64]
+                images_list = [budget_b64_data(ticket.image_base64, PARKIN_BUDGET)]
             else:
                 images_list = []
                 folder = os.path.join(SNAPSHOTS_DIR, review.snapshot_folder)
                 try:
                     for fname in os.listdir(folder):
                         if fname.startswith("annotated_") or fname.startswith("main_crop_"):
-                            with open(os.path.join(folder, fname), "rb") as f:
-                                images_list.append(base64.b64encode(f.read()).decode("utf-8"))
+                            images_list.append(
+                                budget_b64(os.path.join(folder, fname), PARKIN_BUDGET)
+                            )
                 except Exception:
                     logger.error("Failed loading snapshot images for API", exc_info=True)
 
                 if not images_list:
-                    with open(review.image_path, "rb") as f:
-                        images_list = [base64.b64encode(f.read()).decode("utf-8")]
+                    images_list = [budget_b64(review.image_path, PARKIN_BUDGET)]
 
             pole_api_id = (
                 db.query(Pole.api_pole_id)
@@ -2165,3 +2542,75 @@ def location_stats(current_user: User = Depends(get_current_user)):
         return {"data": data}
     finally:
         db.close()
+
+
+@app.post("/detector/candidate")
+def create_detector_candidate(
+    body: DetectorCandidateCreate,
+    current_user: User = Depends(require_permission("manage_models")),
+):
+    """Load candidate detector weights and shadow-run them on live crops.
+
+    Weights are unpickled on load, so only files inside
+    ``DETECTOR_WEIGHTS_DIR`` are accepted.
+    """
+    weights_dir = os.path.realpath(DETECTOR_WEIGHTS_DIR)
+    path = os.path.realpath(body.path)
+    if os.path.commonpath([weights_dir, path]) != weights_dir:
+        raise HTTPException(status_code=400, detail="Weights must be inside the weights directory")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=400, detail="Weights file not found")
+    if not 0 < body.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be in (0, 1]")
+    return load_candidate(path, body.sample_rate)
+
+
+@app.get("/detector/candidate")
+def get_detector_candidate(current_user: User = Depends(require_permission("manage_models"))):
+    stats = candidate_stats()
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No candidate detector")
+    return stats
+
+
+@app.post("/detector/candidate/promote")
+def promote_detector_candidate(current_user: User = Depends(require_permission("manage_models"))):
+    """Swap the candidate in as the primary plate detector."""
+    try:
+        report = promote_candidate()
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return {"message": "Candidate promoted", "evaluation": report}
+
+
+@app.delete("/detector/candidate")
+def delete_detector_candidate(current_user: User = Depends(require_permission("manage_models"))):
+    if not discard_candidate():
+        raise HTTPException(status_code=404, detail="No candidate detector")
+    return {"message": "Candidate discarded"}
+
+
+@app.get("/pipeline-stats")
+def pipeline_stats(current_user: User = Depends(get_current_user)):
+    """Return runtime counters and latencies of the plate processing pipeline."""
+    return {
+        "ocr": ocr_stats(),
+        "ocr_engines": OCR_ENGINES.stats(),
+        "ocr_cache": OCR_CACHE.stats(),
+        "frame_prefetch": prefetch_stats(),
+        "detector": detector_stats(),
+        "vehicle_roi": roi_stats(),
+        "threads": thread_layout(),
+        "image_budget": image_budget_stats(),
+        "network": NETWORK_STATS.snapshot(),
+        "spot_index": SPOT_INDEX.stats(),
+        "same_car": same_car_stats(),
+        "motion_gate": motion_gate_stats(),
+        "image_decode": decode_stats(),
+        "occupancy_sweep": OCCUPANCY_SWEEP.stats(),
+        "rtsp_streams": STREAM_MANAGER.stats(),
+        "exit_frame": exit_frame_stats(),
+        "camera_health": CAMERA_HEALTH.stats(),
+        "camera_routes": CAMERA_ROUTES.stats(),
+        "frame_previews": FRAME_PREVIEWS.stats(),
+    }
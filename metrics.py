@@ -0,0 +1,106 @@
+# metrics.py
+
+import threading
+from collections import deque
+
+
+class LatencyWindow:
+    """Rolling window of recent latencies (in seconds) with percentile helpers.
+
+    The window is bounded so that percentiles follow recent behaviour instead
+    of the whole process lifetime.  All methods are thread safe.
+    """
+
+    def __init__(self, maxlen: int = 200):
+        self._samples: deque[float] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(float(seconds))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, pct: float, default: float | None = None) -> float | None:
+        """Return the ``pct`` percentile (0-100) or ``default`` if empty."""
+        with self._lock:
+            data = sorted(self._samples)
+        if not data:
+            return default
+        idx = min(len(data) - 1, max(0, int(round(pct / 100.0 * (len(data) - 1)))))
+        return data[idx]
+
+    def snapshot(self) -> dict:
+        """Return count and p50/p95/p99 in milliseconds for JSON responses."""
+
+        def _ms(value):
+            return None if value is None else round(value * 1000.0, 1)
+
+        return {
+            "count": len(self),
+            "p50_ms": _ms(self.percentile(50)),
+            "p95_ms": _ms(self.percentile(95)),
+            "p99_ms": _ms(self.percentile(99)),
+        }
+
+
+def payload_size(payload) -> int:
+    """Approximate JSON size of ``payload`` without serialising it again.
+
+    Outbound payloads are dominated by base64 image strings, so summing the
+    string lengths (plus a few bytes per field) is close enough for traffic
+    accounting.
+    """
+    if isinstance(payload, dict):
+        return 2 + sum(len(str(k)) + 4 + payload_size(v) for k, v in payload.items())
+    if isinstance(payload, (list, tuple)):
+        return 2 + sum(payload_size(v) + 1 for v in payload)
+    if isinstance(payload, str):
+        return len(payload) + 2
+    return len(str(payload))
+
+
+class TrafficStats:
+    """Bytes on the wire and latency of outbound HTTP calls per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: dict[str, dict] = {}
+
+    def record(self, endpoint: str, bytes_out: int, bytes_in: int, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    "requests": 0,
+                    "errors": 0,
+                    "bytes_out": 0,
+                    "bytes_in": 0,
+                    "latency": LatencyWindow(),
+                }
+            entry["requests"] += 1
+            entry["errors"] += 0 if ok else 1
+            entry["bytes_out"] += bytes_out
+            entry["bytes_in"] += bytes_in
+        entry["latency"].add(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            items = list(self._endpoints.items())
+        report = {}
+        for endpoint, entry in items:
+            requests_total = entry["requests"]
+            report[endpoint] = {
+                "requests": requests_total,
+                "errors": entry["errors"],
+                "bytes_out": entry["bytes_out"],
+                "bytes_in": entry["bytes_in"],
+                "avg_bytes_out": round(entry["bytes_out"] / requests_total) if requests_total else 0,
+                "latency": entry["latency"].snapshot(),
+            }
+        return report
+
+
+NETWORK_STATS = TrafficStats()
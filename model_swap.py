@@ -0,0 +1,147 @@
+# model_swap.py
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from logger import logger
+from metrics import LatencyWindow
+
+
+def _first_xyxy(results) -> list[float] | None:
+    if results and results[0].boxes:
+        return [float(v) for v in results[0].boxes.xyxy[0].tolist()]
+    return None
+
+
+def box_iou(a: list[float], b: list[float]) -> float:
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class ShadowCandidate:
+    """Candidate detector weights evaluated on a sample of live crops.
+
+    The weights are loaded in the background.  Once ready, ``offer`` hands a
+    sampled crop to a single shadow thread which runs the candidate and
+    compares its first plate box with the primary's.  Crops offered while the
+    shadow thread is busy are skipped so the live path never waits on it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 0.1,
+        loader=None,
+        min_iou: float = 0.5,
+    ):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.min_iou = min_iou
+        self.model = None
+        self.state = "loading"
+        self.error: str | None = None
+        self.created_at = time.time()
+        self._loader = loader
+        self._latency = LatencyWindow()
+        self._primary_latency = LatencyWindow()
+        self._lock = threading.Lock()
+        self._busy = False
+        self._counts = {
+            "offered": 0,
+            "sampled": 0,
+            "skipped_busy": 0,
+            "compared": 0,
+            "agree": 0,
+            "both_found": 0,
+            "primary_only": 0,
+            "candidate_only": 0,
+            "errors": 0,
+        }
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detector-shadow")
+        self._pool.submit(self._load)
+
+    def _load(self) -> None:
+        try:
+            loader = self._loader
+            if loader is None:
+                from ultralytics import YOLO
+
+                loader = YOLO
+            model = loader(self.path)
+            # Warm up so the first shadow sample is not charged for setup.
+            model(np.zeros((64, 64, 3), dtype=np.uint8))
+            self.model = model
+            self.state = "ready"
+            logger.info("Candidate detector %s loaded", self.path)
+        except Exception as exc:
+            self.state = "failed"
+            self.error = str(exc)
+            logger.error("Failed to load candidate detector %s", self.path, exc_info=True)
+
+    def offer(self, arr: np.ndarray, imgsz: int | None, primary_results, primary_seconds: float) -> None:
+        """Maybe shadow-run the candidate on ``arr``; never blocks."""
+        if self.state != "ready":
+            return
+        with self._lock:
+            self._counts["offered"] += 1
+            if random.random() >= self.sample_rate:
+                return
+            if self._busy:
+                self._counts["skipped_busy"] += 1
+                return
+            self._busy = True
+            self._counts["sampled"] += 1
+        primary_box = _first_xyxy(primary_results)
+        self._pool.submit(self._shadow, arr.copy(), imgsz, primary_box, primary_seconds)
+
+    def _shadow(self, arr, imgsz, primary_box, primary_seconds) -> None:
+        try:
+            start = time.monotonic()
+            results = self.model(arr, imgsz=imgsz) if imgsz else self.model(arr)
+            self._latency.add(time.monotonic() - start)
+            self._primary_latency.add(primary_seconds)
+            box = _first_xyxy(results)
+            with self._lock:
+                self._counts["compared"] += 1
+                if primary_box is None and box is None:
+                    self._counts["agree"] += 1
+                elif primary_box is not None and box is not None:
+                    self._counts["both_found"] += 1
+                    if box_iou(primary_box, box) >= self.min_iou:
+                        self._counts["agree"] += 1
+                elif primary_box is not None:
+                    self._counts["primary_only"] += 1
+                else:
+                    self._counts["candidate_only"] += 1
+        except Exception:
+            with self._lock:
+                self._counts["errors"] += 1
+            logger.error("Shadow detector run failed", exc_info=True)
+        finally:
+            with self._lock:
+                self._busy = False
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        compared = counts["compared"]
+        return {
+            "path": self.path,
+            "state": self.state,
+            "error": self.error,
+            "sample_rate": self.sample_rate,
+            **counts,
+            "agreement": round(counts["agree"] / compared, 4) if compared else None,
+            "candidate_latency": self._latency.snapshot(),
+            "primary_latency": self._primary_latency.snapshot(),
+        }
@@ -0,0 +1,151 @@
+# motion_gate.py
+
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from config import (
+    MOTION_GATE_ENABLED,
+    MOTION_GATE_METHOD,
+    MOTION_GATE_THRESHOLD,
+    MOTION_GATE_THUMB,
+)
+
+METHODS = ("absdiff", "ssim")
+DEFAULT_THRESHOLDS = {"absdiff": 4.0, "ssim": 0.05}
+
+
+def thumbnail(crop: np.ndarray, size: int = 64) -> np.ndarray:
+    """Small blurred grayscale float32 version of an RGB or grayscale crop."""
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(small, (3, 3), 0).astype(np.float32)
+
+
+def ssim(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean structural similarity of two grayscale images (Gaussian window)."""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def blur(x):
+        return cv2.GaussianBlur(x, (7, 7), 1.5)
+
+    mu_a, mu_b = blur(a), blur(b)
+    var_a = blur(a * a) - mu_a * mu_a
+    var_b = blur(b * b) - mu_b * mu_b
+    cov = blur(a * b) - mu_a * mu_b
+    num = (2 * mu_a * mu_b + c1) * (2 * cov + c2)
+    den = (mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2)
+    return float((num / den).mean())
+
+
+def difference(a: np.ndarray, b: np.ndarray, method: str = "absdiff") -> float:
+    """Change score between two thumbnails; 0 means identical."""
+    if method == "ssim":
+        return 1.0 - ssim(a, b)
+    return float(cv2.absdiff(a, b).mean())
+
+
+class MotionGate:
+    """Skip events whose spot crop is unchanged since the last processed one.
+
+    The thumbnail of the last crop that went through the pipeline is kept per
+    spot.  ``check`` scores a new crop against it and reports it unchanged
+    when the score is below the threshold; otherwise the new thumbnail becomes
+    the reference.  A reference taken for a different spot bbox is ignored.
+    """
+
+    def __init__(
+        self,
+        method: str = "absdiff",
+        threshold: float | None = None,
+        thumb_size: int = 64,
+        enabled: bool = True,
+    ):
+        if method not in METHODS:
+            raise ValueError(f"Unknown motion gate method {method!r}; expected one of {METHODS}")
+        self.method = method
+        self.threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+        self.thumb_size = thumb_size
+        self.enabled = enabled
+        self._refs: dict[tuple[int, int], tuple[tuple, np.ndarray]] = {}
+        self._cameras: dict[int, dict] = {}
+        self._lock = threading.Lock()
+
+    def _camera(self, camera_id: int) -> dict:
+        stats = self._cameras.get(camera_id)
+        if stats is None:
+            stats = self._cameras[camera_id] = {
+                "checks": 0,
+                "unchanged": 0,
+                "no_reference": 0,
+                "thresholds": {},
+                "scores": deque(maxlen=200),
+            }
+        return stats
+
+    def check(
+        self,
+        camera_id: int,
+        spot_number: int,
+        crop: np.ndarray,
+        bbox=None,
+        threshold: float | None = None,
+    ) -> tuple[bool, float | None]:
+        """Return ``(unchanged, score)`` for ``crop``; score is ``None`` without a reference."""
+        threshold = self.threshold if threshold is None else threshold
+        thumb = thumbnail(crop, self.thumb_size)
+        key = (camera_id, spot_number)
+        bbox = tuple(bbox) if bbox is not None else None
+        with self._lock:
+            ref = self._refs.get(key)
+        score = None
+        if ref is not None and ref[0] == bbox:
+            score = difference(ref[1], thumb, self.method)
+        unchanged = score is not None and score < threshold
+        with self._lock:
+            if not unchanged:
+                self._refs[key] = (bbox, thumb)
+            stats = self._camera(camera_id)
+            stats["checks"] += 1
+            stats["unchanged"] += int(unchanged)
+            stats["no_reference"] += int(score is None)
+            stats["thresholds"][spot_number] = threshold
+            if score is not None:
+                stats["scores"].append(score)
+        return unchanged, score
+
+    def forget(self, camera_id: int | None = None) -> None:
+        with self._lock:
+            for key in [k for k in self._refs if camera_id is None or k[0] == camera_id]:
+                del self._refs[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            cameras = {
+                cam: {**s, "thresholds": dict(s["thresholds"]), "scores": sorted(s["scores"])}
+                for cam, s in self._cameras.items()
+            }
+        report = {}
+        for cam, s in cameras.items():
+            scores = s.pop("scores")
+            s["hit_rate"] = round(s["unchanged"] / s["checks"], 4) if s["checks"] else None
+            s["score_p50"] = round(scores[len(scores) // 2], 3) if scores else None
+            s["score_p95"] = round(scores[min(len(scores) - 1, int(len(scores) * 0.95))], 3) if scores else None
+            report[cam] = s
+        return {
+            "enabled": self.enabled,
+            "method": self.method,
+            "default_threshold": self.threshold,
+            "cameras": report,
+        }
+
+
+MOTION_GATE = MotionGate(
+    MOTION_GATE_METHOD,
+    MOTION_GATE_THRESHOLD,
+    MOTION_GATE_THUMB,
+    enabled=MOTION_GATE_ENABLED,
+)
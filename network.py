@@ -3,6 +3,7 @@
 import time
 import requests
 from logger import logger
+from metrics import NETWORK_STATS, payload_size
 
 def send_request_with_retry(url: str, payload: dict, max_retries: int = 2, backoff: float = 1.0) -> str:
     """
@@ -14,12 +15,16 @@ def send_request_with_retry(url: str, payload: dict, max_retries: int = 2, backo
 
     Raises any ``requests`` exception after the final retry.
     """
+    bytes_out = payload_size(payload)
     for attempt in range(max_retries + 1):
+        start = time.monotonic()
         try:
             r = requests.post(url, json=payload, timeout=10)
             r.raise_for_status()
+            NETWORK_STATS.record(url, bytes_out, len(r.text or ""), time.monotonic() - start)
             return r.text  # some endpoints return a quoted JSON-string
         except Exception as e:
+            NETWORK_STATS.record(url, bytes_out, 0, time.monotonic() - start, ok=False)
             logger.error("send_request_with_retry attempt %d failed: %s", attempt + 1, e, exc_info=True)
             if attempt < max_retries:
                 time.sleep(backoff * (2 ** attempt))
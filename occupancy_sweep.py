@@ -0,0 +1,264 @@
+# occupancy_sweep.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from db import SessionLocal
+from image_decode import decode
+from logger import logger
+from metrics import LatencyWindow
+from models import Camera, Location, Pole, Ticket
+from spot_index import SPOT_INDEX
+from utils import parse_location_params, resolve_detector_imgsz
+
+ACTIONS = ("close", "flag")
+
+
+@dataclass
+class CameraTarget:
+    """A camera with open tickets and what is needed to grab and close them."""
+
+    camera_id: int
+    pole_id: int
+    camera_ip: str
+    camera_user: str
+    camera_pass: str
+    rtsp_path: str
+    api_pole_id: int | None
+    parkonic_api_token: str | None
+    tickets: dict[int, int] = field(default_factory=dict)  # ticket id -> spot number
+    imgsz: dict[int, int | None] = field(default_factory=dict)  # spot number -> detector size
+
+
+def open_ticket_targets() -> list[CameraTarget]:
+    """Group every open ticket by camera in one query."""
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Ticket.id, Ticket.spot_number, Camera, Pole, Location)
+            .join(Camera, Ticket.camera_id == Camera.id)
+            .join(Pole, Camera.pole_id == Pole.id)
+            .join(Location, Pole.location_id == Location.id)
+            .filter(Ticket.exit_time.is_(None))
+            .all()
+        )
+        targets: dict[int, CameraTarget] = {}
+        params_by_loc: dict[int, dict] = {}
+        for ticket_id, spot_number, cam, pole, loc in rows:
+            params = params_by_loc.get(loc.id)
+            if params is None:
+                params = params_by_loc[loc.id] = parse_location_params(loc.parameters)
+            target = targets.get(cam.id)
+            if target is None:
+                target = targets[cam.id] = CameraTarget(
+                    camera_id=cam.id,
+                    pole_id=pole.id,
+                    camera_ip=cam.p_ip,
+                    camera_user=loc.camera_user or "",
+                    camera_pass=loc.camera_pass or "",
+                    rtsp_path=params.get("rtsp_path", "/") or "/",
+                    api_pole_id=pole.api_pole_id,
+                    parkonic_api_token=loc.parkonic_api_token,
+                )
+            target.tickets[ticket_id] = spot_number
+            target.imgsz[spot_number] = resolve_detector_imgsz(params, cam.id, spot_number)
+        return list(targets.values())
+    finally:
+        db.close()
+
+
+class OccupancySweep:
+    """Periodically re-check spots that still have an open ticket.
+
+    Each sweep grabs one frame per camera with open tickets and runs the
+    presence model once on the crops of all that camera's ticketed spots
+    (once per detector input size when spots of the camera override it).  A
+    ticket whose spot is empty in ``confirmations`` consecutive sweeps is
+    closed through ``close(ticket_id, target, exit_time)`` or, with the
+    ``flag`` action, listed in the stats for review.  Cameras are processed by
+    ``max_workers`` threads with at most ``per_pole`` cameras of a pole at once.
+    """
+
+    def __init__(
+        self,
+        grab,
+        present,
+        close,
+        interval: float = 300.0,
+        action: str = "flag",
+        confirmations: int = 2,
+        max_workers: int = 4,
+        per_pole: int = 1,
+        targets=open_ticket_targets,
+    ):
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown sweep action {action!r}; expected one of {ACTIONS}")
+        self._grab = grab
+        self._present = present
+        self._close = close
+        self._targets = targets
+        self.interval = interval
+        self.action = action
+        self.confirmations = max(1, confirmations)
+        self.max_workers = max_workers
+        self.per_pole = max(1, per_pole)
+        self._pole_slots: dict[int, threading.BoundedSemaphore] = {}
+        self._empty_streak: dict[int, int] = {}
+        self._flagged: dict[int, dict] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="occupancy-sweep")
+        self._sweep_latency = LatencyWindow()
+        self._camera_latency = LatencyWindow()
+        self._counts = {
+            "sweeps": 0,
+            "cameras": 0,
+            "spots_checked": 0,
+            "empty": 0,
+            "closed": 0,
+            "flagged": 0,
+            "errors": 0,
+        }
+        self.last_sweep: datetime | None = None
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    def _pole_slot(self, pole_id: int) -> threading.BoundedSemaphore:
+        with self._lock:
+            slot = self._pole_slots.get(pole_id)
+            if slot is None:
+                slot = self._pole_slots[pole_id] = threading.BoundedSemaphore(self.per_pole)
+            return slot
+
+    def _check_camera(self, target: CameraTarget) -> list[int]:
+        """Return the ids of tickets whose spot looked empty on this camera."""
+        with self._pole_slot(target.pole_id):
+            start = time.monotonic()
+            frame = decode(self._grab(target), op="sweep")
+        if frame is None:
+            raise RuntimeError(f"Undecodable frame from camera {target.camera_id}")
+
+        # Crops are batched by the detector input size the EXIT check would
+        # use for the spot, so both answer the same question.
+        batches: dict[int | None, tuple[list[int], list]] = {}
+        h, w = frame.shape[:2]
+        for ticket_id, spot_number in target.tickets.items():
+            spot = SPOT_INDEX.get(target.camera_id, spot_number)
+            sl = spot.clamped_slices(h, w) if spot is not None else None
+            if sl is None:
+                continue
+            ticket_ids, crops = batches.setdefault(target.imgsz.get(spot_number), ([], []))
+            ticket_ids.append(ticket_id)
+            crops.append(frame[sl])
+        empty, checked = [], 0
+        for imgsz, (ticket_ids, crops) in batches.items():
+            present = self._present(crops, imgsz=imgsz)
+            checked += len(crops)
+            empty.extend(tid for tid, has_car in zip(ticket_ids, present) if not has_car)
+        self._camera_latency.add(time.monotonic() - start)
+        self._count("spots_checked", checked)
+        return empty
+
+    def _act(self, ticket_id: int, target: CameraTarget, now: datetime) -> None:
+        spot_number = target.tickets[ticket_id]
+        if self.action == "close":
+            if self._close(ticket_id, target, now):
+                self._count("closed")
+                logger.info(
+                    "Occupancy sweep closed ticket %d (camera %d spot %d)",
+                    ticket_id, target.camera_id, spot_number,
+                )
+            return
+        with self._lock:
+            if ticket_id in self._flagged:
+                return
+            self._flagged[ticket_id] = {
+                "camera_id": target.camera_id,
+                "spot_number": spot_number,
+                "since": now.isoformat(),
+            }
+            self._counts["flagged"] += 1
+        logger.info(
+            "Occupancy sweep flagged ticket %d (camera %d spot %d) as empty",
+            ticket_id, target.camera_id, spot_number,
+        )
+
+    def sweep(self) -> None:
+        """Run one sweep over every camera with open tickets."""
+        start = time.monotonic()
+        now = datetime.now()
+        targets = self._targets()
+        futures = {self._pool.submit(self._check_camera, t): t for t in targets}
+
+        open_ids = set()
+        for future, target in futures.items():
+            open_ids.update(target.tickets)
+            try:
+                empty = set(future.result())
+            except Exception:
+                self._count("errors")
+                logger.error("Occupancy sweep failed for camera %d", target.camera_id, exc_info=True)
+                continue
+            self._count("empty", len(empty))
+            for ticket_id in target.tickets:
+                with self._lock:
+                    streak = self._empty_streak.get(ticket_id, 0) + 1 if ticket_id in empty else 0
+                    self._empty_streak[ticket_id] = streak
+                    if streak == 0:
+                        self._flagged.pop(ticket_id, None)
+                if streak >= self.confirmations:
+                    try:
+                        self._act(ticket_id, target, now)
+                    except Exception:
+                        self._count("errors")
+                        logger.error("Occupancy sweep could not update ticket %d", ticket_id, exc_info=True)
+
+        with self._lock:
+            # Forget tickets that were closed since the previous sweep.
+            for store in (self._empty_streak, self._flagged):
+                for ticket_id in [t for t in store if t not in open_ids]:
+                    del store[ticket_id]
+            self._counts["sweeps"] += 1
+            self._counts["cameras"] += len(targets)
+        self.last_sweep = now
+        self._sweep_latency.add(time.monotonic() - start)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                self._count("errors")
+                logger.error("Occupancy sweep failed", exc_info=True)
+
+    def start(self) -> None:
+        if self._thread is None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="occupancy-sweep", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            flagged = [{"ticket_id": tid, **info} for tid, info in self._flagged.items()]
+        return {
+            "enabled": self.interval > 0,
+            "interval": self.interval,
+            "action": self.action,
+            "confirmations": self.confirmations,
+            "last_sweep": self.last_sweep.isoformat() if self.last_sweep else None,
+            **counts,
+            "flagged_tickets": flagged,
+            "sweep_latency": self._sweep_latency.snapshot(),
+            "camera_latency": self._camera_latency.snapshot(),
+        }
@@ -0,0 +1,139 @@
+# ocr_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from config import OCR_CACHE_SIZE, OCR_CACHE_TTL, OCR_CACHE_MAX_DISTANCE
+from utils import _avg_hash, _hash_diff
+
+
+@dataclass
+class CachedRead:
+    """A successful OCR read of a plate crop at one spot."""
+
+    camera_id: int
+    spot_number: int
+    phash: np.ndarray
+    shape: tuple[int, int]
+    result: dict
+    image_bytes: bytes
+    stored_at: float
+
+
+class PlateOCRCache:
+    """Bounded TTL/LRU cache of OCR results keyed by a plate-crop hash.
+
+    Entries are grouped per ``(camera_id, spot_number)``.  A lookup hits when
+    a stored crop from the same spot has a similar size and an average hash
+    within ``max_distance`` bits of the new crop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 600.0,
+        max_distance: int = 8,
+        hash_size: int = 16,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self._entries: OrderedDict[int, CachedRead] = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._counts = {"lookups": 0, "hits": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _hash(self, crop: np.ndarray) -> np.ndarray:
+        gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        return _avg_hash(gray, self.hash_size)
+
+    @staticmethod
+    def _similar_shape(a: tuple[int, int], b: tuple[int, int], tol: float = 0.15) -> bool:
+        return all(abs(x - y) <= tol * max(x, y) for x, y in zip(a, b))
+
+    def _expire(self, now: float) -> None:
+        for key in [k for k, e in self._entries.items() if now - e.stored_at > self.ttl]:
+            del self._entries[key]
+            self._counts["expired"] += 1
+
+    def lookup(self, camera_id: int, spot_number: int, crop: np.ndarray) -> CachedRead | None:
+        """Return a cached read for a near-identical crop, or ``None``."""
+        if self.max_entries <= 0 or crop.size == 0:
+            return None
+        phash = self._hash(crop)
+        shape = crop.shape[:2]
+        now = time.monotonic()
+        with self._lock:
+            self._counts["lookups"] += 1
+            self._expire(now)
+            best_key, best_dist = None, None
+            for key, entry in self._entries.items():
+                if entry.camera_id != camera_id or entry.spot_number != spot_number:
+                    continue
+                if not self._similar_shape(entry.shape, shape):
+                    continue
+                dist = _hash_diff(entry.phash, phash)
+                if dist <= self.max_distance and (best_dist is None or dist < best_dist):
+                    best_key, best_dist = key, dist
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            self._counts["hits"] += 1
+            return self._entries[best_key]
+
+    def store(
+        self,
+        camera_id: int,
+        spot_number: int,
+        crop: np.ndarray,
+        result: dict,
+        image_bytes: bytes,
+    ) -> None:
+        """Remember a successful read of ``crop``."""
+        if self.max_entries <= 0 or crop.size == 0:
+            return
+        entry = CachedRead(
+            camera_id=camera_id,
+            spot_number=spot_number,
+            phash=self._hash(crop),
+            shape=crop.shape[:2],
+            result=dict(result),
+            image_bytes=image_bytes,
+            stored_at=time.monotonic(),
+        )
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            self._counts["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            size = len(self._entries)
+        lookups = counts["lookups"]
+        return {
+            **counts,
+            "entries": size,
+            "hit_rate": round(counts["hits"] / lookups, 4) if lookups else 0.0,
+            "saved_ocr_calls": counts["hits"],
+        }
+
+
+OCR_CACHE = PlateOCRCache(
+    max_entries=OCR_CACHE_SIZE,
+    ttl=OCR_CACHE_TTL,
+    max_distance=OCR_CACHE_MAX_DISTANCE,
+)
@@ -0,0 +1,200 @@
+# ocr_client.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+
+from config import (
+    OCR_URLS,
+    OCR_HEDGE_ENABLED,
+    OCR_MIN_TIMEOUT,
+    OCR_MAX_TIMEOUT,
+    OCR_MAX_ATTEMPTS,
+)
+from logger import logger
+from metrics import LatencyWindow, NETWORK_STATS, payload_size
+
+
+class OCRClient:
+    """POST plate crops to one of several OCR endpoints.
+
+    * Endpoints are ranked by their recent median latency (endpoints that
+      failed within ``error_cooldown`` seconds are pushed to the back), so
+      the fastest healthy endpoint gets the primary request.
+    * When the primary request has not answered within the observed p95, a
+      hedged copy is sent to the next endpoint and the first answer wins.
+      With a single endpoint nothing is hedged, as a copy would only add load
+      to the server that is already slow.
+    * The per-request timeout is derived from the observed p99 instead of a
+      fixed 10 seconds.
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        hedge: bool = True,
+        min_timeout: float = 2.0,
+        max_timeout: float = 10.0,
+        timeout_multiplier: float = 3.0,
+        min_samples: int = 20,
+        max_attempts: int = 3,
+        error_cooldown: float = 60.0,
+        max_workers: int = 8,
+    ):
+        if not urls:
+            raise ValueError("OCRClient requires at least one endpoint URL")
+        self.urls = list(urls)
+        self.hedge = hedge
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.max_attempts = max_attempts
+        self.error_cooldown = error_cooldown
+
+        self._latency = LatencyWindow()
+        self._endpoint_latency = {u: LatencyWindow() for u in self.urls}
+        self._endpoint_errors = {u: 0 for u in self.urls}
+        self._last_error_at = {u: 0.0 for u in self.urls}
+        self._counts = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failures": 0}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr")
+
+    # ── selection & timeouts ────────────────────────────────────────────────
+    def ranked_urls(self) -> list[str]:
+        """Return endpoints ordered from most to least preferred."""
+        now = time.monotonic()
+        with self._lock:
+            failing = {
+                u: bool(self._last_error_at[u]) and now - self._last_error_at[u] < self.error_cooldown
+                for u in self.urls
+            }
+
+        def key(url):
+            median = self._endpoint_latency[url].percentile(50)
+            # Unmeasured endpoints sort first so that every URL gets sampled.
+            return (failing[url], -1.0 if median is None else median)
+
+        return sorted(self.urls, key=key)
+
+    def hedge_delay(self) -> float | None:
+        """Return the delay before hedging, or ``None`` while data is sparse."""
+        if not self.hedge or len(self._latency) < self.min_samples:
+            return None
+        return self._latency.percentile(95)
+
+    def timeout(self) -> float:
+        """Return the adaptive request timeout in seconds."""
+        if len(self._latency) < self.min_samples:
+            return self.max_timeout
+        p99 = self._latency.percentile(99)
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    # ── requests ────────────────────────────────────────────────────────────
+    def _post(self, url: str, payload: dict, timeout: float) -> str:
+        start = time.monotonic()
+        bytes_out = payload_size(payload)
+        try:
+            r = requests.post(url, json=payload, timeout=timeout)
+            r.raise_for_status()
+        except Exception:
+            NETWORK_STATS.record(url, bytes_out, 0, time.monotonic() - start, ok=False)
+            with self._lock:
+                self._endpoint_errors[url] += 1
+                self._last_error_at[url] = time.monotonic()
+            raise
+        elapsed = time.monotonic() - start
+        NETWORK_STATS.record(url, bytes_out, len(r.text or ""), elapsed)
+        self._latency.add(elapsed)
+        self._endpoint_latency[url].add(elapsed)
+        with self._lock:
+            self._last_error_at[url] = 0.0
+        return r.text  # the OCR engine returns a quoted JSON-string
+
+    def _attempt(self, primary: str, secondary: str, payload: dict) -> str:
+        timeout = self.timeout()
+        futures = {self._pool.submit(self._post, primary, payload, timeout): False}
+
+        delay = self.hedge_delay() if secondary != primary else None
+        if delay is not None:
+            done, _ = wait(list(futures), timeout=delay)
+            if not done:
+                futures[self._pool.submit(self._post, secondary, payload, timeout)] = True
+                with self._lock:
+                    self._counts["hedged"] += 1
+                logger.debug("OCR request exceeded p95 (%.3fs); hedging to %s", delay, secondary)
+
+        pending = set(futures)
+        last_exc: Exception | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    last_exc = e
+                    continue
+                if futures[fut]:
+                    with self._lock:
+                        self._counts["hedge_wins"] += 1
+                return result
+        raise last_exc if last_exc else RuntimeError("OCR request failed")
+
+    def request(self, payload: dict) -> str:
+        """Send ``payload`` to the OCR engine and return the raw response text.
+
+        Each attempt goes to the currently best ranked endpoint (failing over
+        to the next one on error).  Raises the last exception once
+        ``max_attempts`` attempts have failed.
+        """
+        with self._lock:
+            self._counts["requests"] += 1
+        for attempt in range(self.max_attempts):
+            ranked = self.ranked_urls()
+            primary = ranked[attempt % len(ranked)]
+            secondary = ranked[(attempt + 1) % len(ranked)]
+            try:
+                return self._attempt(primary, secondary, payload)
+            except Exception as e:
+                logger.error("OCR attempt %d via %s failed: %s", attempt + 1, primary, e, exc_info=True)
+                if attempt == self.max_attempts - 1:
+                    with self._lock:
+                        self._counts["failures"] += 1
+                    raise
+
+    def stats(self) -> dict:
+        """Return hedge rate, tail latencies and per-endpoint figures."""
+        with self._lock:
+            counts = dict(self._counts)
+            errors = dict(self._endpoint_errors)
+        requests_total = counts["requests"]
+        return {
+            **counts,
+            "hedge_rate": round(counts["hedged"] / requests_total, 4) if requests_total else 0.0,
+            "timeout_s": round(self.timeout(), 3),
+            "latency": self._latency.snapshot(),
+            "endpoints": [
+                {"url": u, "errors": errors[u], "latency": self._endpoint_latency[u].snapshot()}
+                for u in self.urls
+            ],
+        }
+
+
+OCR_CLIENT = OCRClient(
+    OCR_URLS,
+    hedge=OCR_HEDGE_ENABLED,
+    min_timeout=OCR_MIN_TIMEOUT,
+    max_timeout=OCR_MAX_TIMEOUT,
+    max_attempts=OCR_MAX_ATTEMPTS,
+)
+
+
+def send_ocr_request(payload: dict) -> str:
+    """POST ``payload`` to the OCR engine through the shared client."""
+    return OCR_CLIENT.request(payload)
+
+
+def ocr_stats() -> dict:
+    return OCR_CLIENT.stats()
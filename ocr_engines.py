@@ -0,0 +1,230 @@
+# ocr_engines.py
+
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from config import (
+    OCR_POLICY,
+    LOCAL_OCR_MODEL_PATH,
+    LOCAL_OCR_CHARSET,
+    LOCAL_OCR_CITY,
+    LOCAL_OCR_MIN_CONFIDENCE,
+)
+from logger import logger
+from metrics import LatencyWindow
+from thread_budget import ort_session_options
+
+try:
+    import onnxruntime as ort
+except Exception:  # pragma: no cover - optional dep
+    ort = None  # type: ignore
+
+
+POLICIES = ("cloud", "local", "local_first", "cloud_first", "local_then_cloud")
+
+
+def _confidence(result: dict | None) -> int:
+    try:
+        return int(result.get("confidance", 0)) if result else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+class LocalCRNNEngine:
+    """On-box plate reader running a CRNN exported to ONNX.
+
+    The model takes a ``(1, C, H, W)`` float image in ``[0, 1]`` and returns
+    per-timestep class scores shaped ``(T, 1, K)`` or ``(1, T, K)``; class 0 is
+    the CTC blank and class ``i`` maps to ``charset[i - 1]``.  A ``-`` in the
+    decoded string separates the plate category from the number (``"A-12345"``).
+    The result uses the cloud engine's ``text``/``category``/``cityName``/
+    ``confidance`` keys, with confidence scaled to 0-10.
+    """
+
+    def __init__(self, model_path: str, charset: str, city: str = ""):
+        self.model_path = model_path
+        self.charset = charset
+        self.city = city
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return ort is not None and bool(self.model_path) and os.path.isfile(self.model_path)
+
+    def _load(self):
+        with self._lock:
+            if self._session is None:
+                self._session = ort.InferenceSession(
+                    self.model_path,
+                    sess_options=ort_session_options(),
+                    providers=["CPUExecutionProvider"],
+                )
+        return self._session
+
+    def _preprocess(self, plate_rgb: np.ndarray, shape) -> np.ndarray:
+        _, channels, height, width = shape
+        height = height if isinstance(height, int) else 32
+        width = width if isinstance(width, int) else 100
+        if channels == 1:
+            img = cv2.cvtColor(plate_rgb, cv2.COLOR_RGB2GRAY)[:, :, None]
+        else:
+            img = plate_rgb
+        img = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA)
+        if img.ndim == 2:
+            img = img[:, :, None]
+        return (img.astype(np.float32) / 255.0).transpose(2, 0, 1)[None]
+
+    def decode(self, scores: np.ndarray) -> tuple[str, float]:
+        """Greedy CTC decoding of ``(T, K)`` scores into text and mean probability."""
+        if scores.max() > 1.0 or scores.min() < 0.0:
+            exp = np.exp(scores - scores.max(axis=1, keepdims=True))
+            scores = exp / exp.sum(axis=1, keepdims=True)
+        best = scores.argmax(axis=1)
+        probs = scores.max(axis=1)
+        chars, kept = [], []
+        prev = 0
+        for idx, p in zip(best, probs):
+            if idx != 0 and idx != prev and idx - 1 < len(self.charset):
+                chars.append(self.charset[idx - 1])
+                kept.append(p)
+            prev = idx
+        return "".join(chars), float(np.mean(kept)) if kept else 0.0
+
+    def read(self, plate_rgb: np.ndarray) -> dict | None:
+        session = self._load()
+        inp = session.get_inputs()[0]
+        out = session.run(None, {inp.name: self._preprocess(plate_rgb, inp.shape)})[0]
+        out = np.asarray(out)
+        scores = out[:, 0, :] if out.shape[1] == 1 else out[0]
+        text, prob = self.decode(scores)
+        if not text:
+            return None
+        category, _, number = text.rpartition("-")
+        return {
+            "text": number,
+            "category": category,
+            "cityName": self.city,
+            "confidance": int(round(prob * 10)),
+        }
+
+
+class OCRPolicy:
+    """Choose between the cloud OCR engine and a local engine per request.
+
+    * ``cloud`` / ``local`` – use only that engine.
+    * ``local_first`` / ``cloud_first`` – try one engine, use the other when
+      it errors or returns nothing.
+    * ``local_then_cloud`` – read locally and only call the cloud engine when
+      the local confidence is below ``min_confidence``.
+
+    Without a usable local engine every policy behaves like ``cloud``.
+    """
+
+    def __init__(self, policy: str, local: LocalCRNNEngine | None, min_confidence: int = 7):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown OCR policy {policy!r}; expected one of {POLICIES}")
+        self.policy = policy
+        self.local = local
+        self.min_confidence = min_confidence
+        self._latency = {"cloud": LatencyWindow(), "local": LatencyWindow()}
+        self._counts = {
+            "cloud": {"calls": 0, "errors": 0, "answers": 0},
+            "local": {"calls": 0, "errors": 0, "answers": 0},
+        }
+        self._escalations = 0
+        self._lock = threading.Lock()
+
+    def effective_policy(self) -> str:
+        if self.local is None or not self.local.available:
+            return "cloud"
+        return self.policy
+
+    def _run(self, name: str, func, swallow: bool = False) -> dict | None:
+        """Call one engine; errors are only swallowed when another can answer."""
+        start = time.monotonic()
+        with self._lock:
+            self._counts[name]["calls"] += 1
+        try:
+            result = func()
+        except Exception:
+            with self._lock:
+                self._counts[name]["errors"] += 1
+            if not swallow:
+                raise
+            logger.error("%s OCR engine failed", name, exc_info=True)
+            return None
+        finally:
+            self._latency[name].add(time.monotonic() - start)
+        return result
+
+    def _answer(self, name: str, result: dict | None) -> dict | None:
+        if result is not None:
+            with self._lock:
+                self._counts[name]["answers"] += 1
+            result = dict(result)
+            result.setdefault("engine", name)
+        return result
+
+    def read(self, cloud_read, plate_rgb) -> dict | None:
+        """Return an OCR result dict using ``cloud_read()`` and/or the local engine.
+
+        ``plate_rgb`` is the plate crop as an RGB array, or a callable returning
+        it so the array is only built when the local engine is consulted.
+        """
+        policy = self.effective_policy()
+
+        def local_read():
+            return self.local.read(plate_rgb() if callable(plate_rgb) else plate_rgb)
+
+        if policy == "cloud":
+            return self._answer("cloud", self._run("cloud", cloud_read))
+        if policy == "local":
+            return self._answer("local", self._run("local", local_read))
+
+        if policy == "cloud_first":
+            order = (("cloud", cloud_read), ("local", local_read))
+        else:
+            order = (("local", local_read), ("cloud", cloud_read))
+
+        (first_name, first), (second_name, second) = order
+        result = self._run(first_name, first, swallow=True)
+        if result is not None:
+            if policy != "local_then_cloud" or _confidence(result) >= self.min_confidence:
+                return self._answer(first_name, result)
+        with self._lock:
+            self._escalations += 1
+        fallback = self._run(second_name, second, swallow=result is not None)
+        if fallback is None or (
+            result is not None and _confidence(result) >= _confidence(fallback)
+        ):
+            # Keep the low-confidence local read if the cloud did no better.
+            return self._answer(first_name, result)
+        return self._answer(second_name, fallback)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {k: dict(v) for k, v in self._counts.items()}
+            escalations = self._escalations
+        return {
+            "policy": self.policy,
+            "effective_policy": self.effective_policy(),
+            "escalations": escalations,
+            "engines": {
+                name: {**counts[name], "latency": self._latency[name].snapshot()}
+                for name in ("cloud", "local")
+            },
+        }
+
+
+OCR_ENGINES = OCRPolicy(
+    OCR_POLICY,
+    LocalCRNNEngine(LOCAL_OCR_MODEL_PATH, LOCAL_OCR_CHARSET, LOCAL_OCR_CITY)
+    if LOCAL_OCR_MODEL_PATH
+    else None,
+    min_confidence=LOCAL_OCR_MIN_CONFIDENCE,
+)
@@ -4,23 +4,61 @@ import os
 import shutil
 import base64
 import json
-import io
+import random
+import threading
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 import numpy as np
 import cv2
 from PIL import Image, ImageDraw
 
-from camera_clip import request_camera_clip, fetch_camera_frame
-from network import send_request_with_retry
-
-from config import OCR_TOKEN, YOLO_MODEL_PATH
+from camera_clip import (
+    request_camera_clip,
+    fetch_camera_frame,
+    fetch_camera_burst,
+    FramePrefetch,
+)
+from ocr_client import send_ocr_request
+from ocr_engines import OCR_ENGINES
+from image_budget import OCR_BUDGET, PARKIN_BUDGET, budget_file, budget_b64
+from ocr_cache import OCR_CACHE
+
+from config import (
+    OCR_TOKEN,
+    YOLO_MODEL_PATH,
+    FRAME_PREFETCH_ENABLED,
+    OCR_FALLBACK_MODE,
+    OCR_BURST_FRAMES,
+    PRESENCE_MODEL_PATH,
+    PRESENCE_IMGSZ,
+    PRESENCE_CONF,
+    PRESENCE_SHADOW_RATE,
+    VEHICLE_ROI_ENABLED,
+    VEHICLE_ROI_MARGIN,
+    CAMERA_FRAME_ANALYSIS,
+    FRAME_ANALYSIS_WINDOW,
+    FRAME_ANALYSIS_MIN_CONTAINMENT,
+    FRAME_CHANGE_GATE,
+    FRAME_CHANGE_MAX_DISTANCE,
+    SAME_CAR_CHECK,
+    SPOT_FEATURE_CACHE_SIZE,
+)
 from image_enhancer import enhance_image_array
 
-from models import PlateLog, Ticket, ManualReview, Spot
+from models import PlateLog, Ticket, ManualReview
+from spot_index import SPOT_INDEX
 from db import SessionLocal
 from logger import logger
-from utils import is_same_image
+from utils import plate_crop_score, vehicle_roi
+from metrics import LatencyWindow
+from model_swap import ShadowCandidate
+from frame_analysis import CameraFrameAnalyzer
+from spot_features import SpotFeatureCache
+from spot_hashes import SPOT_HASHES, EVENT_HASHES
+from motion_gate import MOTION_GATE
+from image_decode import decode_roi, read_image
 
 from ultralytics import YOLO
 
@@ -33,48 +71,499 @@ os.makedirs(PLATES_READ_DIR,   exist_ok=True)
 os.makedirs(PLATES_UNREAD_DIR, exist_ok=True)
 os.makedirs(SPOT_LAST_DIR,      exist_ok=True)
 
+# Features of the last accepted image per spot for the same-car check.
+SPOT_FEATURES = SpotFeatureCache(SPOT_LAST_DIR, SPOT_FEATURE_CACHE_SIZE)
+
 # Load YOLO model (CPU)
 plate_model = YOLO(YOLO_MODEL_PATH)
 
+# Optional lightweight vehicle-presence model; the plate detector answers the
+# EXIT check when none is configured.
+presence_model = YOLO(PRESENCE_MODEL_PATH) if PRESENCE_MODEL_PATH else None
 
-def spot_has_car(image: Image.Image | bytes, camera_id: int, spot_number: int) -> bool:
-    """Return True if the cropped spot contains a car based on YOLO detection."""
-    if isinstance(image, bytes):
-        img = Image.open(io.BytesIO(image))
-    else:
-        img = image
+EMPTY_SPOT_LABELS = {"empty", "vacant", "free", "background", "none"}
+
+_detector_latency = LatencyWindow()
+_presence_latency = LatencyWindow()
+_presence_shadow = {"checks": 0, "agree": 0, "presence_only": 0, "detector_only": 0}
+_presence_shadow_lock = threading.Lock()
 
-    db = SessionLocal()
+
+# Candidate weights under shadow evaluation, see ``load_candidate``.
+plate_model_path = YOLO_MODEL_PATH
+_candidate: ShadowCandidate | None = None
+_swap_lock = threading.Lock()
+
+
+def _detect(arr, imgsz: int | None = None):
+    """Run the plate detector, at ``imgsz`` when configured for the camera."""
+    model = plate_model
+    start = time.monotonic()
     try:
-        spot = (
-            db.query(Spot)
-            .filter_by(camera_id=camera_id, spot_number=spot_number)
-            .first()
-        )
+        if imgsz:
+            results = model(arr, imgsz=imgsz)
+        else:
+            results = model(arr)
     finally:
-        db.close()
+        elapsed = time.monotonic() - start
+        _detector_latency.add(elapsed)
 
-    if spot is None:
+    candidate = _candidate
+    if candidate is not None and isinstance(arr, np.ndarray):
+        candidate.offer(arr, imgsz, results, elapsed)
+    return results
+
+
+def load_candidate(path: str, sample_rate: float) -> dict:
+    """Start loading candidate detector weights for shadow evaluation."""
+    global _candidate
+    with _swap_lock:
+        if _candidate is not None:
+            _candidate.close()
+        _candidate = ShadowCandidate(path, sample_rate=sample_rate)
+        return _candidate.stats()
+
+
+def candidate_stats() -> dict | None:
+    candidate = _candidate
+    return candidate.stats() if candidate is not None else None
+
+
+def discard_candidate() -> bool:
+    global _candidate
+    with _swap_lock:
+        if _candidate is None:
+            return False
+        _candidate.close()
+        _candidate = None
+        return True
+
+
+def promote_candidate() -> dict:
+    """Make the loaded candidate the primary detector.
+
+    The swap is a single reference assignment, so detections already running
+    finish on the old weights and the next one uses the new weights.
+    """
+    global plate_model, plate_model_path, _candidate
+    with _swap_lock:
+        if _candidate is None:
+            raise ValueError("No candidate detector loaded")
+        if _candidate.state != "ready":
+            raise ValueError(f"Candidate detector is {_candidate.state}")
+        report = _candidate.stats()
+        plate_model = _candidate.model
+        plate_model_path = _candidate.path
+        _candidate.close()
+        _candidate = None
+    logger.info("Promoted candidate detector %s", plate_model_path)
+    return report
+
+
+def _results_have_vehicle(results, conf: float = PRESENCE_CONF) -> bool:
+    """Interpret classifier or detector results as vehicle present / absent."""
+    if not results:
         return False
+    res = results[0]
+    probs = getattr(res, "probs", None)
+    if probs is not None:
+        label = str(res.names[int(probs.top1)]).lower()
+        return label not in EMPTY_SPOT_LABELS and float(probs.top1conf) >= conf
+    boxes = res.boxes
+    if not boxes:
+        return False
+    confs = getattr(boxes, "conf", None)
+    if confs is None:
+        return True
+    return bool((np.asarray(confs) >= conf).any())
 
-    left, top, right, bottom = (
-        spot.bbox_x1,
-        spot.bbox_y1,
-        spot.bbox_x2,
-        spot.bbox_y2,
+
+def _presence_results(arr, imgsz: int | None = None):
+    """Run the presence check on one crop or a list of crops.
+
+    Returns ``(results, thresholded)``.  Without a presence model or an
+    explicit ``PRESENCE_IMGSZ`` this is the plate detector at the camera's
+    input size, and any box counts as a vehicle.
+    """
+    start = time.monotonic()
+    try:
+        if presence_model is not None:
+            if PRESENCE_IMGSZ:
+                return presence_model(arr, imgsz=PRESENCE_IMGSZ), True
+            return presence_model(arr), True
+        if PRESENCE_IMGSZ:
+            return plate_model(arr, imgsz=PRESENCE_IMGSZ), True
+        return _detect(arr, imgsz), False
+    finally:
+        _presence_latency.add(time.monotonic() - start)
+
+
+def _record_shadow(present: bool, full: bool) -> None:
+    with _presence_shadow_lock:
+        _presence_shadow["checks"] += 1
+        if full == present:
+            _presence_shadow["agree"] += 1
+        elif present:
+            _presence_shadow["presence_only"] += 1
+        else:
+            _presence_shadow["detector_only"] += 1
+
+
+def vehicle_present(arr: np.ndarray, imgsz: int | None = None) -> bool:
+    """Return True if the spot crop ``arr`` contains a vehicle.
+
+    ``imgsz`` is the camera's plate detector input size, used when the plate
+    detector itself answers the check.
+    """
+    results, thresholded = _presence_results(arr, imgsz)
+    if not thresholded:
+        return bool(results and results[0].boxes)
+    present = _results_have_vehicle(results)
+
+    if PRESENCE_SHADOW_RATE > 0 and random.random() < PRESENCE_SHADOW_RATE:
+        try:
+            full = bool(_detect(arr, imgsz)[0].boxes)
+        except Exception:
+            logger.debug("Shadow presence check failed", exc_info=True)
+        else:
+            _record_shadow(present, full)
+    return present
+
+
+def vehicles_present(arrs: list[np.ndarray], imgsz: int | None = None) -> list[bool]:
+    """``vehicle_present`` for several spot crops in one batched inference."""
+    if not arrs:
+        return []
+    results, thresholded = _presence_results(list(arrs), imgsz)
+    if not thresholded:
+        return [bool(res.boxes) for res in results]
+    return [_results_have_vehicle([res]) for res in results]
+
+
+def detector_stats() -> dict:
+    detector = _detector_latency.snapshot()
+    presence = _presence_latency.snapshot()
+    with _presence_shadow_lock:
+        shadow = dict(_presence_shadow)
+    shadow["agreement"] = (
+        round(shadow["agree"] / shadow["checks"], 4) if shadow["checks"] else None
     )
-    crop = img.crop((left, top, right, bottom))
-    arr = np.array(crop)
-    results = plate_model(arr)
+    speedup = None
+    if detector["p50_ms"] and presence["p50_ms"]:
+        speedup = round(detector["p50_ms"] / presence["p50_ms"], 2)
+    return {
+        "plate_detector": {**detector, "model": plate_model_path},
+        "presence": {
+            **presence,
+            "model": PRESENCE_MODEL_PATH
+            or (f"{plate_model_path}@{PRESENCE_IMGSZ}" if PRESENCE_IMGSZ else plate_model_path),
+            "speedup_p50": speedup,
+            "shadow": shadow,
+        },
+        "candidate": candidate_stats(),
+        "frame_analysis": {
+            "enabled": CAMERA_FRAME_ANALYSIS,
+            **FRAME_ANALYZER.stats(),
+            "spot_hashes": SPOT_HASHES.stats(),
+        },
+        "event_change_gate": {
+            "enabled": FRAME_CHANGE_GATE,
+            "max_distance": FRAME_CHANGE_MAX_DISTANCE,
+            **EVENT_HASHES.stats(),
+        },
+    }
+
+
+def spot_has_car(
+    image: Image.Image | bytes,
+    camera_id: int,
+    spot_number: int,
+    imgsz: int | None = None,
+) -> bool:
+    """Return True if the cropped spot contains a car.
+
+    Uses the presence model when one is configured, otherwise the plate
+    detector at the camera's input size ``imgsz``.
+    """
+    spot = SPOT_INDEX.get(camera_id, spot_number)
+    if spot is None:
+        return False
+
+    if isinstance(image, bytes):
+        # Only the spot region of the frame is decoded.
+        crop = decode_roi(image, spot.bbox, op="exit_roi")
+        if crop is None:
+            raise ValueError("Cannot decode frame for spot check")
+    else:
+        crop = np.array(image.crop(spot.bbox))
+    return vehicle_present(crop, imgsz)
+
+
+_ROI_COUNTERS = (
+    "events",
+    "roi_used",
+    "roi_unavailable",
+    "roi_detections",
+    "roi_fallbacks",
+    "full_detections",
+    "full_pixels",
+    "processed_pixels",
+)
+_roi_stats: dict[int, dict[str, int]] = defaultdict(lambda: dict.fromkeys(_ROI_COUNTERS, 0))
+
+
+def _first_box(results) -> tuple[int, int, int, int] | None:
     if results and results[0].boxes:
-        return True
-        # classes = results[0].boxes.cls
-        # try:
-        #     cls_list = classes.tolist()
-        # except Exception:
-        #     cls_list = list(classes)
-        # return 2 in cls_list
-    return False
+        x1p, y1p, x2p, y2p = results[0].boxes.xyxy[0].tolist()
+        return tuple(map(int, (x1p, y1p, x2p, y2p)))
+    return None
+
+
+def _locate_plate(
+    main_crop: Image.Image,
+    roi: tuple[int, int, int, int] | None,
+    camera_id: int,
+    imgsz: int | None = None,
+) -> tuple[int, int, int, int] | None:
+    """Return the plate box in ``main_crop`` coordinates, or ``None``.
+
+    When vehicle ROI mode is on the detector first runs on ``roi`` only and
+    falls back to the whole spot crop if the ROI is unavailable or yields no
+    plate.
+    """
+    if not VEHICLE_ROI_ENABLED:
+        return _first_box(_detect(np.array(main_crop), imgsz))
+
+    stats = _roi_stats[camera_id]
+    full_pixels = main_crop.width * main_crop.height
+    stats["events"] += 1
+    stats["full_pixels"] += full_pixels
+
+    if roi is None:
+        stats["roi_unavailable"] += 1
+    else:
+        stats["roi_used"] += 1
+        stats["processed_pixels"] += (roi[2] - roi[0]) * (roi[3] - roi[1])
+        box = _first_box(_detect(np.array(main_crop.crop(roi)), imgsz))
+        if box is not None:
+            stats["roi_detections"] += 1
+            return (box[0] + roi[0], box[1] + roi[1], box[2] + roi[0], box[3] + roi[1])
+        stats["roi_fallbacks"] += 1
+
+    stats["processed_pixels"] += full_pixels
+    box = _first_box(_detect(np.array(main_crop), imgsz))
+    if box is not None:
+        stats["full_detections"] += 1
+    return box
+
+
+def motion_gate_stats() -> dict:
+    """Per-camera thresholds and hit rates of the motion gate."""
+    return MOTION_GATE.stats()
+
+
+def same_car_stats() -> dict:
+    """Decision counts and latency of the per-spot same-car check."""
+    return {"enabled": SAME_CAR_CHECK, **SPOT_FEATURES.stats()}
+
+
+def roi_stats() -> dict:
+    """Per-camera pixel savings and detection rates of the vehicle ROI mode."""
+    report = {}
+    for camera_id, counts in list(_roi_stats.items()):
+        c = dict(counts)
+        c["pixel_savings"] = (
+            round(1 - c["processed_pixels"] / c["full_pixels"], 4) if c["full_pixels"] else None
+        )
+        c["roi_detection_rate"] = (
+            round(c["roi_detections"] / c["roi_used"], 4) if c["roi_used"] else None
+        )
+        c["detection_rate"] = (
+            round((c["roi_detections"] + c["full_detections"]) / c["events"], 4)
+            if c["events"]
+            else None
+        )
+        report[str(camera_id)] = c
+    return {"enabled": VEHICLE_ROI_ENABLED, "cameras": report}
+
+
+FRAME_ANALYZER = CameraFrameAnalyzer(
+    lambda frame, imgsz: _detect(frame, imgsz),
+    window=FRAME_ANALYSIS_WINDOW,
+    min_containment=FRAME_ANALYSIS_MIN_CONTAINMENT,
+    hashes=SPOT_HASHES if FRAME_CHANGE_GATE else None,
+    max_change=FRAME_CHANGE_MAX_DISTANCE,
+)
+
+
+def _plate_box_from_frame(
+    frame: np.ndarray,
+    camera_id: int,
+    spot,
+    imgsz: int | None = None,
+) -> tuple[int, int, int, int] | None:
+    """Return the spot's plate box (spot-crop coordinates) from the shared
+    whole-frame analysis of the camera, or ``None``."""
+    det = FRAME_ANALYZER.spot(
+        camera_id, spot.spot_number, frame, SPOT_INDEX.camera_spots(camera_id), imgsz
+    )
+    if det is None or det.plate_box is None:
+        return None
+    left, top, right, bottom = spot.bbox
+    x1, y1, x2, y2 = det.plate_box
+    x1, x2 = max(x1, left) - left, min(x2, right) - left
+    y1, y2 = max(y1, top) - top, min(y2, bottom) - top
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2, y2
+
+
+def _parse_ocr_response(ocr_response) -> dict | None:
+    """Return the OCR result dict from the (possibly double encoded) response."""
+    logger.debug(f"Raw OCR response: {ocr_response!r}")
+    if not isinstance(ocr_response, str):
+        logger.debug("OCR response not str → UNREAD")
+        return None
+    try:
+        intermediate = json.loads(ocr_response)
+    except Exception:
+        logger.error("First json.loads failed", exc_info=True)
+        return None
+    if isinstance(intermediate, str):
+        try:
+            intermediate = json.loads(intermediate)
+        except Exception:
+            logger.error("Second json.loads failed", exc_info=True)
+            return None
+    if not isinstance(intermediate, dict):
+        logger.error("Unexpected OCR intermediate type: %s", type(intermediate).__name__)
+        return None
+    return intermediate
+
+
+def _ocr_plate(
+    plate_crop: Image.Image,
+    candidate_path: str,
+    pole_id: int,
+    camera_id: int,
+    spot_number: int,
+    on_miss=None,
+) -> dict | None:
+    """Enhance ``plate_crop``, save it to ``candidate_path`` and OCR it.
+
+    A near-identical crop read recently at the same spot is answered from
+    ``OCR_CACHE`` without enhancement or an OCR call.  ``on_miss`` is called
+    before a real OCR call is made.  Returns the parsed OCR result dict or
+    ``None``.
+    """
+    raw_arr = np.array(plate_crop)
+    cached = OCR_CACHE.lookup(camera_id, spot_number, raw_arr)
+    if cached is not None:
+        logger.debug("OCR cache hit for camera %d spot %d", camera_id, spot_number)
+        with open(candidate_path, "wb") as f:
+            f.write(cached.image_bytes)
+        return {**cached.result, "engine": "cache"}
+    if on_miss is not None:
+        on_miss()
+
+    # Enhance crop before sending to OCR
+    try:
+        arr_bgr = cv2.cvtColor(raw_arr, cv2.COLOR_RGB2BGR)
+        arr_bgr = enhance_image_array(arr_bgr)
+        plate_crop = Image.fromarray(cv2.cvtColor(arr_bgr, cv2.COLOR_BGR2RGB))
+    except Exception:
+        logger.error("Plate enhancement failed", exc_info=True)
+
+    plate_crop.save(candidate_path)
+
+    with open(candidate_path, "rb") as f:
+        plate_bytes = f.read()
+
+    def cloud_read():
+        # Base64-encode the budgeted plate crop and send it to the cloud OCR engine
+        ocr_payload = {
+            "token":   OCR_TOKEN,
+            "base64":  base64.b64encode(budget_file(candidate_path, OCR_BUDGET)).decode("utf-8"),
+            "pole_id": pole_id,
+        }
+        return _parse_ocr_response(send_ocr_request(ocr_payload))
+
+    ocr_json = OCR_ENGINES.read(cloud_read, lambda: np.array(plate_crop.convert("RGB")))
+
+    try:
+        if ocr_json is not None and int(ocr_json.get("confidance", 0)) >= 5:
+            OCR_CACHE.store(camera_id, spot_number, raw_arr, ocr_json, plate_bytes)
+    except (TypeError, ValueError):
+        pass
+    return ocr_json
+
+
+def _grab_fallback(
+    camera_ip: str,
+    camera_user: str | None,
+    camera_pass: str | None,
+    rtsp_path: str = "/",
+    cancel_event=None,
+):
+    """Grab what the UNREAD fallback needs: one JPEG or a burst of frames."""
+    if OCR_FALLBACK_MODE == "best_frame":
+        return fetch_camera_burst(
+            camera_ip,
+            camera_user or "",
+            camera_pass or "",
+            rtsp_path=rtsp_path,
+            frames=OCR_BURST_FRAMES,
+            cancel_event=cancel_event,
+        )
+    return fetch_camera_frame(
+        camera_ip,
+        camera_user or "",
+        camera_pass or "",
+        rtsp_path=rtsp_path,
+        cancel_event=cancel_event,
+    )
+
+
+def _select_best_frame(
+    frames: list[np.ndarray],
+    bbox: tuple[int, int, int, int],
+    imgsz: int | None = None,
+) -> tuple[bytes, tuple[int, int, int, int] | None]:
+    """Pick the frame whose plate crop is best suited for OCR.
+
+    The spot ``bbox`` is cropped from every BGR frame and the plate detector
+    runs once on the whole batch.  Each detected plate is scored with
+    ``plate_crop_score`` and the winning frame is returned as JPEG bytes
+    together with the plate box relative to the spot crop (``None`` when no
+    frame shows a plate).
+    """
+    left, top, right, bottom = bbox
+    crops = [
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)[top:bottom, left:right]
+        for frame in frames
+    ]
+    results = _detect(crops, imgsz)
+
+    best = None
+    for idx, (crop, res) in enumerate(zip(crops, results or [])):
+        if not res.boxes:
+            continue
+        x1, y1, x2, y2 = map(int, res.boxes.xyxy[0].tolist())
+        score = plate_crop_score(crop[y1:y2, x1:x2])
+        if best is None or score > best[0]:
+            best = (score, idx, (x1, y1, x2, y2))
+
+    if best is None:
+        logger.debug("No plate in %d burst frames", len(frames))
+        idx, box = 0, None
+    else:
+        logger.debug("Best of %d burst frames: #%d (score %.1f)", len(frames), best[1], best[0])
+        _, idx, box = best
+
+    ok, buf = cv2.imencode(".jpg", frames[idx])
+    if not ok:
+        raise RuntimeError("Failed to encode frame as JPEG")
+    return buf.tobytes(), box
 
 
 def process_plate_and_issue_ticket(
@@ -89,17 +578,21 @@ def process_plate_and_issue_ticket(
     camera_user: str,
     camera_pass: str,
     parkonic_api_token: str,
-    rtsp_path: str = "/"
+    rtsp_path: str = "/",
+    detector_imgsz: int | None = None,
+    motion_threshold: float | None = None,
 ):
     """
     1) Re-open saved snapshot, annotate & crop the parking region.
-    2) Compare new main_crop vs. saved 'last' image for this spot; if same, skip.
+    2) Skip the event if main_crop is unchanged since the last processed one
+       (motion gate) or shows the same car as the saved 'last' image.
     3) Otherwise, run YOLO→OCR, insert into plate_logs,
        and create Ticket (READ) or Ticket+ManualReview+clip thread (UNREAD),
        ensuring no duplicate open ticket per spot.
        Clip window: 8 seconds before to 8 seconds after trigger.
     """
     db_session = SessionLocal()
+    prefetch = None
     try:
         # 1) Re-open snapshot and draw parking polygon
         snapshot_path = os.path.join(park_folder, f"snapshot_{ts}.jpg")
@@ -107,26 +600,22 @@ def process_plate_and_issue_ticket(
             logger.error(f"Snapshot missing: {snapshot_path}")
             return
 
-        img = Image.open(snapshot_path)
+        frame = read_image(snapshot_path, op="snapshot")
+        if frame is None:
+            logger.error(f"Cannot decode snapshot: {snapshot_path}")
+            return
+        img = Image.fromarray(frame)
+        frame_arr = frame if CAMERA_FRAME_ANALYSIS else None
         draw = ImageDraw.Draw(img)
 
-        spot = (
-            db_session.query(Spot)
-            .filter_by(camera_id=camera_id, spot_number=spot_number)
-            .first()
-        )
+        spot = SPOT_INDEX.get(camera_id, spot_number)
         if spot is None:
             logger.error(
                 "Spot %d on camera %d not found in DB", spot_number, camera_id
             )
             return
 
-        left, top, right, bottom = (
-            spot.bbox_x1,
-            spot.bbox_y1,
-            spot.bbox_x2,
-            spot.bbox_y2,
-        )
+        left, top, right, bottom = spot.bbox
 
         annotated_path = os.path.join(park_folder, f"annotated_{ts}.jpg")
         draw.rectangle([left, top, right, bottom], outline="red", width=3)
@@ -139,28 +628,58 @@ def process_plate_and_issue_ticket(
         )
         main_crop.save(main_crop_path)
 
+        sl = spot.clamped_slices(*frame.shape[:2])
+        spot_crop = frame[sl] if sl is not None else np.asarray(main_crop)
+
+        if FRAME_CHANGE_GATE:
+            key = [(camera_id, spot_number)]
+            packed = EVENT_HASHES.hash_crops([spot_crop])
+            if not EVENT_HASHES.changed(key, packed, FRAME_CHANGE_MAX_DISTANCE)[0]:
+                logger.info(
+                    "Spot %d camera %d: unchanged (spot hash) → skip detection/OCR",
+                    spot_number, camera_id
+                )
+                return
+            EVENT_HASHES.update(key, packed)
+
+        if MOTION_GATE.enabled:
+            unchanged, score = MOTION_GATE.check(
+                camera_id,
+                spot_number,
+                spot_crop,
+                spot.bbox,
+                motion_threshold,
+            )
+            if unchanged:
+                logger.info(
+                    "Spot %d camera %d: unchanged (motion score %.3f) → skip detection/OCR",
+                    spot_number, camera_id, score
+                )
+                return
+
         # 2) Feature-match vs. last image for this spot
         spot_key = f"spot_{camera_id}_{spot_number}.jpg"
         last_image_path = os.path.join(SPOT_LAST_DIR, spot_key)
 
-        # if os.path.isfile(last_image_path):
-        #     try:
-        #         same = is_same_image(
-        #             last_image_path,
-        #             snapshot_path,
-        #             camera_id=camera_id,
-        #             spot_number=spot_number,
-        #             min_match_count=50,
-        #             inlier_ratio_thresh=0.5,
-        #         )
-        #         if same:
-        #             logger.debug(
-        #                 "Spot %d camera %d: same car detected → skip OCR/ticket",
-        #                 spot_number, camera_id
-        #             )
-        #             return
-        #     except Exception:
-        #         logger.error("Error in feature-matching", exc_info=True)
+        if SAME_CAR_CHECK:
+            try:
+                same, features = SPOT_FEATURES.check(
+                    camera_id,
+                    spot_number,
+                    snapshot_path,
+                    min_match_count=50,
+                    inlier_ratio_thresh=0.5,
+                )
+                if same:
+                    logger.debug(
+                        "Spot %d camera %d: same car detected → skip OCR/ticket",
+                        spot_number, camera_id
+                    )
+                    return
+                if features is not None:
+                    SPOT_FEATURES.put(camera_id, spot_number, features)
+            except Exception:
+                logger.error("Error in feature-matching", exc_info=True)
 
         # Overwrite last-seen image with the full snapshot
         try:
@@ -168,9 +687,20 @@ def process_plate_and_issue_ticket(
         except Exception:
             logger.error("Failed to update last-seen image", exc_info=True)
 
-        # 3) Run YOLO on main_crop to detect license plate
-        arr = np.array(main_crop)
-        results = plate_model(arr)
+        # 3) Run YOLO on main_crop (or the reported vehicle box) to detect
+        # the license plate
+        plate_box = None
+        if frame_arr is not None:
+            plate_box = _plate_box_from_frame(frame_arr, camera_id, spot, detector_imgsz)
+            if plate_box is None:
+                FRAME_ANALYZER.record_fallback()
+        if plate_box is None:
+            roi = None
+            if VEHICLE_ROI_ENABLED:
+                roi = vehicle_roi(
+                    payload, (left, top, right, bottom), img.size, margin=VEHICLE_ROI_MARGIN
+                )
+            plate_box = _locate_plate(main_crop, roi, camera_id, detector_imgsz)
 
         plate_status = "UNREAD"
         plate_number = None
@@ -178,66 +708,32 @@ def process_plate_and_issue_ticket(
         plate_city   = None
         conf_val     = None
 
-        if results and results[0].boxes:
-            x1p, y1p, x2p, y2p = results[0].boxes.xyxy[0].tolist()
-            x1i, y1i, x2i, y2i = map(int, (x1p, y1p, x2p, y2p))
-            plate_crop = main_crop.crop((x1i, y1i, x2i, y2i))
-
-            # Enhance crop before sending to OCR
-            try:
-                arr_bgr = cv2.cvtColor(np.array(plate_crop), cv2.COLOR_RGB2BGR)
-                arr_bgr = enhance_image_array(arr_bgr)
-                plate_crop = Image.fromarray(cv2.cvtColor(arr_bgr, cv2.COLOR_BGR2RGB))
-            except Exception:
-                logger.error("Plate enhancement failed", exc_info=True)
+        if plate_box is not None:
+            plate_crop = main_crop.crop(plate_box)
 
             tmp_candidate_path = os.path.join(park_folder, f"plate_candidate_{ts}.jpg")
-            plate_crop.save(tmp_candidate_path)
-
-            # 4) Base64-encode plate crop and send to OCR
-            with open(tmp_candidate_path, "rb") as f:
-                plate_bytes = f.read()
-            plate_b64 = base64.b64encode(plate_bytes).decode("utf-8")
-
-            ocr_payload  = {
-                "token":  OCR_TOKEN,
-                "base64": plate_b64,
-                "pole_id": pole_id
-            }
-            ocr_response = send_request_with_retry(
-                "https://parkonic.cloud/ParkonicJLT/anpr/engine/process",
-                ocr_payload
-            )
-
-            logger.debug(f"Raw OCR response: {ocr_response!r}")
 
-            # double json.loads
-            intermediate = None
-            if isinstance(ocr_response, str):
-                try:
-                    intermediate = json.loads(ocr_response)
-                    logger.debug("After first json.loads: %s", type(intermediate).__name__)
-                except Exception:
-                    logger.error("First json.loads failed", exc_info=True)
-                    plate_status = "UNREAD"
-            else:
-                logger.debug("OCR response not str → UNREAD")
-                plate_status = "UNREAD"
+            # Start the fallback frame grab while OCR is in flight so an
+            # UNREAD result does not pay for the RTSP setup afterwards.  A
+            # cached read is always READ, so nothing is grabbed on a hit.
+            def start_prefetch():
+                nonlocal prefetch
+                prefetch = FramePrefetch(
+                    _grab_fallback,
+                    camera_ip,
+                    camera_user,
+                    camera_pass,
+                    rtsp_path,
+                )
 
-            ocr_json = None
-            if isinstance(intermediate, str):
-                try:
-                    ocr_json = json.loads(intermediate)
-                    logger.debug("After second json.loads → dict")
-                except Exception:
-                    logger.error("Second json.loads failed", exc_info=True)
-                    plate_status = "UNREAD"
-            elif isinstance(intermediate, dict):
-                ocr_json = intermediate
-                logger.debug("OCR JSON is dict")
-            else:
-                logger.error("Unexpected OCR intermediate type: %s", type(intermediate).__name__)
-                plate_status = "UNREAD"
+            ocr_json = _ocr_plate(
+                plate_crop,
+                tmp_candidate_path,
+                pole_id,
+                camera_id,
+                spot_number,
+                on_miss=start_prefetch if FRAME_PREFETCH_ENABLED else None,
+            )
 
             if isinstance(ocr_json, dict):
                 try:
@@ -259,15 +755,25 @@ def process_plate_and_issue_ticket(
                     logger.error("Failed to extract from ocr_json", exc_info=True)
                     plate_status = "UNREAD"
 
+        if plate_status == "READ" and prefetch is not None:
+            prefetch.cancel()
+
         # Fallback: capture a fresh frame and retry detection/OCR if unread
         if plate_status == "UNREAD":
             try:
-                frame_bytes = fetch_camera_frame(
-                    camera_ip,
-                    camera_user or "",
-                    camera_pass or "",
-                    rtsp_path=rtsp_path,
-                )
+                best_frame_mode = OCR_FALLBACK_MODE == "best_frame"
+                if prefetch is not None:
+                    grabbed = prefetch.result()
+                else:
+                    grabbed = _grab_fallback(camera_ip, camera_user, camera_pass, rtsp_path)
+
+                plate_box = None
+                if best_frame_mode:
+                    frame_bytes, plate_box = _select_best_frame(
+                        grabbed, (left, top, right, bottom), detector_imgsz
+                    )
+                else:
+                    frame_bytes = grabbed
                 retry_snapshot = os.path.join(park_folder, f"retry_snapshot_{ts}.jpg")
                 with open(retry_snapshot, "wb") as f:
                     f.write(frame_bytes)
@@ -280,55 +786,13 @@ def process_plate_and_issue_ticket(
                 main_crop_path = os.path.join(park_folder, f"main_crop_retry_{ts}.jpg")
                 main_crop.save(main_crop_path)
 
-                arr = np.array(main_crop)
-                results = plate_model(arr)
-                if results and results[0].boxes:
-                    x1p, y1p, x2p, y2p = results[0].boxes.xyxy[0].tolist()
-                    x1i, y1i, x2i, y2i = map(int, (x1p, y1p, x2p, y2p))
-                    plate_crop = main_crop.crop((x1i, y1i, x2i, y2i))
-
-                    try:
-                        arr_bgr = cv2.cvtColor(np.array(plate_crop), cv2.COLOR_RGB2BGR)
-                        arr_bgr = enhance_image_array(arr_bgr)
-                        plate_crop = Image.fromarray(cv2.cvtColor(arr_bgr, cv2.COLOR_BGR2RGB))
-                    except Exception:
-                        logger.error("Plate enhancement failed", exc_info=True)
+                if not best_frame_mode:
+                    plate_box = _first_box(_detect(np.array(main_crop), detector_imgsz))
+                if plate_box is not None:
+                    plate_crop = main_crop.crop(plate_box)
 
                     tmp_candidate_path = os.path.join(park_folder, f"plate_candidate_retry_{ts}.jpg")
-                    plate_crop.save(tmp_candidate_path)
-
-                    with open(tmp_candidate_path, "rb") as f:
-                        plate_bytes = f.read()
-                    plate_b64 = base64.b64encode(plate_bytes).decode("utf-8")
-                    ocr_payload = {
-                        "token": OCR_TOKEN,
-                        "base64": plate_b64,
-                        "pole_id": pole_id,
-                    }
-                    ocr_response = send_request_with_retry(
-                        "https://parkonic.cloud/ParkonicJLT/anpr/engine/process",
-                        ocr_payload,
-                    )
-
-                    logger.debug(f"Retry OCR response: {ocr_response!r}")
-
-                    intermediate = None
-                    if isinstance(ocr_response, str):
-                        try:
-                            intermediate = json.loads(ocr_response)
-                        except Exception:
-                            logger.error("First json.loads failed on retry", exc_info=True)
-                            intermediate = None
-                    if isinstance(intermediate, str):
-                        try:
-                            ocr_json = json.loads(intermediate)
-                        except Exception:
-                            logger.error("Second json.loads failed on retry", exc_info=True)
-                            ocr_json = None
-                    elif isinstance(intermediate, dict):
-                        ocr_json = intermediate
-                    else:
-                        ocr_json = None
+                    ocr_json = _ocr_plate(plate_crop, tmp_candidate_path, pole_id, camera_id, spot_number)
 
                     if isinstance(ocr_json, dict):
                         try:
@@ -368,6 +832,8 @@ def process_plate_and_issue_ticket(
         else:
             shutil.copy(main_crop_path, final_plate_path)
 
+        # The ticket keeps the full-quality image; only the park-in upload is
+        # budgeted.
         ticket_image_b64 = None
         try:
             with open(final_plate_path, "rb") as f:
@@ -411,22 +877,19 @@ def process_plate_and_issue_ticket(
         # 7) If READ → create Ticket
         if plate_status == "READ":
             if ticket_image_b64:
-                img_list = [ticket_image_b64]
+                img_list = [budget_b64(final_plate_path, PARKIN_BUDGET)]
             else:
                 img_list = []
                 try:
-                    with open(annotated_path, "rb") as f:
-                        img_list.append(base64.b64encode(f.read()).decode("utf-8"))
+                    img_list.append(budget_b64(annotated_path, PARKIN_BUDGET))
                 except Exception:
                     logger.error("Failed to read annotated image for API", exc_info=True)
                 try:
-                    with open(main_crop_path, "rb") as f:
-                        img_list.append(base64.b64encode(f.read()).decode("utf-8"))
+                    img_list.append(budget_b64(main_crop_path, PARKIN_BUDGET))
                 except Exception:
                     logger.error("Failed to read cropped image for API", exc_info=True)
                 if not img_list:
-                    with open(final_plate_path, "rb") as f:
-                        img_list = [base64.b64encode(f.read()).decode("utf-8")]
+                    img_list = [budget_b64(final_plate_path, PARKIN_BUDGET)]
 
             from api_client import park_in_request
             try:
@@ -565,4 +1028,6 @@ def process_plate_and_issue_ticket(
         logger.error("process_plate_and_issue_ticket exception", exc_info=True)
         db_session.rollback()
     finally:
+        if prefetch is not None:
+            prefetch.cancel()
         db_session.close()
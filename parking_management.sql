@@ -279,7 +279,8 @@ CREATE TABLE `permissions` (
 INSERT INTO `permissions` (`id`, `name`, `description`) VALUES
   (1, 'manage_users', NULL),
   (2, 'manage_roles', NULL),
-  (3, 'manage_permissions', NULL);
+  (3, 'manage_permissions', NULL),
+  (4, 'manage_models', NULL);
 
 -- --------------------------------------------------------
 
@@ -309,7 +310,8 @@ CREATE TABLE `role_permissions` (
 INSERT INTO `role_permissions` (`role_id`, `permission_id`) VALUES
   (1, 1),
   (1, 2),
-  (1, 3);
+  (1, 3),
+  (1, 4);
 
 -- --------------------------------------------------------
 
@@ -517,7 +519,7 @@ ALTER TABLE `roles`
 -- AUTO_INCREMENT for table `permissions`
 --
 ALTER TABLE `permissions`
-  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=4;
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=5;
 
 --
 -- AUTO_INCREMENT for table `zones`
@@ -0,0 +1,252 @@
+# rtsp_streams.py
+
+import re
+import threading
+import time
+
+from imutils.video import VideoStream
+
+from config import RTSP_STREAM_POOL, RTSP_STREAM_IDLE, RTSP_STREAM_STALE
+from logger import logger
+from metrics import LatencyWindow
+
+
+def redact_url(url: str) -> str:
+    """``url`` without the ``user:password@`` part, for logs and stats."""
+    return re.sub(r"://[^@/]*@", "://", url)
+
+
+def _open_video_stream(url: str):
+    return VideoStream(url).start()
+
+
+class _Session:
+    """One open RTSP stream whose reader thread keeps the newest frame."""
+
+    def __init__(self, url: str, stream):
+        self.url = url
+        self.stream = stream
+        self.opened = time.monotonic()
+        self.last_used = self.opened
+        self.last_frame = None
+        self.last_change = self.opened
+        self.leases = 0
+        self.reads = 0
+        self.sample(self.opened)
+
+    def sample(self, now: float) -> None:
+        """Note whether the reader thread produced a new frame since last time."""
+        frame = self.stream.read()
+        if frame is not None and frame is not self.last_frame:
+            self.last_frame = frame
+            self.last_change = now
+
+    def stale(self, now: float, after: float) -> bool:
+        return now - self.last_change > after
+
+
+class StreamLease:
+    """Handle on a pooled stream with the ``read``/``stop`` API of ``VideoStream``.
+
+    ``stop`` only hands the stream back to the pool; the session stays open
+    until it idles out or is evicted.
+    """
+
+    def __init__(self, manager: "StreamManager", session: _Session):
+        self._manager = manager
+        self._session = session
+        self._released = False
+
+    def read(self):
+        self._session.reads += 1
+        return self._session.stream.read()
+
+    def stop(self) -> None:
+        if not self._released:
+            self._released = True
+            self._manager._release(self._session)
+
+
+class StreamManager:
+    """Keep RTSP sessions of recently used cameras open between frame grabs.
+
+    ``lease(url)`` returns a warm session when one is open, so its reader
+    thread already holds a current frame, and opens one otherwise.  At most
+    ``max_streams`` sessions stay open: the least recently used session
+    without active leases is closed to make room, and when every session is
+    in use the caller gets a one-off stream instead.  Sessions unused for
+    ``idle_timeout`` seconds are closed by a background reaper, and a session
+    whose frame has not changed for ``stale_after`` seconds is reopened on
+    its next lease.  ``max_streams=0`` disables pooling.
+    """
+
+    def __init__(
+        self,
+        max_streams: int = 0,
+        idle_timeout: float = 60.0,
+        stale_after: float = 5.0,
+        open_stream=_open_video_stream,
+        reap_interval: float = 1.0,
+    ):
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self.stale_after = stale_after
+        self.reap_interval = reap_interval
+        self._open_stream = open_stream
+        self._sessions: dict[str, _Session] = {}
+        self._lock = threading.Lock()
+        self._reaper: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._open_latency = LatencyWindow()
+        self._counts = {
+            "leases": 0,
+            "warm": 0,
+            "opened": 0,
+            "overflow": 0,
+            "evicted_idle": 0,
+            "evicted_lru": 0,
+            "reopened_stale": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_streams > 0
+
+    def _close(self, session: _Session) -> None:
+        try:
+            session.stream.stop()
+        except Exception:
+            logger.debug("Failed stopping stream %s", redact_url(session.url), exc_info=True)
+
+    def _open(self, url: str):
+        start = time.monotonic()
+        stream = self._open_stream(url)
+        self._open_latency.add(time.monotonic() - start)
+        return stream
+
+    def lease(self, url: str):
+        """Return a ``StreamLease`` for ``url`` (or a plain stream on overflow)."""
+        if not self.enabled:
+            return self._open(url)
+        self._ensure_reaper()
+        to_close = []
+        now = time.monotonic()
+        with self._lock:
+            self._counts["leases"] += 1
+            session = self._sessions.get(url)
+            if session is not None:
+                session.sample(now)
+                if session.leases == 0 and session.stale(now, self.stale_after):
+                    del self._sessions[url]
+                    to_close.append(session)
+                    self._counts["reopened_stale"] += 1
+                    session = None
+            if session is not None:
+                self._counts["warm"] += 1
+                session.leases += 1
+                session.last_used = now
+                lease = StreamLease(self, session)
+            else:
+                lease = None
+                if len(self._sessions) >= self.max_streams:
+                    idle = [s for s in self._sessions.values() if s.leases == 0]
+                    if idle:
+                        victim = min(idle, key=lambda s: s.last_used)
+                        del self._sessions[victim.url]
+                        to_close.append(victim)
+                        self._counts["evicted_lru"] += 1
+                overflow = len(self._sessions) >= self.max_streams
+                self._counts["overflow" if overflow else "opened"] += 1
+        for old in to_close:
+            self._close(old)
+        if lease is not None:
+            return lease
+        stream = self._open(url)
+        if overflow:
+            return stream
+
+        session = _Session(url, stream)
+        session.leases = 1
+        with self._lock:
+            existing = self._sessions.get(url)
+            if existing is None:
+                self._sessions[url] = session
+                return StreamLease(self, session)
+            # Another caller opened the same camera meanwhile; use theirs.
+            existing.leases += 1
+            existing.last_used = time.monotonic()
+        self._close(session)
+        return StreamLease(self, existing)
+
+    def _release(self, session: _Session) -> None:
+        with self._lock:
+            session.leases = max(0, session.leases - 1)
+            session.last_used = time.monotonic()
+
+    def reap(self) -> None:
+        """Close sessions idle for longer than ``idle_timeout``."""
+        now = time.monotonic()
+        to_close = []
+        with self._lock:
+            for url, session in list(self._sessions.items()):
+                session.sample(now)
+                if session.leases == 0 and now - session.last_used > self.idle_timeout:
+                    del self._sessions[url]
+                    to_close.append(session)
+                    self._counts["evicted_idle"] += 1
+        for session in to_close:
+            logger.debug("Closing idle RTSP stream %s", redact_url(session.url))
+            self._close(session)
+
+    def _run_reaper(self) -> None:
+        while not self._stop.wait(self.reap_interval):
+            try:
+                self.reap()
+            except Exception:
+                logger.error("RTSP stream reaper failed", exc_info=True)
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._stop.clear()
+                self._reaper = threading.Thread(target=self._run_reaper, name="rtsp-reaper", daemon=True)
+                self._reaper.start()
+
+    def close_all(self) -> None:
+        self._stop.set()
+        self._reaper = None
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            self._close(session)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            counts = dict(self._counts)
+            sessions = [
+                {
+                    "stream": redact_url(s.url),
+                    "age_s": round(now - s.opened, 1),
+                    "idle_s": round(now - s.last_used, 1),
+                    "frame_age_s": round(now - s.last_change, 1),
+                    "leases": s.leases,
+                    "reads": s.reads,
+                }
+                for s in self._sessions.values()
+            ]
+        return {
+            "enabled": self.enabled,
+            "max_streams": self.max_streams,
+            "idle_timeout": self.idle_timeout,
+            **counts,
+            "warm_rate": round(counts["warm"] / counts["leases"], 4) if counts["leases"] else 0.0,
+            "open_latency": self._open_latency.snapshot(),
+            "sessions": sessions,
+        }
+
+
+STREAM_MANAGER = StreamManager(RTSP_STREAM_POOL, RTSP_STREAM_IDLE, RTSP_STREAM_STALE)
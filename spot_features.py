@@ -0,0 +1,389 @@
+# spot_features.py
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from config import (
+    SAME_CAR_STAGES,
+    SAME_CAR_DHASH_DIFFERENT,
+    SAME_CAR_ORB_MIN_MATCHES,
+    SAME_CAR_ORB_SAME_RATIO,
+    SAME_CAR_ORB_DIFFERENT_RATIO,
+)
+from logger import logger
+from metrics import LatencyWindow
+from utils import (
+    _avg_hash,
+    _dhash,
+    _hash_diff,
+    load_spot_gray,
+    match_features,
+    orb_features,
+    orb_match,
+    sift_features,
+)
+
+
+STAGES = ("hash", "orb", "sift")
+FEATURE_KINDS = ("orb", "sift")
+
+
+@dataclass
+class SpotFeatures:
+    """What the same-car check needs to remember about one spot image.
+
+    Hashes are computed up front; ORB and SIFT features are extracted from
+    ``gray`` the first time a cascade stage asks for them, so a pair decided
+    by the hash stage never pays for keypoint detection.
+    """
+
+    shape: tuple[int, int]
+    digest: str  # sha1 of the grayscale pixels, for the exact-match shortcut
+    ahash: np.ndarray  # (8, 8) uint8
+    dhash: np.ndarray | None  # (8, 8) uint8
+    bbox: tuple[int, int, int, int] | None  # spot bbox the image was cropped to
+    gray: np.ndarray | None = field(default=None, repr=False)
+    # kind -> (points (N, 2) float32, descriptors uint8 or None)
+    extracted: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_gray(cls, gray: np.ndarray, bbox=None) -> "SpotFeatures":
+        return cls(
+            shape=tuple(gray.shape[:2]),
+            digest=hashlib.sha1(np.ascontiguousarray(gray).tobytes()).hexdigest(),
+            ahash=_avg_hash(gray),
+            dhash=_dhash(gray),
+            bbox=tuple(int(v) for v in bbox) if bbox is not None else None,
+            gray=gray,
+        )
+
+    def features(self, kind: str) -> tuple[np.ndarray, np.ndarray | None] | None:
+        """ORB or SIFT ``(points, descriptors)``; ``None`` if unavailable."""
+        if kind not in self.extracted:
+            if self.gray is None:
+                return None
+            if kind == "sift":
+                pts, des = sift_features(self.gray)
+                if des is not None:
+                    # SIFT descriptor components are whole numbers in [0, 255].
+                    des = np.clip(np.rint(des), 0, 255).astype(np.uint8)
+            else:
+                pts, des = orb_features(self.gray)
+            self.extracted[kind] = (pts, des)
+        return self.extracted[kind]
+
+    def complete(self, kinds) -> None:
+        """Extract ``kinds`` that are still missing and release the image."""
+        for kind in kinds:
+            self.features(kind)
+        self.gray = None
+
+    def save(self, path: str) -> None:
+        arrays = {
+            "shape": np.asarray(self.shape, dtype=np.int32),
+            "digest": np.asarray(self.digest),
+            "ahash": self.ahash,
+            "bbox": np.asarray(self.bbox if self.bbox is not None else (), dtype=np.int32),
+        }
+        if self.dhash is not None:
+            arrays["dhash"] = self.dhash
+        for kind, (pts, des) in self.extracted.items():
+            arrays[f"{kind}_points"] = pts
+            arrays[f"{kind}_descriptors"] = des if des is not None else np.zeros((0, 0), np.uint8)
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SpotFeatures":
+        with np.load(path) as data:
+            files = set(data.files)
+            extracted = {}
+            for kind in FEATURE_KINDS:
+                if f"{kind}_points" in files:
+                    des = data[f"{kind}_descriptors"]
+                    extracted[kind] = (data[f"{kind}_points"], des if des.size else None)
+            if "sift" not in extracted and "points" in files:
+                # Files written before the comparison cascade held SIFT only.
+                des = data["descriptors"]
+                extracted["sift"] = (data["points"], des if des.size else None)
+            bbox = data["bbox"]
+            return cls(
+                shape=tuple(int(v) for v in data["shape"]),
+                digest=str(data["digest"]),
+                ahash=data["ahash"],
+                dhash=data["dhash"] if "dhash" in files else None,
+                bbox=tuple(int(v) for v in bbox) if len(bbox) else None,
+                extracted=extracted,
+            )
+
+
+class ComparisonCascade:
+    """Decide "same car?" with the cheapest stage that is confident.
+
+    * ``hash`` – same when the pixels or average hashes (within
+      ``hash_same`` bits) match, different when the dHash distance is at least
+      ``dhash_different``.
+    * ``orb`` – with at least ``orb_min_matches`` Hamming ratio-test matches,
+      same when the RANSAC inlier ratio is at least ``orb_same_ratio`` and
+      different below ``orb_different_ratio``.
+    * ``sift`` – the full SIFT + FLANN + RANSAC decision; always decides.
+
+    A pair no configured stage decides counts as ``undecided`` and is treated
+    as different.
+    """
+
+    def __init__(
+        self,
+        stages=STAGES,
+        *,
+        hash_same: int = 5,
+        dhash_different: int = 22,
+        orb_min_matches: int = 30,
+        orb_same_ratio: float = 0.6,
+        orb_different_ratio: float = 0.2,
+        min_match_count: int = 50,
+        inlier_ratio_thresh: float = 0.5,
+    ):
+        stages = tuple(stages)
+        unknown = [s for s in stages if s not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown comparison stages {unknown}; expected some of {STAGES}")
+        self.stages = stages
+        self.hash_same = hash_same
+        self.dhash_different = dhash_different
+        self.orb_min_matches = orb_min_matches
+        self.orb_same_ratio = orb_same_ratio
+        self.orb_different_ratio = orb_different_ratio
+        self.min_match_count = min_match_count
+        self.inlier_ratio_thresh = inlier_ratio_thresh
+        self._lock = threading.Lock()
+        self._latency = {s: LatencyWindow() for s in stages}
+        self._counts = {s: {"same": 0, "different": 0, "passed": 0} for s in stages}
+        self._undecided = 0
+
+    @property
+    def feature_kinds(self) -> tuple[str, ...]:
+        return tuple(s for s in self.stages if s in FEATURE_KINDS)
+
+    def _hash(self, old: SpotFeatures, new: SpotFeatures, **_) -> bool | None:
+        if old.shape == new.shape:
+            if old.digest == new.digest or _hash_diff(old.ahash, new.ahash) <= self.hash_same:
+                return True
+        if old.dhash is not None and new.dhash is not None:
+            if _hash_diff(old.dhash, new.dhash) >= self.dhash_different:
+                return False
+        return None
+
+    def _orb(self, old: SpotFeatures, new: SpotFeatures, **_) -> bool | None:
+        a, b = old.features("orb"), new.features("orb")
+        if a is None or b is None:
+            return None
+        good, ratio = orb_match(*a, *b)
+        if good < self.orb_min_matches or ratio is None:
+            return None
+        if ratio >= self.orb_same_ratio:
+            return True
+        if ratio < self.orb_different_ratio:
+            return False
+        return None
+
+    def _sift(self, old: SpotFeatures, new: SpotFeatures, *, min_match_count, inlier_ratio_thresh) -> bool | None:
+        a, b = old.features("sift"), new.features("sift")
+        if a is None or b is None:
+            return None
+        return match_features(
+            *a,
+            *b,
+            min_match_count=min_match_count,
+            inlier_ratio_thresh=inlier_ratio_thresh,
+        )
+
+    def compare(
+        self,
+        old: SpotFeatures,
+        new: SpotFeatures,
+        *,
+        min_match_count: int | None = None,
+        inlier_ratio_thresh: float | None = None,
+    ) -> bool:
+        """Return True if ``new`` shows the same car as ``old``."""
+        options = {
+            "min_match_count": self.min_match_count if min_match_count is None else min_match_count,
+            "inlier_ratio_thresh": (
+                self.inlier_ratio_thresh if inlier_ratio_thresh is None else inlier_ratio_thresh
+            ),
+        }
+        for stage in self.stages:
+            start = time.monotonic()
+            decision = getattr(self, f"_{stage}")(old, new, **options)
+            self._latency[stage].add(time.monotonic() - start)
+            outcome = "passed" if decision is None else ("same" if decision else "different")
+            with self._lock:
+                self._counts[stage][outcome] += 1
+            if decision is not None:
+                return decision
+        with self._lock:
+            self._undecided += 1
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {s: dict(c) for s, c in self._counts.items()}
+            undecided = self._undecided
+        report = {"stages": list(self.stages), "undecided": undecided}
+        for stage in self.stages:
+            c = counts[stage]
+            seen = c["same"] + c["different"] + c["passed"]
+            report[stage] = {
+                **c,
+                "decided_rate": round((c["same"] + c["different"]) / seen, 4) if seen else None,
+                "latency": self._latency[stage].snapshot(),
+            }
+        return report
+
+
+SAME_CAR_CASCADE = ComparisonCascade(
+    [s.strip() for s in SAME_CAR_STAGES.split(",") if s.strip()],
+    dhash_different=SAME_CAR_DHASH_DIFFERENT,
+    orb_min_matches=SAME_CAR_ORB_MIN_MATCHES,
+    orb_same_ratio=SAME_CAR_ORB_SAME_RATIO,
+    orb_different_ratio=SAME_CAR_ORB_DIFFERENT_RATIO,
+)
+
+
+class SpotFeatureCache:
+    """Features of the last accepted image of every spot.
+
+    At most ``max_entries`` spots are kept in memory (least recently used
+    first out); every entry is also written to ``spot_{cam}_{spot}.npz`` in
+    ``directory`` so a restart does not lose the reference.  A reference whose
+    spot bbox has since changed is ignored.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 512, cascade: ComparisonCascade | None = None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.cascade = cascade or SAME_CAR_CASCADE
+        self._entries: OrderedDict[tuple[int, int], SpotFeatures] = OrderedDict()
+        self._lock = threading.Lock()
+        self._latency = LatencyWindow()
+        self._counts = {
+            "checks": 0,
+            "same": 0,
+            "different": 0,
+            "no_reference": 0,
+            "stale": 0,
+            "memory_hits": 0,
+            "disk_loads": 0,
+            "errors": 0,
+        }
+
+    def _path(self, camera_id: int, spot_number: int) -> str:
+        return os.path.join(self.directory, f"spot_{camera_id}_{spot_number}.npz")
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def get(self, camera_id: int, spot_number: int) -> SpotFeatures | None:
+        key = (camera_id, spot_number)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counts["memory_hits"] += 1
+                return entry
+        path = self._path(camera_id, spot_number)
+        if not os.path.isfile(path):
+            return None
+        try:
+            entry = SpotFeatures.load(path)
+        except Exception:
+            self._count("errors")
+            logger.error("Failed to load spot features %s", path, exc_info=True)
+            return None
+        self._count("disk_loads")
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: tuple[int, int], features: SpotFeatures) -> None:
+        with self._lock:
+            self._entries[key] = features
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, camera_id: int, spot_number: int, features: SpotFeatures) -> None:
+        """Make ``features`` the reference for the spot and persist them."""
+        features.complete(self.cascade.feature_kinds)
+        self._remember((camera_id, spot_number), features)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            features.save(self._path(camera_id, spot_number))
+        except Exception:
+            self._count("errors")
+            logger.error("Failed to persist spot features", exc_info=True)
+
+    def check(
+        self,
+        camera_id: int,
+        spot_number: int,
+        image_path: str,
+        *,
+        min_match_count: int = 50,
+        inlier_ratio_thresh: float = 0.5,
+    ) -> tuple[bool, SpotFeatures | None]:
+        """Compare ``image_path`` with the spot's reference.
+
+        Returns ``(same, features)`` where ``features`` belong to the new image
+        (``None`` if it could not be read) so the caller can ``put`` them once
+        the image is accepted.
+        """
+        start = time.monotonic()
+        try:
+            gray = load_spot_gray(image_path, camera_id, spot_number)
+            if gray is None:
+                return False, None
+            from spot_index import SPOT_INDEX
+
+            spot = SPOT_INDEX.get(camera_id, spot_number)
+            new = SpotFeatures.from_gray(gray, spot.bbox if spot else None)
+
+            old = self.get(camera_id, spot_number)
+            if old is None:
+                self._count("no_reference")
+                return False, new
+            if old.bbox != new.bbox:
+                self._count("stale")
+                return False, new
+
+            same = self.cascade.compare(
+                old,
+                new,
+                min_match_count=min_match_count,
+                inlier_ratio_thresh=inlier_ratio_thresh,
+            )
+            self._count("same" if same else "different")
+            return same, new
+        finally:
+            self._latency.add(time.monotonic() - start)
+            self._count("checks")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            entries = len(self._entries)
+        return {
+            **counts,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "latency": self._latency.snapshot(),
+            "cascade": self.cascade.stats(),
+        }
@@ -0,0 +1,140 @@
+# spot_hashes.py
+
+import threading
+
+import cv2
+import numpy as np
+
+from config import SPOT_HASH_BITS
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits in each row of a ``(..., W)`` uint64 array."""
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return _POPCOUNT8[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """Pack ``(..., B)`` booleans (``B`` a multiple of 64) into uint64 words."""
+    bits = np.asarray(bits, dtype=bool)
+    packed = np.packbits(bits, axis=-1)
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+
+def hamming(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Bitwise Hamming distance between packed hashes (broadcasting)."""
+    return popcount(np.bitwise_xor(a, b))
+
+
+class SpotHashTable:
+    """Packed average hash of the last accepted crop of every spot.
+
+    Hashes are ``bits`` long (64 = 8x8, 256 = 16x16) and stored as rows of
+    uint64 words in one array, so the crops of a whole camera frame, or a
+    batch of events, are compared with a single XOR and popcount.
+    """
+
+    def __init__(self, bits: int = 64):
+        side = int(round(bits ** 0.5))
+        if bits <= 0 or bits % 64 or side * side != bits:
+            raise ValueError(f"Hash size must be a square multiple of 64 bits, got {bits}")
+        self.bits = bits
+        self.hash_size = side
+        self.words = bits // 64
+        self._rows: dict[tuple[int, int], int] = {}
+        self._hashes = np.zeros((64, self.words), dtype=np.uint64)
+        self._free: list[int] = []
+        self._lock = threading.Lock()
+        self._counts = {"updates": 0, "lookups": 0, "changed": 0, "unchanged": 0, "unknown": 0}
+
+    def hash_crops(self, crops) -> np.ndarray:
+        """Packed hashes ``(N, words)`` of grayscale or RGB crops."""
+        size = self.hash_size
+        small = np.zeros((len(crops), size, size), dtype=np.float32)
+        for i, crop in enumerate(crops):
+            if crop is None or crop.size == 0:
+                continue
+            if crop.ndim == 3:
+                crop = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+            small[i] = cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA)
+        bits = small > small.mean(axis=(1, 2), keepdims=True)
+        return pack_bits(bits.reshape(len(crops), -1))
+
+    def hash_frame(self, frame: np.ndarray, spots) -> np.ndarray:
+        """Packed hashes of every spot crop of ``frame``.
+
+        ``spots`` are objects with an ``x1, y1, x2, y2`` ``bbox``; an empty crop
+        hashes to zeros.
+        """
+        h, w = frame.shape[:2]
+        crops = []
+        for spot in spots:
+            x1, y1, x2, y2 = (int(v) for v in spot.bbox)
+            crops.append(frame[max(0, y1):min(y2, h), max(0, x1):min(x2, w)])
+        return self.hash_crops(crops)
+
+    def update(self, keys, packed: np.ndarray) -> None:
+        """Store ``packed[i]`` as the hash of ``keys[i] = (camera_id, spot_number)``."""
+        packed = np.asarray(packed, dtype=np.uint64).reshape(len(keys), self.words)
+        with self._lock:
+            rows = []
+            for key in keys:
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._free.pop() if self._free else len(self._rows)
+                    if row >= len(self._hashes):
+                        grown = np.zeros((len(self._hashes) * 2, self.words), dtype=np.uint64)
+                        grown[: len(self._hashes)] = self._hashes
+                        self._hashes = grown
+                    self._rows[key] = row
+                rows.append(row)
+            self._hashes[rows] = packed
+            self._counts["updates"] += len(keys)
+
+    def distances(self, keys, packed: np.ndarray) -> np.ndarray:
+        """Hamming distance of each new hash to the stored one; ``-1`` if unknown."""
+        packed = np.asarray(packed, dtype=np.uint64).reshape(len(keys), self.words)
+        with self._lock:
+            rows = np.array([self._rows.get(k, -1) for k in keys], dtype=np.int64)
+            known = rows >= 0
+            stored = self._hashes[np.where(known, rows, 0)]
+        dist = hamming(stored, packed)
+        dist[~known] = -1
+        return dist
+
+    def changed(self, keys, packed: np.ndarray, max_distance: int) -> np.ndarray:
+        """Boolean mask of spots whose crop differs by more than ``max_distance`` bits.
+
+        Spots without a stored hash count as changed.
+        """
+        dist = self.distances(keys, packed)
+        changed = (dist < 0) | (dist > max_distance)
+        with self._lock:
+            self._counts["lookups"] += len(keys)
+            self._counts["unknown"] += int((dist < 0).sum())
+            self._counts["changed"] += int(changed.sum())
+            self._counts["unchanged"] += int((~changed).sum())
+        return changed
+
+    def forget(self, camera_id: int | None = None) -> None:
+        """Drop stored hashes of ``camera_id`` (or every camera)."""
+        with self._lock:
+            for key in [k for k in self._rows if camera_id is None or k[0] == camera_id]:
+                self._free.append(self._rows.pop(key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            spots = len(self._rows)
+        return {"bits": self.bits, "spots": spots, **counts}
+
+
+# Last analysed whole-frame crops (``CameraFrameAnalyzer``) and last accepted
+# event crops (``process_plate_and_issue_ticket``) are kept apart so one gate
+# updating a spot's hash cannot hide a change from the other.
+SPOT_HASHES = SpotHashTable(SPOT_HASH_BITS)
+EVENT_HASHES = SpotHashTable(SPOT_HASH_BITS)
@@ -0,0 +1,121 @@
+# spot_index.py
+
+import threading
+import time
+from dataclasses import dataclass, field
+
+from config import SPOT_INDEX_TTL
+from db import SessionLocal
+from logger import logger
+from models import Spot
+
+
+@dataclass(frozen=True)
+class SpotGeometry:
+    """Bounding box of a parking spot with precomputed crop helpers."""
+
+    id: int
+    camera_id: int
+    spot_number: int
+    bbox: tuple[int, int, int, int]
+    slices: tuple[slice, slice] = field(init=False, repr=False, compare=False)
+    """``(rows, cols)`` slices cropping the spot from a frame array."""
+
+    def __post_init__(self):
+        x1, y1, x2, y2 = self.bbox
+        object.__setattr__(self, "slices", (slice(y1, y2), slice(x1, x2)))
+
+    @classmethod
+    def from_row(cls, spot: Spot) -> "SpotGeometry":
+        return cls(
+            id=spot.id,
+            camera_id=spot.camera_id,
+            spot_number=spot.spot_number,
+            bbox=(int(spot.bbox_x1), int(spot.bbox_y1), int(spot.bbox_x2), int(spot.bbox_y2)),
+        )
+
+    def clamped_slices(self, height: int, width: int) -> tuple[slice, slice] | None:
+        """Slices clipped to a ``height`` x ``width`` frame, ``None`` if empty."""
+        x1, y1, x2, y2 = self.bbox
+        x1, x2 = max(0, min(x1, width)), max(0, min(x2, width))
+        y1, y2 = max(0, min(y1, height)), max(0, min(y2, height))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return slice(y1, y2), slice(x1, x2)
+
+
+class SpotIndex:
+    """Per-camera cache of spot geometry loaded in one query per camera.
+
+    Entries expire after ``ttl`` seconds so edits made directly in the
+    database are picked up; the ``/spots`` endpoints invalidate the affected
+    camera immediately.
+    """
+
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._cameras: dict[int, tuple[float, dict[int, SpotGeometry]]] = {}
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "loads": 0, "invalidations": 0}
+
+    def _load(self, camera_id: int) -> dict[int, SpotGeometry]:
+        db = SessionLocal()
+        try:
+            rows = db.query(Spot).filter(Spot.camera_id == camera_id).all()
+            spots = {s.spot_number: SpotGeometry.from_row(s) for s in rows}
+        finally:
+            db.close()
+        with self._lock:
+            self._cameras[camera_id] = (time.monotonic(), spots)
+            self._counts["loads"] += 1
+        return spots
+
+    def camera(self, camera_id: int) -> dict[int, SpotGeometry]:
+        """Return ``{spot_number: SpotGeometry}`` for ``camera_id``."""
+        with self._lock:
+            entry = self._cameras.get(camera_id)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._counts["hits"] += 1
+                return entry[1]
+        return self._load(camera_id)
+
+    def get(self, camera_id: int, spot_number: int) -> SpotGeometry | None:
+        return self.camera(camera_id).get(spot_number)
+
+    def camera_spots(self, camera_id: int) -> list[SpotGeometry]:
+        return sorted(self.camera(camera_id).values(), key=lambda s: s.spot_number)
+
+    def load_all(self) -> int:
+        """Bulk load every camera's spots in one query; returns the spot count."""
+        db = SessionLocal()
+        try:
+            rows = db.query(Spot).all()
+        finally:
+            db.close()
+        grouped: dict[int, dict[int, SpotGeometry]] = {}
+        for s in rows:
+            grouped.setdefault(s.camera_id, {})[s.spot_number] = SpotGeometry.from_row(s)
+        now = time.monotonic()
+        with self._lock:
+            self._cameras = {cam: (now, spots) for cam, spots in grouped.items()}
+            self._counts["loads"] += 1
+        logger.debug("Spot index loaded %d spots for %d cameras", len(rows), len(grouped))
+        return len(rows)
+
+    def invalidate(self, camera_id: int | None = None) -> None:
+        """Drop cached geometry for ``camera_id`` (or every camera)."""
+        with self._lock:
+            if camera_id is None:
+                self._cameras.clear()
+            else:
+                self._cameras.pop(camera_id, None)
+            self._counts["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            cameras = len(self._cameras)
+        return {**counts, "cameras": cameras}
+
+
+SPOT_INDEX = SpotIndex(ttl=SPOT_INDEX_TTL)
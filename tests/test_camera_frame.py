@@ -1,14 +1,19 @@
+import io
 import os
 from unittest.mock import patch
 
 import pytest
 from fastapi.testclient import TestClient
+from PIL import Image
 
 TEST_DB = "sqlite:///./test.db"
 os.environ["DATABASE_URL"] = TEST_DB
 
 from db import Base, engine, SessionLocal
+import main
 from main import app, get_password_hash
+from frame_preview import FramePreviews
+from camera_health import CameraHealth
 from models import Location, Zone, Pole, Camera, User
 
 Base.metadata.drop_all(bind=engine)
@@ -81,3 +86,54 @@ def test_get_camera_frame_error(client, sample_camera):
     with patch("main.fetch_camera_frame", side_effect=Exception("boom")):
         resp = client.get(f"/cameras/{sample_camera}/frame")
     assert resp.status_code == 500
+
+
+def _camera(code: str, p_ip: str) -> int:
+    session = SessionLocal()
+    loc = Location(name=code, code=code, portal_name="u", portal_password="p", ip_schema="ip")
+    session.add(loc)
+    session.commit()
+    zone = Zone(code=code, location_id=loc.id)
+    session.add(zone)
+    session.commit()
+    pole = Pole(zone_id=zone.id, code=code, location_id=loc.id)
+    session.add(pole)
+    session.commit()
+    cam = Camera(pole_id=pole.id, api_code=code, p_ip=p_ip)
+    session.add(cam)
+    session.commit()
+    cam_id = cam.id
+    session.close()
+    return cam_id
+
+
+def test_get_camera_frame_unavailable(client):
+    cam_id = _camera("H1", "10.0.0.8")
+    with patch("main.fetch_camera_frame", side_effect=main.CameraUnavailable("open")):
+        resp = client.get(f"/cameras/{cam_id}/frame")
+    assert resp.status_code == 503
+
+
+def test_camera_health_lists_cameras(client):
+    cam_id = _camera("H2", "10.0.0.9")
+    with patch.object(main, "CAMERA_HEALTH", CameraHealth()) as health:
+        health.record("10.0.0.9", "rtsp", False, kind="connect", error="no frame")
+        resp = client.get("/camera-health")
+    assert resp.status_code == 200
+    cam = next(c for c in resp.json() if c["camera_id"] == cam_id)
+    assert cam["health"]["10.0.0.9"]["connect_failures"] == 1
+    assert cam["health"]["10.0.0.9"]["state"] == "closed"
+
+
+def test_get_camera_frame_scaled_and_shared(client):
+    cam_id = _camera("H3", "10.0.0.10")
+    buf = io.BytesIO()
+    Image.new("RGB", (800, 600)).save(buf, format="JPEG")
+    with patch.object(main, "FRAME_PREVIEWS", FramePreviews(ttl=5)), \
+         patch("main.fetch_camera_frame", return_value=buf.getvalue()) as grab:
+        resp = client.get(f"/cameras/{cam_id}/frame", params={"width": 200, "quality": 60})
+        raw = client.get(f"/cameras/{cam_id}/frame")
+    assert resp.status_code == 200
+    assert Image.open(io.BytesIO(resp.content)).size == (200, 150)
+    assert raw.content == buf.getvalue()
+    assert grab.call_count == 1
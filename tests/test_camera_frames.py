@@ -0,0 +1,163 @@
+import base64
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email import message_from_bytes
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+TEST_DB = "sqlite:///./test.db"
+os.environ["DATABASE_URL"] = TEST_DB
+
+from db import Base, engine, SessionLocal
+import main
+from main import app, get_password_hash
+from camera_health import CameraUnavailable
+from frame_preview import FramePreviews
+from models import Location, Zone, Pole, Camera, User
+
+Base.metadata.drop_all(bind=engine)
+Base.metadata.create_all(bind=engine)
+
+session = SessionLocal()
+user = User(username="test", hashed_password=get_password_hash("secret"))
+session.add(user)
+loc = Location(name="Loc", code="L1", portal_name="u", portal_password="p", ip_schema="ip",
+               camera_user="user", camera_pass="pass", parameters={"rtsp_path": "/live"})
+session.add(loc)
+session.commit()
+zone = Zone(code="Z1", location_id=loc.id)
+session.add(zone)
+session.commit()
+pole_a = Pole(zone_id=zone.id, code="PA", location_id=loc.id)
+pole_b = Pole(zone_id=zone.id, code="PB", location_id=loc.id)
+session.add_all([pole_a, pole_b])
+session.commit()
+cams = [
+    Camera(pole_id=pole_a.id, api_code="A1", p_ip="10.0.0.1"),
+    Camera(pole_id=pole_a.id, api_code="A2", p_ip="10.0.0.2"),
+    Camera(pole_id=pole_b.id, api_code="B1", p_ip="10.0.0.3"),
+]
+session.add_all(cams)
+session.commit()
+CAM_IDS = [c.id for c in cams]
+POLE_A, ZONE = pole_a.id, zone.id
+session.close()
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as c:
+        resp = c.post(
+            "/token",
+            data={"username": "test", "password": "secret"},
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        token = resp.json()["access_token"]
+        c.headers.update({"Authorization": f"Bearer {token}"})
+        yield c
+    Base.metadata.drop_all(bind=engine)
+    try:
+        os.remove("test.db")
+    except FileNotFoundError:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fresh_previews():
+    with patch.object(main, "FRAME_PREVIEWS", FramePreviews(ttl=5)):
+        yield
+
+
+def _fake_grab(ip, user, pwd, rtsp_path="/", cancel_event=None):
+    if ip == "10.0.0.2":
+        raise CameraUnavailable("open")
+    return f"{ip}{rtsp_path}".encode()
+
+
+def test_frames_by_zone_grabbed_concurrently(client):
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def grab(*args, **kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.1)
+        with lock:
+            active["now"] -= 1
+        return _fake_grab(*args, **kwargs)
+
+    with patch("main.fetch_camera_frame", side_effect=grab):
+        resp = client.get("/camera-frames", params={"zone_id": ZONE})
+    assert resp.status_code == 200
+    frames = {f["camera_id"]: f for f in resp.json()["frames"]}
+    assert base64.b64decode(frames[CAM_IDS[0]]["image"]) == b"10.0.0.1/live"
+    assert frames[CAM_IDS[0]]["elapsed_ms"] >= 100
+    assert frames[CAM_IDS[1]]["error"] == "unavailable"
+    assert frames[CAM_IDS[2]]["image"]
+    assert active["peak"] > 1
+
+
+def test_frames_multipart_and_unknown_ids(client):
+    with patch("main.fetch_camera_frame", side_effect=_fake_grab):
+        resp = client.get(
+            "/camera-frames",
+            params={"camera_ids": [CAM_IDS[0], 999], "format": "multipart"},
+        )
+    assert resp.status_code == 200
+    ctype = resp.headers["content-type"]
+    assert ctype.startswith("multipart/mixed")
+    msg = message_from_bytes(f"Content-Type: {ctype}\r\n\r\n".encode() + resp.content)
+    parts = {p["X-Camera-Id"]: p for p in msg.get_payload()}
+    assert parts[str(CAM_IDS[0])].get_content_type() == "image/jpeg"
+    assert parts[str(CAM_IDS[0])].get_payload(decode=True) == b"10.0.0.1/live"
+    assert b"not found" in parts["999"].get_payload(decode=True)
+
+
+def test_frames_pole_filter_and_timeout(client):
+    release = threading.Event()
+
+    def slow(*args, **kwargs):
+        release.wait(5)
+        return b"late"
+
+    try:
+        with patch("main.fetch_camera_frame", side_effect=slow), \
+             patch.object(main, "CAMERA_FRAMES_TIMEOUT", 0.1):
+            resp = client.get("/camera-frames", params={"pole_id": POLE_A})
+    finally:
+        release.set()
+    frames = resp.json()["frames"]
+    assert [f["camera_id"] for f in frames] == CAM_IDS[:2]
+    assert all(f["error"] == "timeout" for f in frames)
+
+
+def test_frames_share_grab_with_single_frame_endpoint(client):
+    started, release = threading.Event(), threading.Event()
+
+    def grab(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return b"shared"
+
+    with patch("main.fetch_camera_frame", side_effect=grab) as fetch, \
+         ThreadPoolExecutor(max_workers=2) as pool:
+        single = pool.submit(client.get, f"/cameras/{CAM_IDS[0]}/frame")
+        assert started.wait(5)
+        bulk = pool.submit(client.get, "/camera-frames", params={"camera_ids": [CAM_IDS[0]]})
+        time.sleep(0.2)
+        release.set()
+        single, bulk = single.result(5), bulk.result(5)
+    assert single.content == b"shared"
+    assert base64.b64decode(bulk.json()["frames"][0]["image"]) == b"shared"
+    assert fetch.call_count == 1
+    assert main.FRAME_PREVIEWS.stats()["coalesced"] == 1
+
+
+def test_frames_requires_one_selector(client):
+    assert client.get("/camera-frames").status_code == 400
+    assert client.get("/camera-frames", params={"pole_id": 1, "zone_id": 1}).status_code == 400
@@ -0,0 +1,91 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+import camera_clip
+from camera_health import CameraHealth, CameraUnavailable
+
+
+def test_circuit_opens_after_consecutive_failures():
+    health = CameraHealth(failure_threshold=2, cooldown=60, probe_interval=0)
+    health.record("cam", "rtsp", False, kind="connect")
+    health.check("cam")
+    health.record("cam", "rtsp", False, kind="read")
+    with pytest.raises(CameraUnavailable):
+        health.check("cam")
+
+    snap = health.snapshot("cam")
+    assert snap["state"] == "open"
+    assert (snap["connect_failures"], snap["read_failures"], snap["rejected"]) == (1, 1, 1)
+    assert health.stats()["open"] == 1
+
+
+def test_half_open_after_cooldown_and_success_closes():
+    health = CameraHealth(failure_threshold=1, cooldown=10, probe_interval=0)
+    with patch("camera_health.time.monotonic", return_value=100.0):
+        health.record("cam", "clip", False)
+    with patch("camera_health.time.monotonic", return_value=111.0):
+        assert health.allow("cam")
+        assert health.snapshot("cam")["state"] == "half_open"
+        health.record("cam", "clip", False)
+        assert not health.allow("cam")
+    health.record("cam", "clip", True, 0.2)
+    snap = health.snapshot("cam")
+    assert snap["state"] == "closed"
+    assert snap["latency"]["clip"]["count"] == 1
+
+
+def test_half_open_admits_a_single_trial():
+    health = CameraHealth(failure_threshold=1, cooldown=10, probe_interval=0)
+    with patch("camera_health.time.monotonic", return_value=100.0):
+        health.record("cam", "rtsp", False)
+    with patch("camera_health.time.monotonic", return_value=111.0):
+        assert [health.allow("cam") for _ in range(5)] == [True, False, False, False, False]
+        assert health.is_open("cam")
+    # A trial that never reports back is replaced after another cooldown.
+    with patch("camera_health.time.monotonic", return_value=122.0):
+        assert health.allow("cam")
+        assert not health.allow("cam")
+        health.record("cam", "rtsp", True)
+        assert health.allow("cam") and health.allow("cam")
+    assert health.snapshot("cam")["rejected"] == 5
+
+
+def test_probe_half_opens_reachable_cameras():
+    probe = MagicMock(side_effect=lambda ip: ip == "up")
+    health = CameraHealth(failure_threshold=1, probe_interval=0, probe=probe)
+    health.record("up", "rtsp", False)
+    health.record("down", "rtsp", False)
+    health.probe_open()
+    assert health.snapshot("up")["state"] == "half_open"
+    assert health.snapshot("down")["state"] == "open"
+    assert health.allow("up") and not health.allow("up")
+    health.record("up", "rtsp", True)
+    assert health.snapshot("up")["state"] == "closed"
+
+
+def test_probe_answer_with_failed_trial_stays_open():
+    health = CameraHealth(failure_threshold=3, probe_interval=0, probe=lambda ip: True)
+    for _ in range(3):
+        health.record("cam", "rtsp", False, kind="read")
+    health.probe_open()
+    assert health.allow("cam")
+    health.record("cam", "rtsp", False, kind="read", error="no frame")
+    assert health.snapshot("cam")["state"] == "open"
+    assert not health.allow("cam")
+
+
+def test_clip_download_fails_fast_when_open():
+    health = CameraHealth(failure_threshold=1, probe_interval=0)
+    with patch.object(camera_clip, "CAMERA_HEALTH", health), \
+         patch("camera_clip.requests.get", side_effect=requests.ConnectionError("refused")) as get, \
+         patch("camera_clip.time.sleep") as sleep:
+        start = datetime(2025, 1, 1)
+        assert camera_clip.request_camera_clip("ip", "u", "p", start, start, "seg") is None
+        assert camera_clip.request_camera_clip("ip", "u", "p", start, start, "seg") is None
+
+    assert get.call_count == 1
+    sleep.assert_not_called()
+    assert health.snapshot("ip")["connect_failures"] == 1
@@ -0,0 +1,77 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import camera_clip
+from camera_health import CameraHealth
+from camera_routes import CameraRoutes
+
+
+def _routes(latency, **kwargs):
+    """Routes whose measurements come from ``latency[(ip, service)]`` (seconds or None)."""
+
+    def measure(ip, service):
+        value = latency.get((ip, service))
+        return None if value is None else {"connect": value / 2, "first_byte": value}
+
+    kwargs.setdefault("health", CameraHealth(probe_interval=0))
+    return CameraRoutes(interval=60, switch_margin=0.2, measure=measure, **kwargs)
+
+
+def test_switches_only_to_clearly_faster_route():
+    latency = {
+        ("pub", "rtsp"): 0.100, ("vpn", "rtsp"): 0.050,
+        ("pub", "http"): 0.100, ("vpn", "http"): 0.090,
+    }
+    routes = _routes(latency)
+    routes.register("pub", "vpn")
+    routes.measure_all()
+
+    assert routes.resolve("pub", "rtsp") == "vpn"
+    assert routes.resolve("pub", "http") == "pub"
+    snap = routes.snapshot("pub")
+    assert snap["rtsp"]["measured"]["vpn"] == {"connect": 25.0, "first_byte": 50.0}
+    assert routes.stats()["switches"] == 1
+
+
+def test_fails_over_when_route_stops_answering():
+    latency = {("pub", "rtsp"): 0.01, ("vpn", "rtsp"): 0.5}
+    routes = _routes(latency)
+    routes.register("pub", "vpn")
+    routes.measure_all()
+    assert routes.resolve("pub") == "pub"
+
+    latency[("pub", "rtsp")] = None
+    routes.measure_all()
+    assert routes.resolve("pub") == "vpn"
+
+
+def test_resolve_avoids_open_circuit():
+    health = CameraHealth(failure_threshold=1, probe_interval=0)
+    routes = _routes({}, health=health)
+    routes.register("pub", "vpn")
+    health.record("pub", "rtsp", False)
+    assert routes.resolve("pub") == "vpn"
+    assert routes.stats()["failovers"] == 1
+
+
+def test_disabled_or_unknown_camera_uses_p_ip():
+    routes = CameraRoutes(interval=0)
+    routes.register("pub", "vpn")
+    assert routes.resolve("pub") == "pub"
+    assert _routes({}).resolve("other") == "other"
+
+
+def test_loader_registers_and_clip_download_uses_chosen_route(tmp_path):
+    routes = _routes({("pub", "http"): 0.2, ("vpn", "http"): 0.05})
+    routes._loader = lambda: [("pub", "vpn"), ("solo", None)]
+    routes.measure_all()
+    assert routes.snapshot("solo") is None
+
+    with patch.object(camera_clip, "CAMERA_ROUTES", routes), \
+         patch.object(camera_clip, "CAMERA_HEALTH", CameraHealth(probe_interval=0)), \
+         patch.object(camera_clip, "VIDEO_CLIPS_DIR", str(tmp_path)), \
+         patch("camera_clip.requests.get", side_effect=RuntimeError("stop")) as get, \
+         patch("camera_clip.time.sleep"):
+        start = datetime(2025, 1, 1)
+        camera_clip.request_camera_clip("pub", "u", "p", start, start, "seg")
+    assert get.call_args.args[0] == "http://vpn/dataloader.cgi"
@@ -0,0 +1,38 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+import main
+from main import DetectorCandidateCreate, create_detector_candidate
+
+
+def _create(path):
+    return create_detector_candidate(DetectorCandidateCreate(path=str(path)), current_user=None)
+
+
+def test_candidate_weights_must_be_inside_weights_dir(tmp_path):
+    weights = tmp_path / "models"
+    weights.mkdir()
+    outside = tmp_path / "evil.pt"
+    outside.write_bytes(b"x")
+    (weights / "link.pt").symlink_to(outside)
+
+    with patch.object(main, "DETECTOR_WEIGHTS_DIR", str(weights)), \
+         patch("main.load_candidate") as load:
+        for path in (outside, weights / ".." / "evil.pt", weights / "link.pt"):
+            with pytest.raises(HTTPException) as exc:
+                _create(path)
+            assert exc.value.status_code == 400
+        assert not load.called
+
+
+def test_candidate_weights_inside_weights_dir_are_loaded(tmp_path):
+    (tmp_path / "car_v2.pt").write_bytes(b"x")
+    with patch.object(main, "DETECTOR_WEIGHTS_DIR", str(tmp_path)), \
+         patch("main.load_candidate", return_value={"state": "loading"}) as load:
+        assert _create(tmp_path / "car_v2.pt") == {"state": "loading"}
+    load.assert_called_once_with(os.path.realpath(tmp_path / "car_v2.pt"), 0.1)
@@ -0,0 +1,92 @@
+import contextlib
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+import camera_clip
+
+
+class DummyResponse:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.sent = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+
+def _fake_av(times):
+    """PyAV stand-in whose decoder reads one response chunk per frame."""
+    decoded = []
+
+    def open_container(reader, mode):
+        def decode(video):
+            for t in times:
+                reader.read(4)
+                frame = SimpleNamespace(time=t, to_ndarray=lambda format, t=t: np.full((2, 2, 3), int(t * 10), np.uint8))
+                decoded.append(t)
+                yield frame
+
+        return contextlib.nullcontext(SimpleNamespace(decode=decode))
+
+    return SimpleNamespace(open=open_container), decoded
+
+
+def test_stream_stops_at_frame_for_offset():
+    response = DummyResponse([b"abcd"] * 10)
+    fake_av, decoded = _fake_av([0.0, 0.5, 1.0, 1.5, 2.0])
+    with patch.object(camera_clip, "av", fake_av), \
+         patch("camera_clip.requests.get", return_value=response) as get, \
+         patch("cv2.imencode", side_effect=lambda ext, arr: (True, arr[0, 0, :1])):
+        before = camera_clip.exit_frame_stats()["stream"]
+        data = camera_clip.stream_clip_frame(
+            "ip", "u", "p", datetime(2025, 1, 1), datetime(2025, 1, 1, 0, 0, 5), offset=1.2
+        )
+
+    assert data == bytes([10])  # the 1.0 s frame, just before the offset
+    assert decoded == [0.0, 0.5, 1.0, 1.5]
+    assert response.sent == 4 and response.closed
+    assert get.call_args.kwargs["params"]["starttime"] == "2025-01-01 00:00:00"
+    after = camera_clip.exit_frame_stats()["stream"]
+    assert after["frames"] == before["frames"] + 1
+    assert after["bytes"] == before["bytes"] + 16
+
+
+def test_fetch_exit_frame_falls_back_to_download(tmp_path):
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"x" * 100)
+    with patch.object(camera_clip, "av", MagicMock()), \
+         patch("camera_clip.stream_clip_frame", side_effect=RuntimeError("moov at end")), \
+         patch("camera_clip.request_camera_clip", return_value=str(clip)), \
+         patch("camera_clip.frame_from_video", return_value=b"jpg"):
+        before = camera_clip.exit_frame_stats()
+        assert camera_clip.fetch_exit_frame("ip", "u", "p", datetime(2025, 1, 1)) == b"jpg"
+        after = camera_clip.exit_frame_stats()
+
+    assert not clip.exists()
+    assert after["fallbacks"] == before["fallbacks"] + 1
+    assert after["download"]["bytes"] == before["download"]["bytes"] + 100
+
+
+def test_fetch_exit_frame_without_pyav_downloads(tmp_path):
+    with patch.object(camera_clip, "av", None), \
+         patch("camera_clip.stream_clip_frame") as stream, \
+         patch("camera_clip.request_camera_clip", return_value=None):
+        with pytest.raises(RuntimeError):
+            camera_clip.fetch_exit_frame("ip", "u", "p", datetime(2025, 1, 1))
+    stream.assert_not_called()
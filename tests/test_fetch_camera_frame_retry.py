@@ -1,4 +1,7 @@
+import threading
+
 import numpy as np
+import pytest
 from unittest.mock import MagicMock, patch
 
 import camera_clip
@@ -36,3 +39,37 @@ def test_fetch_camera_frame_custom_path():
         camera_clip.fetch_camera_frame('ip', 'u', 'p', rtsp_path='/foo', max_attempts=1)
 
     vs.assert_called_with('rtsp://u:p@ip:554/foo')
+
+
+def test_fetch_camera_frame_stops_when_cancelled():
+    dummy_stream = MagicMock()
+    dummy_stream.read.return_value = None
+    dummy_stream.start.return_value = dummy_stream
+    cancel = threading.Event()
+    cancel.set()
+
+    with patch('camera_clip.VideoStream', return_value=dummy_stream):
+        with pytest.raises(camera_clip.FetchCancelled):
+            camera_clip.fetch_camera_frame('ip', 'u', 'p', cancel_event=cancel)
+
+    dummy_stream.read.assert_not_called()
+    dummy_stream.stop.assert_called_once()
+
+
+def test_frame_prefetch_result_and_cancel():
+    before = camera_clip.prefetch_stats()
+    fetch = MagicMock(return_value=b'jpg')
+
+    prefetch = camera_clip.FramePrefetch(fetch, 'ip', 'u', 'p', rtsp_path='/x')
+    assert prefetch.result(timeout=1) == b'jpg'
+    assert fetch.call_args.kwargs['rtsp_path'] == '/x'
+    assert fetch.call_args.kwargs['cancel_event'] is not None
+
+    blocker = threading.Event()
+    slow = camera_clip.FramePrefetch(lambda cancel_event: blocker.wait(1) or b'')
+    slow.cancel()
+    blocker.set()
+
+    after = camera_clip.prefetch_stats()
+    assert after['hits'] == before['hits'] + 1
+    assert after['wasted'] == before['wasted'] + 1
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+from frame_analysis import CameraFrameAnalyzer, assign_to_spots, overlap_matrices
+
+
+def test_overlap_and_assignment_vectorised():
+    spots = np.array([[0, 0, 100, 100], [100, 0, 200, 100]], np.float32)
+    boxes = np.array(
+        [
+            [10, 10, 30, 20],    # inside spot 0
+            [90, 10, 130, 20],   # 75% inside spot 1
+            [40, 40, 60, 50],    # inside spot 0, more confident
+            [300, 300, 310, 310],  # outside every spot
+        ],
+        np.float32,
+    )
+    conf = np.array([0.5, 0.9, 0.8, 0.99], np.float32)
+
+    iou, containment = overlap_matrices(boxes, spots)
+    assert containment.shape == (4, 2)
+    assert containment[1, 1] == 0.75
+    assert iou[3].max() == 0
+
+    assert assign_to_spots(boxes, conf, spots).tolist() == [2, 1]
+    assert assign_to_spots(boxes, conf, spots, min_containment=0.8).tolist() == [2, -1]
+    assert assign_to_spots(boxes[:0], conf[:0], spots).tolist() == [-1, -1]
+
+
+def test_analyzer_shares_one_inference_per_window():
+    calls = []
+
+    def detect(frame, imgsz):
+        calls.append(frame.shape)
+        boxes = SimpleNamespace(
+            xyxy=np.array([[10, 10, 30, 20], [120, 10, 150, 20]], np.float32),
+            conf=np.array([0.9, 0.8], np.float32),
+        )
+        return [SimpleNamespace(boxes=boxes)]
+
+    spots = [
+        SimpleNamespace(spot_number=1, bbox=(0, 0, 100, 100)),
+        SimpleNamespace(spot_number=2, bbox=(100, 0, 200, 100)),
+        SimpleNamespace(spot_number=3, bbox=(200, 0, 300, 100)),
+    ]
+    analyzer = CameraFrameAnalyzer(detect, window=5)
+    frame = np.zeros((100, 300, 3), np.uint8)
+
+    with patch("frame_analysis.time.monotonic", return_value=100.0):
+        first = analyzer.spot(7, 1, frame, spots)
+        second = analyzer.spot(7, 2, frame, spots)
+        third = analyzer.spot(7, 3, frame, spots)
+    assert len(calls) == 1
+    assert first.plate_box == (10, 10, 30, 20)
+    assert second.plate_box == (120, 10, 150, 20) and second.occupied
+    assert not third.occupied and third.plate_box is None
+    assert analyzer.stats()["reused"] == 2
+
+    with patch("frame_analysis.time.monotonic", return_value=106.0):
+        analyzer.spot(7, 1, frame, spots)
+    assert len(calls) == 2
+
+
+def test_change_gate_skips_detector_for_unchanged_frame():
+    from spot_hashes import SpotHashTable
+
+    calls = []
+
+    def detect(frame, imgsz):
+        calls.append(1)
+        return []
+
+    spots = [
+        SimpleNamespace(spot_number=1, bbox=(0, 0, 100, 100)),
+        SimpleNamespace(spot_number=2, bbox=(100, 0, 200, 100)),
+    ]
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (100, 200, 3), dtype=np.uint8)
+    analyzer = CameraFrameAnalyzer(detect, window=0, hashes=SpotHashTable(64), max_change=2)
+
+    analyzer.analyze(3, frame, spots)
+    analyzer.analyze(3, frame.copy(), spots)
+    assert len(calls) == 1
+    assert analyzer.stats()["unchanged_frames"] == 1
+
+    # A car arriving in spot 2 changes its crop hash.
+    frame[:, 100:] = 0
+    frame[20:80, 120:180] = 255
+    analyzer.analyze(3, frame, spots)
+    assert len(calls) == 2
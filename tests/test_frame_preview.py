@@ -0,0 +1,63 @@
+import io
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from PIL import Image
+
+from frame_preview import FramePreviews, scale_jpeg
+
+
+def _jpeg(size=(640, 360)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def test_concurrent_requests_share_one_grab():
+    release = threading.Event()
+    grab = MagicMock(side_effect=lambda: release.wait(1) and b"frame")
+    previews = FramePreviews(ttl=5)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(previews.get(1, grab))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == [b"frame"] * 4
+    assert grab.call_count == 1
+    stats = previews.stats()
+    assert (stats["misses"], stats["coalesced"]) == (1, 3)
+
+
+def test_ttl_expiry_and_errors_are_not_cached():
+    previews = FramePreviews(ttl=2)
+    grab = MagicMock(side_effect=[RuntimeError("down"), b"a", b"b"])
+    with patch("frame_preview.time.monotonic", return_value=10.0):
+        with pytest.raises(RuntimeError):
+            previews.get(1, grab)
+        assert previews.get(1, grab) == b"a"
+        assert previews.get(1, grab) == b"a"
+    with patch("frame_preview.time.monotonic", return_value=13.0):
+        assert previews.get(1, grab) == b"b"
+    stats = previews.stats()
+    assert (stats["hits"], stats["misses"], stats["errors"]) == (1, 3, 1)
+
+
+def test_scaled_previews_are_cached_per_size():
+    previews = FramePreviews(ttl=5)
+    grab = MagicMock(return_value=_jpeg())
+    small = previews.get(1, grab, width=160, quality=50)
+    assert Image.open(io.BytesIO(small)).size == (160, 90)
+    assert previews.get(1, grab, width=160, quality=50) is small
+    assert previews.get(1, grab) == grab.return_value
+    assert previews.stats()["scaled"] == 1
+
+
+def test_scale_jpeg_does_not_enlarge():
+    assert Image.open(io.BytesIO(scale_jpeg(_jpeg((100, 200)), width=400))).size == (100, 200)
+    assert Image.open(io.BytesIO(scale_jpeg(_jpeg((400, 800)), width=90))).size == (90, 180)
@@ -0,0 +1,66 @@
+import base64
+import io
+
+import numpy as np
+from PIL import Image
+
+from image_budget import ImageBudget, budget_b64_data, budget_file
+from metrics import TrafficStats, payload_size
+
+
+def _png(w, h, seed=0):
+    rng = np.random.default_rng(seed)
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (h, w, 3), dtype=np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_resizes_and_meets_byte_target():
+    budget = ImageBudget("t", max_dim=200, quality=90, max_bytes=20000)
+    out = budget.encode(_png(800, 400))
+    img = Image.open(io.BytesIO(out))
+    assert img.format == "JPEG"
+    assert max(img.size) <= 200
+    assert len(out) <= 20000
+    assert budget.stats()["reencoded"] == 1
+
+
+def test_small_jpeg_passes_through_and_disabled_budget():
+    buf = io.BytesIO()
+    Image.new("RGB", (50, 20), "white").save(buf, format="JPEG")
+    data = buf.getvalue()
+    budget = ImageBudget("t", max_dim=200, quality=90, max_bytes=20000)
+    assert budget.encode(data) is data
+    assert ImageBudget("t", 10, 50, 10, enabled=False).encode(b"raw") == b"raw"
+    # Undecodable data is sent unchanged
+    assert budget.encode(b"not an image") == b"not an image"
+
+
+def test_budget_file_caches_per_file(tmp_path):
+    path = tmp_path / "plate.png"
+    path.write_bytes(_png(400, 100))
+    budget = ImageBudget("cache", max_dim=100, quality=80, max_bytes=50000)
+    first = budget_file(str(path), budget)
+    assert budget_file(str(path), budget) == first
+    assert budget.stats()["cache_hits"] == 1
+    assert budget.stats()["images"] == 1
+
+
+def test_budget_b64_data_leaves_stored_image_intact():
+    stored = base64.b64encode(_png(400, 100)).decode()
+    budget = ImageBudget("stored", max_dim=100, quality=80, max_bytes=50000)
+    sent = Image.open(io.BytesIO(base64.b64decode(budget_b64_data(stored, budget))))
+    assert sent.size == (100, 25)
+    assert budget_b64_data(stored, ImageBudget("off", 100, 80, 50000, enabled=False)) == stored
+
+
+def test_traffic_stats_per_endpoint():
+    stats = TrafficStats()
+    size = payload_size({"images": ["a" * 100]})
+    assert 100 < size < 130
+    stats.record("http://x/park-in", size, 10, 0.2)
+    stats.record("http://x/park-in", size, 0, 0.5, ok=False)
+    snap = stats.snapshot()["http://x/park-in"]
+    assert snap["requests"] == 2 and snap["errors"] == 1
+    assert snap["bytes_out"] == 2 * size
+    assert snap["latency"]["count"] == 2
@@ -0,0 +1,50 @@
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+from image_decode import decode, decode_roi, decode_stats, read_image, reduction_for
+
+
+def _jpeg(width=640, height=480):
+    x = np.linspace(0, 255, width, dtype=np.uint8)
+    arr = np.stack([np.tile(x, (height, 1))] * 3, axis=2)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def test_reduction_keeps_long_side_above_target():
+    assert reduction_for(1920, 1080, 800) == 2
+    assert reduction_for(1920, 1080, 240) == 8
+    assert reduction_for(640, 480, 800) == 1
+    assert reduction_for(1920, 1080, None) == 1
+
+
+def test_reduced_decode():
+    data = _jpeg()
+    assert decode(data).shape == (480, 640, 3)
+    assert decode(data, max_dim=160, op="test").shape == (120, 160, 3)
+    assert decode(data, max_dim=300, gray=True, op="test").shape == (240, 320)
+
+
+def test_roi_decode_matches_full_decode():
+    data = _jpeg()
+    full = decode(data)
+    roi = decode_roi(data, (100, 50, 300, 400), op="test")
+    assert roi.shape == (350, 200, 3)
+    assert np.array_equal(roi, full[50:400, 100:300])
+    # Regions are clipped to the image.
+    assert decode_roi(data, (600, 400, 700, 500), op="test").shape == (80, 40, 3)
+
+
+def test_invalid_data_and_stats(tmp_path):
+    assert decode(b"not an image", op="broken") is None
+    assert read_image(str(tmp_path / "missing.jpg")) is None
+    ops = decode_stats()["operations"]
+    assert ops["broken"]["errors"] == 1
+    assert ops["test"]["reduced"] >= 2
+    assert ops["test"]["latency"]["count"] >= 3
@@ -0,0 +1,76 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+import ocr_processor
+from model_swap import ShadowCandidate
+
+
+class BoxModel:
+    def __init__(self, box):
+        self.box = box
+
+    def __call__(self, arr, imgsz=None):
+        boxes = SimpleNamespace(xyxy=np.array([self.box])) if self.box else []
+        return [SimpleNamespace(boxes=boxes)]
+
+
+def _drain(candidate):
+    # The shadow pool has a single thread, so this waits for queued runs.
+    candidate._pool.submit(lambda: None).result(timeout=5)
+
+
+def test_shadow_candidate_measures_agreement():
+    candidate = ShadowCandidate("cand.pt", sample_rate=1.0, loader=lambda p: BoxModel([0, 0, 10, 10]))
+    _drain(candidate)
+    assert candidate.state == "ready"
+
+    arr = np.zeros((20, 20, 3), np.uint8)
+    candidate.offer(arr, None, BoxModel([1, 1, 10, 10])(arr), 0.05)
+    _drain(candidate)
+    candidate.offer(arr, None, BoxModel(None)(arr), 0.05)
+    _drain(candidate)
+
+    stats = candidate.stats()
+    assert stats["compared"] == 2
+    assert stats["agree"] == 1
+    assert stats["candidate_only"] == 1
+    assert stats["agreement"] == 0.5
+    assert stats["candidate_latency"]["count"] == 2
+    candidate.close()
+
+
+def test_failed_load_is_reported():
+    def loader(path):
+        raise FileNotFoundError(path)
+
+    candidate = ShadowCandidate("missing.pt", loader=loader)
+    _drain(candidate)
+    assert candidate.stats()["state"] == "failed"
+    candidate.close()
+
+
+def test_promote_swaps_primary_detector():
+    primary = BoxModel(None)
+    new_model = BoxModel([2, 2, 8, 8])
+    candidate = ShadowCandidate("new.pt", sample_rate=1.0, loader=lambda p: new_model)
+    _drain(candidate)
+
+    with patch("ocr_processor.plate_model", primary), \
+         patch("ocr_processor._candidate", candidate), \
+         patch("ocr_processor.plate_model_path", "old.pt"):
+        arr = np.zeros((20, 20, 3), np.uint8)
+        assert ocr_processor._first_box(ocr_processor._detect(arr)) is None
+        _drain(candidate)
+        assert ocr_processor.candidate_stats()["primary_latency"]["count"] == 1
+
+        report = ocr_processor.promote_candidate()
+        assert report["compared"] == 1
+        assert ocr_processor.plate_model is new_model
+        assert ocr_processor._candidate is None
+        assert ocr_processor._first_box(ocr_processor._detect(arr)) == (2, 2, 8, 8)
+        assert ocr_processor.detector_stats()["plate_detector"]["model"] == "new.pt"
@@ -0,0 +1,81 @@
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+from motion_gate import MotionGate
+from spot_index import SpotGeometry
+from utils import resolve_motion_threshold
+
+
+def _crop(seed, size=120):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("method", ["absdiff", "ssim"])
+def test_gate_marks_unchanged_crops(method):
+    gate = MotionGate(method)
+    base = _crop(1)
+    noisy = np.clip(base.astype(int) + 2, 0, 255).astype(np.uint8)
+
+    assert gate.check(1, 1, base, (0, 0, 120, 120)) == (False, None)
+    unchanged, score = gate.check(1, 1, noisy, (0, 0, 120, 120))
+    assert unchanged and score < gate.threshold
+    assert not gate.check(1, 1, _crop(2), (0, 0, 120, 120))[0]
+
+    cam = gate.stats()["cameras"][1]
+    assert cam["checks"] == 3
+    assert cam["unchanged"] == 1
+    assert cam["hit_rate"] == round(1 / 3, 4)
+    assert cam["thresholds"] == {1: gate.threshold}
+
+
+def test_per_spot_threshold_and_moved_spot():
+    gate = MotionGate("absdiff", threshold=4)
+    base = _crop(1)
+    brighter = np.clip(base.astype(int) + 6, 0, 255).astype(np.uint8)
+    gate.check(2, 1, base, (0, 0, 10, 10))
+    assert not gate.check(2, 1, brighter, (0, 0, 10, 10))[0]
+    assert gate.check(2, 1, brighter, (0, 0, 10, 10), threshold=10)[0]
+    # A reference taken for another bbox is not compared.
+    assert gate.check(2, 1, brighter, (5, 0, 15, 10)) == (False, None)
+
+
+def test_resolve_motion_threshold():
+    params = {"motion_threshold": 3, "motion_threshold_overrides": {"4": 6, "4:2": "1.5"}}
+    assert resolve_motion_threshold(params, 4, 2) == 1.5
+    assert resolve_motion_threshold(params, 4, 1) == 6
+    assert resolve_motion_threshold(params, 5, 1) == 3
+    assert resolve_motion_threshold("{}", 5, 1) is None
+
+
+def test_unchanged_event_skips_detection(tmp_path):
+    import ocr_processor
+
+    Image.fromarray(_crop(3, size=40)).save(tmp_path / "snapshot_a.jpg")
+    Image.open(tmp_path / "snapshot_a.jpg").save(tmp_path / "snapshot_b.jpg")
+    spot = SpotGeometry(id=1, camera_id=9, spot_number=1, bbox=(0, 0, 30, 30))
+    args = dict(
+        payload={"parking_area": 1},
+        park_folder=str(tmp_path),
+        camera_id=9,
+        pole_id=1,
+        api_pole_id=None,
+        spot_number=1,
+        camera_ip="ip",
+        camera_user="u",
+        camera_pass="p",
+        parkonic_api_token="t",
+    )
+    with patch.object(ocr_processor, "MOTION_GATE", MotionGate("absdiff")), \
+         patch("ocr_processor.SPOT_INDEX.get", return_value=spot), \
+         patch("ocr_processor.shutil.copy"), \
+         patch("ocr_processor._locate_plate", side_effect=RuntimeError("stop")) as locate:
+        ocr_processor.process_plate_and_issue_ticket(ts="a", **args)
+        ocr_processor.process_plate_and_issue_ticket(ts="b", **args)
+    assert locate.call_count == 1
@@ -0,0 +1,190 @@
+import io
+import os
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from PIL import Image
+
+TEST_DB = "sqlite:///./test.db"
+os.environ["DATABASE_URL"] = TEST_DB
+
+from db import Base, engine, SessionLocal
+from models import Location, Zone, Pole, Camera, Ticket
+from occupancy_sweep import CameraTarget, OccupancySweep, open_ticket_targets
+from spot_index import SpotGeometry
+
+
+def _frame_bytes():
+    buf = io.BytesIO()
+    Image.new("RGB", (200, 100)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+FRAME = _frame_bytes()
+
+
+def _target(camera_id, pole_id, tickets):
+    return CameraTarget(camera_id, pole_id, "ip", "u", "p", "/", None, None, dict(tickets))
+
+
+def _spot(camera_id, spot_number):
+    return SpotGeometry(id=spot_number, camera_id=camera_id, spot_number=spot_number,
+                        bbox=(spot_number * 50, 0, spot_number * 50 + 50, 100))
+
+
+def test_one_inference_per_camera_and_confirmed_close():
+    targets = [_target(1, 1, {10: 0, 11: 1, 12: 2})]
+    batches = []
+
+    def present(crops, imgsz=None):
+        batches.append(len(crops))
+        return [True, False, True]
+
+    closed = []
+    sweep = OccupancySweep(
+        grab=lambda t: FRAME,
+        present=present,
+        close=lambda tid, target, when: closed.append(tid) or True,
+        action="close",
+        confirmations=2,
+        targets=lambda: targets,
+    )
+    with patch("occupancy_sweep.SPOT_INDEX.get", side_effect=_spot):
+        sweep.sweep()
+        assert closed == []
+        sweep.sweep()
+    assert batches == [3, 3]
+    assert closed == [11]
+    stats = sweep.stats()
+    assert stats["spots_checked"] == 6
+    assert stats["closed"] == 1
+
+
+def test_crops_batched_by_detector_imgsz():
+    target = _target(1, 1, {10: 0, 11: 1, 12: 2})
+    target.imgsz = {0: 640, 1: 1280, 2: 640}
+    calls = []
+
+    def present(crops, imgsz=None):
+        calls.append((len(crops), imgsz))
+        return [imgsz == 640] * len(crops)
+
+    sweep = OccupancySweep(
+        grab=lambda t: FRAME,
+        present=present,
+        close=lambda tid, target, when: True,
+        confirmations=1,
+        targets=lambda: [target],
+    )
+    with patch("occupancy_sweep.SPOT_INDEX.get", side_effect=_spot):
+        sweep.sweep()
+    assert sorted(calls) == [(1, 1280), (2, 640)]
+    assert [f["ticket_id"] for f in sweep.stats()["flagged_tickets"]] == [11]
+
+
+def test_flag_action_lists_empty_tickets_until_reoccupied():
+    targets = [_target(1, 1, {10: 0})]
+    answers = iter([[False], [True]])
+    sweep = OccupancySweep(
+        grab=lambda t: FRAME,
+        present=lambda crops, imgsz=None: next(answers),
+        close=lambda *a: True,
+        confirmations=1,
+        targets=lambda: targets,
+    )
+    with patch("occupancy_sweep.SPOT_INDEX.get", side_effect=_spot):
+        sweep.sweep()
+        assert [f["ticket_id"] for f in sweep.stats()["flagged_tickets"]] == [10]
+        sweep.sweep()
+    assert sweep.stats()["flagged_tickets"] == []
+
+
+def test_concurrency_bounded_per_pole():
+    targets = [_target(cam, 1 if cam < 3 else 2, {cam: 0}) for cam in range(4)]
+    active, peak = {}, {}
+    lock = threading.Lock()
+
+    def grab(target):
+        with lock:
+            active[target.pole_id] = active.get(target.pole_id, 0) + 1
+            peak[target.pole_id] = max(peak.get(target.pole_id, 0), active[target.pole_id])
+        time.sleep(0.05)
+        with lock:
+            active[target.pole_id] -= 1
+        return FRAME
+
+    sweep = OccupancySweep(
+        grab=grab,
+        present=lambda crops, imgsz=None: [True] * len(crops),
+        close=lambda *a: True,
+        max_workers=4,
+        per_pole=1,
+        targets=lambda: targets,
+    )
+    with patch("occupancy_sweep.SPOT_INDEX.get", side_effect=_spot):
+        sweep.sweep()
+    assert peak == {1: 1, 2: 1}
+    assert sweep.stats()["cameras"] == 4
+
+
+def test_failed_camera_is_counted_and_others_still_checked():
+    targets = [_target(1, 1, {10: 0}), _target(2, 2, {20: 0})]
+
+    def grab(target):
+        if target.camera_id == 1:
+            raise TimeoutError("no frame")
+        return FRAME
+
+    closed = []
+    sweep = OccupancySweep(
+        grab=grab,
+        present=lambda crops, imgsz=None: [False] * len(crops),
+        close=lambda tid, target, when: closed.append(tid) or True,
+        action="close",
+        confirmations=1,
+        targets=lambda: targets,
+    )
+    with patch("occupancy_sweep.SPOT_INDEX.get", side_effect=_spot):
+        sweep.sweep()
+    assert closed == [20]
+    assert sweep.stats()["errors"] == 1
+
+
+def test_open_ticket_targets_groups_by_camera():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    loc = Location(name="Loc", code="L4", portal_name="u", portal_password="p", ip_schema="ip",
+                   camera_user="cu", camera_pass="cp",
+                   parameters={"rtsp_path": "/live", "detector_imgsz": 640})
+    db.add(loc)
+    db.commit()
+    zone = Zone(code="Z4", location_id=loc.id)
+    db.add(zone)
+    db.commit()
+    pole = Pole(zone_id=zone.id, code="P4", location_id=loc.id, api_pole_id=7)
+    db.add(pole)
+    db.commit()
+    cam = Camera(pole_id=pole.id, api_code="C4", p_ip="10.0.0.4")
+    db.add(cam)
+    db.commit()
+    now = datetime(2025, 1, 1)
+    db.add_all([
+        Ticket(camera_id=cam.id, spot_number=1, plate_number="A", entry_time=now),
+        Ticket(camera_id=cam.id, spot_number=2, plate_number="B", entry_time=now),
+        Ticket(camera_id=cam.id, spot_number=3, plate_number="C", entry_time=now, exit_time=now),
+    ])
+    db.commit()
+    cam_id = cam.id
+    db.close()
+
+    try:
+        (target,) = open_ticket_targets()
+        assert target.camera_id == cam_id
+        assert sorted(target.tickets.values()) == [1, 2]
+        assert (target.camera_user, target.rtsp_path, target.api_pole_id) == ("cu", "/live", 7)
+        assert target.imgsz == {1: 640, 2: 640}
+    finally:
+        Base.metadata.drop_all(bind=engine)
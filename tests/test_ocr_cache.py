@@ -0,0 +1,47 @@
+import numpy as np
+from unittest.mock import patch
+
+from ocr_cache import PlateOCRCache
+
+
+def _plate(seed=0):
+    rng = np.random.default_rng(seed)
+    img = np.full((40, 120, 3), 230, dtype=np.uint8)
+    for x in rng.choice(np.arange(5, 110, 8), size=6, replace=False):
+        img[8:32, x:x + 4] = 20
+    return img
+
+
+def test_near_identical_crop_hits():
+    cache = PlateOCRCache(max_entries=4, ttl=60)
+    cache.store(1, 2, _plate(), {"text": "123"}, b"jpg")
+    noisy = np.clip(_plate().astype(int) + 3, 0, 255).astype(np.uint8)
+
+    hit = cache.lookup(1, 2, noisy)
+    assert hit is not None
+    assert hit.result == {"text": "123"}
+    assert hit.image_bytes == b"jpg"
+    assert cache.stats()["saved_ocr_calls"] == 1
+
+
+def test_other_spot_or_plate_misses():
+    cache = PlateOCRCache(max_entries=4, ttl=60)
+    cache.store(1, 2, _plate(), {"text": "123"}, b"jpg")
+
+    assert cache.lookup(1, 3, _plate()) is None
+    assert cache.lookup(1, 2, _plate(seed=5)) is None
+    assert cache.stats()["hit_rate"] == 0.0
+
+
+def test_ttl_expiry_and_lru_eviction():
+    cache = PlateOCRCache(max_entries=2, ttl=10)
+    with patch("ocr_cache.time.monotonic", return_value=100.0):
+        cache.store(1, 1, _plate(), {"text": "A"}, b"")
+        cache.store(1, 2, _plate(), {"text": "B"}, b"")
+        cache.store(1, 3, _plate(), {"text": "C"}, b"")
+        assert cache.lookup(1, 1, _plate()) is None
+        assert cache.stats()["evictions"] == 1
+
+    with patch("ocr_cache.time.monotonic", return_value=111.0):
+        assert cache.lookup(1, 3, _plate()) is None
+    assert cache.stats()["expired"] == 2
@@ -0,0 +1,80 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from ocr_client import OCRClient
+
+
+def _response(text):
+    r = MagicMock()
+    r.text = text
+    r.raise_for_status.return_value = None
+    return r
+
+
+def test_hedges_slow_request_to_second_endpoint():
+    client = OCRClient(["http://slow", "http://fast"], min_samples=5)
+    for _ in range(10):
+        client._latency.add(0.01)
+    client._endpoint_latency["http://slow"].add(0.001)
+    client._endpoint_latency["http://fast"].add(0.002)
+
+    def fake_post(url, json, timeout):
+        if url == "http://slow":
+            time.sleep(0.5)
+            return _response("slow")
+        return _response("fast")
+
+    with patch("ocr_client.requests.post", side_effect=fake_post):
+        assert client.request({"base64": "x"}) == "fast"
+
+    stats = client.stats()
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["hedge_rate"] == 1.0
+
+
+def test_single_endpoint_is_not_hedged():
+    client = OCRClient(["http://only"], min_samples=5)
+    for _ in range(10):
+        client._latency.add(0.01)
+
+    def fake_post(url, json, timeout):
+        time.sleep(0.2)
+        return _response("ok")
+
+    with patch("ocr_client.requests.post", side_effect=fake_post) as post:
+        assert client.request({"base64": "x"}) == "ok"
+    assert post.call_count == 1
+    assert client.stats()["hedged"] == 0
+
+
+def test_fails_over_to_next_endpoint():
+    client = OCRClient(["http://a", "http://b"], hedge=False)
+
+    def fake_post(url, json, timeout):
+        if url == "http://a":
+            raise ConnectionError("down")
+        return _response("ok")
+
+    with patch("ocr_client.requests.post", side_effect=fake_post):
+        assert client.request({}) == "ok"
+        # The failing endpoint is now ranked last.
+        assert client.ranked_urls() == ["http://b", "http://a"]
+
+
+def test_raises_after_all_attempts_fail():
+    client = OCRClient(["http://a"], hedge=False, max_attempts=2)
+    with patch("ocr_client.requests.post", side_effect=ConnectionError("down")):
+        with pytest.raises(ConnectionError):
+            client.request({})
+    assert client.stats()["failures"] == 1
+
+
+def test_adaptive_timeout_follows_p99():
+    client = OCRClient(["http://a"], min_samples=3, min_timeout=0.5, max_timeout=10.0)
+    assert client.timeout() == 10.0
+    for _ in range(5):
+        client._latency.add(0.4)
+    assert client.timeout() == pytest.approx(1.2)
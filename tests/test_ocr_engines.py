@@ -0,0 +1,72 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from ocr_engines import LocalCRNNEngine, OCRPolicy
+
+
+def _local(result=None, exc=None):
+    local = MagicMock()
+    local.available = True
+    if exc is not None:
+        local.read.side_effect = exc
+    else:
+        local.read.return_value = result
+    return local
+
+
+PLATE = np.zeros((10, 30, 3), np.uint8)
+
+
+def test_local_then_cloud_escalates_on_low_confidence():
+    policy = OCRPolicy("local_then_cloud", _local({"text": "1", "confidance": 9}), min_confidence=7)
+    cloud = MagicMock(return_value={"text": "2", "confidance": 8})
+    assert policy.read(cloud, PLATE)["engine"] == "local"
+    cloud.assert_not_called()
+
+    policy.local = _local({"text": "1", "confidance": 3})
+    result = policy.read(cloud, PLATE)
+    assert result["text"] == "2" and result["engine"] == "cloud"
+    assert policy.stats()["escalations"] == 1
+
+
+def test_first_engine_failure_falls_back():
+    policy = OCRPolicy("local_first", _local(exc=RuntimeError("boom")))
+    cloud = MagicMock(return_value={"text": "2", "confidance": 8})
+    assert policy.read(cloud, PLATE)["text"] == "2"
+    assert policy.stats()["engines"]["local"]["errors"] == 1
+
+    policy = OCRPolicy("cloud_first", _local({"text": "1", "confidance": 6}))
+    cloud = MagicMock(side_effect=RuntimeError("down"))
+    assert policy.read(cloud, PLATE)["engine"] == "local"
+
+
+def test_plate_array_built_only_for_local_engine():
+    build = MagicMock(return_value=PLATE)
+    cloud = MagicMock(return_value={"text": "2", "confidance": 8})
+    assert OCRPolicy("cloud", _local({"text": "1"})).read(cloud, build)["engine"] == "cloud"
+    build.assert_not_called()
+
+    local = _local({"text": "1", "confidance": 9})
+    assert OCRPolicy("local_first", local).read(cloud, build)["engine"] == "local"
+    local.read.assert_called_once_with(PLATE)
+
+
+def test_cloud_only_without_local_engine():
+    policy = OCRPolicy("local_first", None)
+    cloud = MagicMock(side_effect=RuntimeError("down"))
+    assert policy.effective_policy() == "cloud"
+    with pytest.raises(RuntimeError):
+        policy.read(cloud, PLATE)
+
+
+def test_crnn_greedy_decode():
+    engine = LocalCRNNEngine("", charset="AB12-")
+    # blank, A, A, blank, -, 1, 1, 2
+    idx = [0, 1, 1, 0, 5, 3, 3, 4]
+    scores = np.full((len(idx), 6), 0.02)
+    scores[np.arange(len(idx)), idx] = 0.9
+    text, prob = engine.decode(scores)
+    assert text == "A-12"
+    assert prob == pytest.approx(0.9)
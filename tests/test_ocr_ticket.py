@@ -3,14 +3,17 @@ import json
 from datetime import datetime
 from unittest.mock import patch
 
+import numpy as np
 import pytest
 
 TEST_DB = "sqlite:///./test.db"
 os.environ["DATABASE_URL"] = TEST_DB
 
 from db import Base, engine, SessionLocal
-from models import Location, Zone, Pole, Camera, Ticket
-from ocr_processor import process_plate_and_issue_ticket
+from models import Location, Zone, Pole, Camera, Spot, Ticket
+from ocr_processor import process_plate_and_issue_ticket, _ocr_plate
+from ocr_cache import OCR_CACHE
+from camera_clip import prefetch_stats
 
 # Setup database
 Base.metadata.drop_all(bind=engine)
@@ -30,8 +33,18 @@ cam = Camera(pole_id=pole.id, api_code="C1", p_ip="1")
 session.add(cam)
 session.commit()
 camera_id = cam.id
+session.add(Spot(camera_id=camera_id, spot_number=1, bbox_x1=0, bbox_y1=0, bbox_x2=10, bbox_y2=10))
+session.commit()
 session.close()
 
+
+@pytest.fixture(autouse=True)
+def clear_ocr_cache():
+    OCR_CACHE.clear()
+    yield
+    OCR_CACHE.clear()
+
+
 def test_process_plate_with_json_ticket(tmp_path):
     snapshot = tmp_path / "snapshot_test.jpg"
     from PIL import Image
@@ -54,7 +67,7 @@ def test_process_plate_with_json_ticket(tmp_path):
     class DummyModel:
         def __call__(self, arr):
             class Box:
-                xyxy = [[0, 0, 5, 5]]
+                xyxy = np.array([[0, 0, 5, 5]])
                 def __bool__(self):
                     return True
             class Res:
@@ -65,9 +78,10 @@ def test_process_plate_with_json_ticket(tmp_path):
     ocr_resp = json.dumps({"confidance": 10, "text": "ABC", "category": "1", "cityName": "AE-DU"})
     ocr_wrapped = json.dumps(ocr_resp)
 
+    wasted_before = prefetch_stats()["wasted"]
     with patch("ocr_processor.plate_model", DummyModel()), \
-         patch("ocr_processor.is_same_image", return_value=False), \
-         patch("ocr_processor.send_request_with_retry", return_value=ocr_wrapped), \
+         patch("ocr_processor.send_ocr_request", return_value=ocr_wrapped), \
+         patch("ocr_processor.fetch_camera_frame", return_value=b"frame"), \
          patch("image_enhancer.enhance_image_array", side_effect=lambda x: x), \
          patch("api_client.park_in_request", return_value={"trip_id": 1}) as mock_park:
         process_plate_and_issue_ticket(
@@ -89,6 +103,8 @@ def test_process_plate_with_json_ticket(tmp_path):
     session.close()
     assert ticket is not None
     assert mock_park.call_args.kwargs["images"] == [ticket.image_base64]
+    # The speculative frame grab is abandoned once the first read succeeds.
+    assert prefetch_stats()["wasted"] == wasted_before + 1
 
 
 def test_process_plate_retry_frame(tmp_path):
@@ -113,7 +129,7 @@ def test_process_plate_retry_frame(tmp_path):
     class DummyModel:
         def __call__(self, arr):
             class Box:
-                xyxy = [[0, 0, 5, 5]]
+                xyxy = np.array([[0, 0, 5, 5]])
 
                 def __bool__(self):
                     return True
@@ -127,9 +143,9 @@ def test_process_plate_retry_frame(tmp_path):
     unread = json.dumps({"confidance": 0})
     read = json.dumps(json.dumps({"confidance": 10, "text": "XYZ", "category": "1", "cityName": "AE-DU"}))
 
+    hits_before = prefetch_stats()["hits"]
     with patch("ocr_processor.plate_model", DummyModel()), \
-         patch("ocr_processor.is_same_image", return_value=False), \
-         patch("ocr_processor.send_request_with_retry", side_effect=[unread, read]), \
+         patch("ocr_processor.send_ocr_request", side_effect=[unread, read]), \
          patch("ocr_processor.fetch_camera_frame", return_value=snapshot.read_bytes()), \
          patch("image_enhancer.enhance_image_array", side_effect=lambda x: x), \
          patch("api_client.park_in_request", return_value={"trip_id": 2}):
@@ -148,6 +164,105 @@ def test_process_plate_retry_frame(tmp_path):
         )
 
     session = SessionLocal()
-    ticket = session.query(Ticket).first()
+    ticket = session.query(Ticket).order_by(Ticket.id.desc()).first()
     session.close()
     assert ticket.plate_number == "XYZ"
+    assert prefetch_stats()["hits"] == hits_before + 1
+
+
+class BatchModel:
+    """Plate detector stub that returns one result per input crop."""
+
+    def __call__(self, arrs):
+        class Box:
+            xyxy = np.array([[0, 0, 8, 8]])
+
+            def __bool__(self):
+                return True
+
+        class Res:
+            boxes = Box()
+
+        if not isinstance(arrs, list):
+            arrs = [arrs]
+        return [Res() for _ in arrs]
+
+
+def _burst():
+    flat = np.full((20, 20, 3), 120, dtype=np.uint8)
+    soft = flat.copy()
+    soft[2:6, 2:6] = 140
+    sharp = flat.copy()
+    sharp[::2, :] = 0
+    sharp[1::2, :] = 255
+    return [flat, sharp, soft]
+
+
+def test_select_best_frame_prefers_sharpest_plate():
+    from ocr_processor import _select_best_frame
+    import cv2
+
+    frames = _burst()
+    with patch("ocr_processor.plate_model", BatchModel()):
+        frame_bytes, box = _select_best_frame(frames, (0, 0, 10, 10))
+
+    assert box == (0, 0, 8, 8)
+    chosen = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert chosen[0:8, 0:8].std() > 50
+
+
+def test_process_plate_best_frame_single_ocr_call(tmp_path):
+    from PIL import Image
+    Image.new("RGB", (20, 20)).save(tmp_path / "snapshot_test.jpg")
+
+    payload = {
+        "parking_area": 1,
+        "time": "2025-01-01T00:00:00",
+        "car_id": 1,
+    }
+    unread = json.dumps({"confidance": 0})
+    read = json.dumps(json.dumps({"confidance": 10, "text": "BEST", "category": "1", "cityName": "AE-DU"}))
+
+    with patch("ocr_processor.plate_model", BatchModel()), \
+         patch("ocr_processor.OCR_FALLBACK_MODE", "best_frame"), \
+         patch("ocr_processor.send_ocr_request", side_effect=[unread, read]) as mock_ocr, \
+         patch("ocr_processor.fetch_camera_burst", return_value=_burst()), \
+         patch("api_client.park_in_request", return_value={"trip_id": 3}):
+        process_plate_and_issue_ticket(
+            payload=payload,
+            park_folder=str(tmp_path),
+            ts="test",
+            camera_id=camera_id,
+            pole_id=1,
+            api_pole_id=2,
+            spot_number=1,
+            camera_ip="ip",
+            camera_user="user",
+            camera_pass="pass",
+            parkonic_api_token="token",
+        )
+
+    assert mock_ocr.call_count == 2
+    session = SessionLocal()
+    ticket = session.query(Ticket).order_by(Ticket.id.desc()).first()
+    session.close()
+    assert ticket.plate_number == "BEST"
+
+
+def test_fallback_prefetch_starts_only_on_ocr_cache_miss(tmp_path):
+    from PIL import Image
+    from unittest.mock import MagicMock
+
+    crop = Image.new("RGB", (40, 12), (250, 250, 250))
+    OCR_CACHE.store(camera_id, 1, np.array(crop), {"confidance": 10, "text": "C"}, b"jpg")
+    read = json.dumps(json.dumps({"confidance": 10, "text": "N", "category": "1", "cityName": "AE-DU"}))
+    on_miss = MagicMock()
+
+    with patch("ocr_processor.send_ocr_request", return_value=read) as mock_ocr:
+        hit = _ocr_plate(crop, str(tmp_path / "a.jpg"), 1, camera_id, 1, on_miss=on_miss)
+        assert (hit["text"], hit["engine"]) == ("C", "cache")
+        assert not on_miss.called
+        miss = _ocr_plate(crop, str(tmp_path / "b.jpg"), 1, camera_id, 2, on_miss=on_miss)
+        assert (miss["text"], miss["engine"]) == ("N", "cloud")
+    assert on_miss.call_count == 1
+    assert mock_ocr.call_count == 1
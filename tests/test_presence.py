@@ -0,0 +1,78 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+from ocr_processor import vehicle_present, detector_stats
+
+
+class ClassifierModel:
+    def __init__(self, label, conf=0.9):
+        self.label = label
+        self.conf = conf
+        self.calls = []
+
+    def __call__(self, arr, imgsz=None):
+        self.calls.append(imgsz)
+        probs = SimpleNamespace(top1=1, top1conf=self.conf)
+        return [SimpleNamespace(probs=probs, names={0: "empty", 1: self.label}, boxes=None)]
+
+
+class DetectorModel:
+    def __init__(self, found):
+        self.found = found
+        self.calls = []
+
+    def __call__(self, arr, imgsz=None):
+        self.calls.append(imgsz)
+        boxes = SimpleNamespace(conf=np.array([0.8])) if self.found else []
+        return [SimpleNamespace(probs=None, boxes=boxes)]
+
+
+def test_classifier_presence_model():
+    arr = np.zeros((20, 20, 3), np.uint8)
+    with patch("ocr_processor.presence_model", ClassifierModel("car")):
+        assert vehicle_present(arr)
+    with patch("ocr_processor.presence_model", ClassifierModel("vacant")):
+        assert not vehicle_present(arr)
+    with patch("ocr_processor.presence_model", ClassifierModel("car", conf=0.1)):
+        assert not vehicle_present(arr)
+
+
+def test_without_presence_model_uses_plate_detector_as_before():
+    plate = DetectorModel(found=True)
+    weak = SimpleNamespace(conf=np.array([0.05]))
+    plate_weak = lambda arr, imgsz=None: plate(arr, imgsz) and [SimpleNamespace(probs=None, boxes=weak)]
+    arr = np.zeros((20, 20, 3), np.uint8)
+    with patch("ocr_processor.presence_model", None), \
+         patch("ocr_processor.PRESENCE_IMGSZ", 0), \
+         patch("ocr_processor.plate_model", plate_weak):
+        assert vehicle_present(arr)
+        assert vehicle_present(arr, imgsz=1280)
+    assert plate.calls == [None, 1280]
+
+
+def test_presence_imgsz_opts_in_to_reduced_plate_model():
+    plate = DetectorModel(found=True)
+    with patch("ocr_processor.presence_model", None), \
+         patch("ocr_processor.PRESENCE_IMGSZ", 320), \
+         patch("ocr_processor.plate_model", plate):
+        assert vehicle_present(np.zeros((20, 20, 3), np.uint8), imgsz=1280)
+    assert plate.calls == [320]
+
+
+def test_shadow_checks_record_agreement():
+    presence = DetectorModel(found=True)
+    plate = DetectorModel(found=False)
+    before = detector_stats()["presence"]["shadow"]
+    with patch("ocr_processor.presence_model", presence), \
+         patch("ocr_processor.plate_model", plate), \
+         patch("ocr_processor.PRESENCE_SHADOW_RATE", 1.0):
+        assert vehicle_present(np.zeros((20, 20, 3), np.uint8))
+    shadow = detector_stats()["presence"]["shadow"]
+    assert shadow["checks"] == before["checks"] + 1
+    assert shadow["presence_only"] == before["presence_only"] + 1
+    assert plate.calls == [None]
@@ -0,0 +1,110 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+import utils
+from spot_features import ComparisonCascade, SpotFeatureCache, SpotFeatures
+
+
+def _texture(seed, size=200):
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 256, (size, size), dtype=np.uint8)
+    return cv2.GaussianBlur(img, (5, 5), 0)
+
+
+def _save(tmp_path, name, arr):
+    path = tmp_path / name
+    Image.fromarray(arr).save(path)
+    return str(path)
+
+
+def test_check_then_put_persists_reference(tmp_path):
+    cache_dir = tmp_path / "spot_last"
+    first = _save(tmp_path, "a.png", _texture(1))
+    again = _save(tmp_path, "b.png", _texture(1))
+
+    with patch("spot_index.SPOT_INDEX.get", return_value=None):
+        cache = SpotFeatureCache(str(cache_dir), max_entries=4)
+        same, features = cache.check(1, 2, first)
+        assert not same
+        cache.put(1, 2, features)
+        # The reference keeps compact descriptors for every cascade stage, not pixels.
+        assert features.gray is None
+        assert features.extracted["sift"][1].dtype == np.uint8
+        assert set(features.extracted) == {"orb", "sift"}
+        assert os.path.isfile(cache_dir / "spot_1_2.npz")
+
+        # A fresh cache (e.g. after a restart) reads the reference from disk.
+        restarted = SpotFeatureCache(str(cache_dir), max_entries=4)
+        same, _ = restarted.check(1, 2, again)
+
+    assert same
+    stats = restarted.stats()
+    assert stats["disk_loads"] == 1
+    assert stats["same"] == 1
+    assert stats["latency"]["count"] == 1
+    assert cache.stats()["no_reference"] == 1
+
+
+def test_cascade_stops_at_first_confident_stage():
+    cascade = ComparisonCascade()
+    same = SpotFeatures.from_gray(_texture(1))
+    with patch("spot_features.orb_match") as orb, patch("spot_features.match_features") as sift:
+        assert cascade.compare(same, SpotFeatures.from_gray(_texture(1)))
+        assert not cascade.compare(same, SpotFeatures.from_gray(_texture(2)))
+    orb.assert_not_called()
+    sift.assert_not_called()
+    stats = cascade.stats()
+    assert stats["hash"]["same"] == 1
+    assert stats["hash"]["different"] == 1
+    assert stats["hash"]["latency"]["count"] == 2
+
+
+def test_orb_decides_before_sift():
+    rng = np.random.default_rng(9)
+    base = _texture(1)
+    noisy = np.clip(base.astype(int) + rng.integers(-20, 20, base.shape), 0, 255).astype(np.uint8)
+    cascade = ComparisonCascade(("orb", "sift"))
+    with patch("spot_features.match_features", wraps=utils.match_features) as sift:
+        assert cascade.compare(SpotFeatures.from_gray(base), SpotFeatures.from_gray(noisy))
+        sift.assert_not_called()
+        # No ORB matches at all between unrelated images: SIFT has the last word.
+        assert not cascade.compare(SpotFeatures.from_gray(base), SpotFeatures.from_gray(_texture(2)))
+        sift.assert_called_once()
+    stats = cascade.stats()
+    assert stats["orb"]["same"] == 1
+    assert stats["orb"]["passed"] == 1
+    assert stats["sift"]["different"] == 1
+
+
+def test_moved_spot_invalidates_reference(tmp_path):
+    path = _save(tmp_path, "a.png", _texture(3, size=300))
+    cache = SpotFeatureCache(str(tmp_path), max_entries=4)
+    with patch("spot_index.SPOT_INDEX.get", return_value=SimpleNamespace(
+        bbox=(0, 0, 150, 150), clamped_slices=lambda h, w: (slice(0, 150), slice(0, 150))
+    )):
+        _, features = cache.check(1, 1, path)
+        cache.put(1, 1, features)
+    with patch("spot_index.SPOT_INDEX.get", return_value=SimpleNamespace(
+        bbox=(10, 0, 160, 150), clamped_slices=lambda h, w: (slice(0, 150), slice(10, 160))
+    )):
+        same, _ = cache.check(1, 1, path)
+    assert not same
+    assert cache.stats()["stale"] == 1
+
+
+def test_memory_is_bounded(tmp_path):
+    cache = SpotFeatureCache(str(tmp_path), max_entries=2)
+    features = SpotFeatures.from_gray(_texture(4, size=64))
+    for spot in range(3):
+        cache.put(1, spot, features)
+    assert cache.stats()["entries"] == 2
+    # The evicted spot is still available from disk.
+    assert cache.get(1, 0) is not None
+    assert cache.stats()["disk_loads"] == 1
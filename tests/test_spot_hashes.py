@@ -0,0 +1,86 @@
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+from spot_index import SpotGeometry
+from spot_hashes import SpotHashTable, hamming, pack_bits, popcount
+from utils import _avg_hash, _hash_diff
+
+
+def _crop(seed, size=60):
+    return np.random.default_rng(seed).integers(0, 256, (size, size), dtype=np.uint8)
+
+
+def test_packed_distance_matches_hash_diff():
+    h1, h2 = _avg_hash(_crop(1)), _avg_hash(_crop(2))
+    assert int(hamming(pack_bits(h1.ravel()), pack_bits(h2.ravel()))) == _hash_diff(h1, h2)
+    assert popcount(np.array([[0, 2**64 - 1]], dtype=np.uint64)).tolist() == [64]
+
+
+def test_table_hashes_match_avg_hash():
+    table = SpotHashTable(64)
+    crops = [_crop(1), _crop(2)]
+    packed = table.hash_crops(crops)
+    assert packed.shape == (2, 1)
+    for crop, row in zip(crops, packed):
+        assert (row == pack_bits(_avg_hash(crop).ravel())).all()
+
+
+@pytest.mark.parametrize("bits", [64, 256])
+def test_batch_change_detection(bits):
+    table = SpotHashTable(bits)
+    keys = [(1, n) for n in range(100)]
+    crops = [_crop(n) for n in range(100)]
+    table.update(keys, table.hash_crops(crops))
+
+    crops[7] = _crop(1000)
+    changed = table.changed(keys + [(2, 1)], table.hash_crops(crops + [_crop(0)]), max_distance=2)
+    assert np.flatnonzero(changed).tolist() == [7, 100]
+    stats = table.stats()
+    assert stats["spots"] == 100
+    assert stats["unknown"] == 1
+
+    table.forget(1)
+    assert table.distances(keys[:1], table.hash_crops(crops[:1])).tolist() == [-1]
+
+
+def test_rejects_non_square_sizes():
+    with pytest.raises(ValueError):
+        SpotHashTable(128)
+
+
+def test_unchanged_event_skips_models_on_default_path(tmp_path):
+    import ocr_processor
+
+    Image.fromarray(_crop(3, size=40)).save(tmp_path / "snapshot_a.jpg")
+    Image.open(tmp_path / "snapshot_a.jpg").save(tmp_path / "snapshot_b.jpg")
+    Image.fromarray(_crop(4, size=40)).save(tmp_path / "snapshot_c.jpg")
+    spot = SpotGeometry(id=1, camera_id=9, spot_number=1, bbox=(0, 0, 30, 30))
+    args = dict(
+        payload={"parking_area": 1},
+        park_folder=str(tmp_path),
+        camera_id=9,
+        pole_id=1,
+        api_pole_id=None,
+        spot_number=1,
+        camera_ip="ip",
+        camera_user="u",
+        camera_pass="p",
+        parkonic_api_token="t",
+    )
+    table = SpotHashTable(64)
+    with patch.object(ocr_processor, "EVENT_HASHES", table), \
+         patch.object(ocr_processor, "FRAME_CHANGE_GATE", True), \
+         patch.object(ocr_processor, "CAMERA_FRAME_ANALYSIS", False), \
+         patch("ocr_processor.SPOT_INDEX.get", return_value=spot), \
+         patch("ocr_processor.shutil.copy"), \
+         patch("ocr_processor._locate_plate", side_effect=RuntimeError("stop")) as locate:
+        for ts in ("a", "b", "c"):
+            ocr_processor.process_plate_and_issue_ticket(ts=ts, **args)
+    assert locate.call_count == 2
+    assert table.stats()["unchanged"] == 1
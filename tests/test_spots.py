@@ -132,3 +132,93 @@ def test_get_spot_and_not_found(client, sample_camera):
     resp = client.get("/spots/999")
     assert resp.status_code == 404
 
+
+def test_update_and_delete_spot_refresh_index(client):
+    from spot_index import SPOT_INDEX
+
+    session = SessionLocal()
+    loc = Location(name="Loc3", code="L3", portal_name="u", portal_password="p", ip_schema="ip")
+    session.add(loc)
+    session.commit()
+    zone = Zone(code="Z3", location_id=loc.id)
+    session.add(zone)
+    session.commit()
+    pole = Pole(zone_id=zone.id, code="P3", location_id=loc.id)
+    session.add(pole)
+    session.commit()
+    cam = Camera(pole_id=pole.id, api_code="C3", p_ip="ip")
+    session.add(cam)
+    session.commit()
+    sample_camera = cam.id
+    session.close()
+
+    resp = client.post(
+        "/spots",
+        json={
+            "camera_id": sample_camera,
+            "spot_number": 3,
+            "bbox_x1": 0,
+            "bbox_y1": 0,
+            "bbox_x2": 20,
+            "bbox_y2": 10,
+        },
+    )
+    spot_id = resp.json()["id"]
+    geom = SPOT_INDEX.get(sample_camera, 3)
+    assert geom.bbox == (0, 0, 20, 10)
+    assert geom.slices == (slice(0, 10), slice(0, 20))
+
+    resp = client.put(f"/spots/{spot_id}", json={"bbox_x2": 40})
+    assert resp.status_code == 200
+    assert resp.json()["bbox_x2"] == 40
+    assert SPOT_INDEX.get(sample_camera, 3).bbox == (0, 0, 40, 10)
+
+    resp = client.delete(f"/spots/{spot_id}")
+    assert resp.status_code == 200
+    assert SPOT_INDEX.get(sample_camera, 3) is None
+
+    assert client.put("/spots/999", json={"bbox_x2": 1}).status_code == 404
+    assert client.delete("/spots/999").status_code == 404
+
+
+def test_moving_spot_between_cameras_refreshes_both(client):
+    from spot_index import SPOT_INDEX
+
+    session = SessionLocal()
+    loc = Location(name="Loc4", code="L4", portal_name="u", portal_password="p", ip_schema="ip")
+    session.add(loc)
+    session.commit()
+    zone = Zone(code="Z4", location_id=loc.id)
+    session.add(zone)
+    session.commit()
+    pole = Pole(zone_id=zone.id, code="P4", location_id=loc.id)
+    session.add(pole)
+    session.commit()
+    cam_a = Camera(pole_id=pole.id, api_code="C4A", p_ip="ip")
+    cam_b = Camera(pole_id=pole.id, api_code="C4B", p_ip="ip")
+    session.add_all([cam_a, cam_b])
+    session.commit()
+    cam_a, cam_b = cam_a.id, cam_b.id
+    session.close()
+
+    resp = client.post(
+        "/spots",
+        json={
+            "camera_id": cam_a,
+            "spot_number": 5,
+            "bbox_x1": 0,
+            "bbox_y1": 0,
+            "bbox_x2": 20,
+            "bbox_y2": 10,
+        },
+    )
+    spot_id = resp.json()["id"]
+    assert SPOT_INDEX.get(cam_a, 5) is not None
+    assert SPOT_INDEX.get(cam_b, 5) is None
+
+    resp = client.put(f"/spots/{spot_id}", json={"camera_id": cam_b})
+    assert resp.status_code == 200
+    assert SPOT_INDEX.get(cam_a, 5) is None
+    assert SPOT_INDEX.get(cam_b, 5).bbox == (0, 0, 20, 10)
+
+    assert client.put(f"/spots/{spot_id}", json={"camera_id": 999}).status_code == 404
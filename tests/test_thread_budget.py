@@ -0,0 +1,22 @@
+from thread_budget import compute_layout, parse_core_list
+
+
+def test_parse_core_list():
+    assert parse_core_list("0-2, 5") == {0, 1, 2, 5}
+    assert parse_core_list("") == set()
+
+
+def test_compute_layout_splits_budget():
+    layout = compute_layout(cores=8, inference_workers=2, io_workers=4)
+    assert layout["budget"] == 8
+    assert layout["torch_threads"] == 4
+    assert layout["ort_intra_op_threads"] == 4
+    assert layout["opencv_threads"] == 1
+
+    capped = compute_layout(cores=8, inference_workers=1, io_workers=1, budget=2)
+    assert capped["budget"] == 2
+    assert capped["torch_threads"] == 2
+    assert capped["opencv_threads"] == 1
+
+    small = compute_layout(cores=1, inference_workers=3, io_workers=4)
+    assert small["torch_threads"] == 1
@@ -0,0 +1,38 @@
+import numpy as np
+
+from tune_imgsz import tune_detector_imgsz
+from utils import resolve_detector_imgsz
+
+
+class SizeSensitiveModel:
+    """Detects the 'small' crop only from imgsz 320 upwards."""
+
+    def __call__(self, crop, imgsz):
+        class Res:
+            def __init__(self, found):
+                self.boxes = [1] if found else []
+
+        small = crop.shape[0] < 50
+        return [Res(imgsz >= 320 or not small)]
+
+
+def test_recommends_smallest_size_keeping_recall():
+    crops = [np.zeros((40, 40, 3), np.uint8), np.zeros((100, 100, 3), np.uint8)]
+    report = tune_detector_imgsz(SizeSensitiveModel(), crops, [256, 320, 640], min_recall=1.0)
+
+    assert report["positives"] == 2
+    recalls = {row["imgsz"]: row["recall"] for row in report["sizes"]}
+    assert recalls == {256: 0.5, 320: 1.0, 640: 1.0}
+    assert report["recommended"]["imgsz"] == 320
+    assert report["recommended"]["mean_ms"] is not None
+
+
+def test_resolve_detector_imgsz_prefers_most_specific():
+    params = {
+        "detector_imgsz": 640,
+        "detector_imgsz_overrides": {"7": 320, "7:2": 250},
+    }
+    assert resolve_detector_imgsz(params, 7, 2) == 256
+    assert resolve_detector_imgsz(params, 7, 1) == 320
+    assert resolve_detector_imgsz('{"detector_imgsz": 480}', 3, 1) == 480
+    assert resolve_detector_imgsz(None, 3, 1) is None
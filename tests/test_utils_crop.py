@@ -7,7 +7,7 @@ os.environ["DATABASE_URL"] = TEST_DB
 
 from db import Base, engine, SessionLocal
 from models import Location, Zone, Pole, Camera, Spot
-from utils import is_same_image
+from utils import is_same_image, load_spot_gray
 
 Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
@@ -27,6 +27,7 @@ session.add(cam)
 session.commit()
 spot = Spot(camera_id=cam.id, spot_number=1, bbox_x1=10, bbox_y1=10, bbox_x2=20, bbox_y2=20)
 session.add(spot)
+session.add(Spot(camera_id=cam.id, spot_number=2, bbox_x1=1200, bbox_y1=100, bbox_x2=1400, bbox_y2=300))
 session.commit()
 cam_id = cam.id
 session.close()
@@ -46,6 +47,18 @@ def test_is_same_image_crops(tmp_path):
     assert is_same_image(str(p1), str(p2), camera_id=cam_id, spot_number=1)
 
 
+def test_load_spot_gray_crops_before_resizing(tmp_path):
+    frame = np.zeros((400, 1600), dtype=np.uint8)
+    frame[100:300, 1200:1400] = 255
+    path = tmp_path / "wide.png"
+    Image.fromarray(frame).save(path)
+
+    crop = load_spot_gray(str(path), camera_id=cam_id, spot_number=2)
+    assert crop.shape == (200, 200)
+    assert crop.min() == 255
+    assert load_spot_gray(str(path)).shape == (200, 800)
+
+
 def teardown_module(module):
     Base.metadata.drop_all(bind=engine)
     try:
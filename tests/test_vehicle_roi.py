@@ -0,0 +1,74 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./test.db")
+
+import ocr_processor
+from utils import vehicle_roi
+
+
+def _payload(x1, y1, x2, y2, res=(1000, 500)):
+    return {
+        "resolution_w": res[0],
+        "resolution_y": res[1],
+        "vehicle_frame_x1": x1,
+        "vehicle_frame_y1": y1,
+        "vehicle_frame_x2": x2,
+        "vehicle_frame_y2": y2,
+    }
+
+
+def test_vehicle_roi_scales_and_intersects_spot():
+    # Camera reports in 1000x500, snapshot is 2000x1000.
+    roi = vehicle_roi(_payload(150, 100, 300, 250), (200, 100, 800, 700), (2000, 1000), margin=0)
+    assert roi == (100, 100, 400, 400)
+
+
+def test_vehicle_roi_rejects_implausible_boxes():
+    spot = (0, 0, 400, 400)
+    assert vehicle_roi(_payload(0, 0, 0, 0), spot, (1000, 500)) is None
+    assert vehicle_roi(_payload(50, 50, 2000, 100), spot, (1000, 500)) is None
+    assert vehicle_roi(_payload(600, 300, 900, 480), spot, (1000, 500)) is None
+    assert vehicle_roi(_payload(10, 10, 20, 20), spot, (1000, 500)) is None
+    assert vehicle_roi({}, spot, (1000, 500)) is None
+
+
+class RecordingModel:
+    def __init__(self, boxes_by_shape):
+        self.boxes_by_shape = boxes_by_shape
+        self.shapes = []
+
+    def __call__(self, arr, imgsz=None):
+        self.shapes.append(arr.shape[:2])
+        box = self.boxes_by_shape.get(arr.shape[:2])
+        boxes = SimpleNamespace(xyxy=np.array([box])) if box else []
+        return [SimpleNamespace(boxes=boxes)]
+
+
+def test_locate_plate_uses_roi_and_falls_back():
+    crop = Image.new("RGB", (200, 100))
+    roi = (50, 20, 150, 80)
+    model = RecordingModel({(60, 100): (10, 10, 40, 20), (100, 200): (5, 5, 15, 15)})
+    with patch("ocr_processor.VEHICLE_ROI_ENABLED", True), \
+         patch("ocr_processor.plate_model", model):
+        box = ocr_processor._locate_plate(crop, roi, camera_id=901)
+        assert box == (60, 30, 90, 40)
+        assert model.shapes == [(60, 100)]
+
+        # Nothing in the ROI → whole spot crop
+        model.boxes_by_shape.pop((60, 100))
+        assert ocr_processor._locate_plate(crop, roi, camera_id=901) == (5, 5, 15, 15)
+        assert ocr_processor._locate_plate(crop, None, camera_id=901) == (5, 5, 15, 15)
+
+        stats = ocr_processor.roi_stats()["cameras"]["901"]
+    assert stats["roi_used"] == 2
+    assert stats["roi_fallbacks"] == 1
+    assert stats["roi_unavailable"] == 1
+    assert stats["full_detections"] == 2
+    assert stats["detection_rate"] == 1.0
+    assert stats["full_pixels"] == 3 * 20000
+    assert stats["processed_pixels"] == 2 * 6000 + 2 * 20000
@@ -0,0 +1,119 @@
+"""Share the CPU cores between torch, OpenCV and ONNX Runtime.
+
+Each library sizes its own thread pool to the machine by default, and the
+models run from the POST worker while OpenCV also runs in the executor and
+endpoint threads, so the pools oversubscribe the cores.  The budget splits
+the available cores between the threads that run inference (intra-op threads
+per model call) and the threads that only decode/resize images.
+"""
+
+import os
+
+import cv2
+import torch
+
+from config import CPU_THREAD_BUDGET, INFERENCE_WORKERS, CPU_PIN_CORES
+from logger import logger
+
+try:
+    import onnxruntime as ort
+except Exception:  # pragma: no cover - optional dep
+    ort = None  # type: ignore
+
+
+_layout: dict = {}
+
+
+def parse_core_list(spec: str) -> set[int]:
+    """Parse ``"0-3,6"`` style core lists."""
+    cores: set[int] = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cores.update(range(int(lo), int(hi) + 1))
+        else:
+            cores.add(int(part))
+    return cores
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not Linux
+        return os.cpu_count() or 1
+
+
+def compute_layout(cores: int, inference_workers: int, io_workers: int, budget: int = 0) -> dict:
+    """Return the thread counts for a budget of ``budget`` cores (0 = all)."""
+    budget = min(budget, cores) if budget > 0 else cores
+    inference_workers = max(1, inference_workers)
+    intra = max(1, budget // inference_workers)
+    return {
+        "cores_available": cores,
+        "budget": budget,
+        "inference_workers": inference_workers,
+        "io_workers": io_workers,
+        "torch_threads": intra,
+        "torch_interop_threads": 1,
+        "ort_intra_op_threads": intra,
+        # OpenCV calls run concurrently in every worker thread; keep each one
+        # small so they do not compete with the model threads.
+        "opencv_threads": max(1, budget // (inference_workers + max(0, io_workers))),
+    }
+
+
+def apply_thread_budget(io_workers: int) -> dict:
+    """Pin (optionally), size the library thread pools and log the layout."""
+    global _layout
+
+    pinned = None
+    if CPU_PIN_CORES:
+        try:
+            pinned = sorted(parse_core_list(CPU_PIN_CORES))
+            os.sched_setaffinity(0, pinned)
+        except Exception:
+            logger.error("Could not pin process to cores %s", CPU_PIN_CORES, exc_info=True)
+            pinned = None
+
+    layout = compute_layout(available_cores(), INFERENCE_WORKERS, io_workers, CPU_THREAD_BUDGET)
+    layout["pinned_cores"] = pinned
+
+    # torch and OpenCV are already loaded by the model imports, so their pools
+    # are resized through the runtime calls rather than OMP_NUM_THREADS.
+    torch.set_num_threads(layout["torch_threads"])
+    try:
+        torch.set_num_interop_threads(layout["torch_interop_threads"])
+    except RuntimeError:
+        # Only allowed before the first parallel torch call.
+        layout["torch_interop_threads"] = torch.get_num_interop_threads()
+    layout["torch_threads"] = torch.get_num_threads()
+
+    cv2.setNumThreads(layout["opencv_threads"])
+    layout["opencv_threads"] = cv2.getNumThreads()
+
+    if ort is None:
+        layout["ort_intra_op_threads"] = None
+
+    _layout = layout
+    logger.info("CPU thread layout: %s", layout)
+    return layout
+
+
+def ort_session_options():
+    """Return ONNX Runtime session options sized to the budget, or ``None``."""
+    if ort is None:
+        return None
+    opts = ort.SessionOptions()
+    intra = _layout.get("ort_intra_op_threads") or compute_layout(
+        available_cores(), INFERENCE_WORKERS, 0, CPU_THREAD_BUDGET
+    )["ort_intra_op_threads"]
+    opts.intra_op_num_threads = intra
+    opts.inter_op_num_threads = 1
+    return opts
+
+
+def thread_layout() -> dict:
+    return dict(_layout)
@@ -0,0 +1,137 @@
+# tune_imgsz.py
+"""Recommend a plate detector input size for a camera or spot.
+
+Replays the spot crops stored under ``snapshots/`` through the detector at
+several input sizes.  Crops detected at the baseline size count as positives;
+recall at a size is the fraction of positives still detected.  The smallest
+size that keeps recall at or above ``--min-recall`` is recommended together
+with its latency.
+
+Example::
+
+    python tune_imgsz.py --camera 12 --spot 3 --sizes 256,320,416,512,640
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from config import YOLO_MODEL_PATH
+
+SNAPSHOTS_DIR = "snapshots"
+
+
+def find_stored_crops(camera_id: int, spot_number: int | None = None, limit: int = 200) -> list[str]:
+    """Return paths of the newest stored ``main_crop_*`` images for a camera."""
+    spot = "*" if spot_number is None else str(spot_number)
+    pattern = os.path.join(SNAPSHOTS_DIR, f"parking_cam{camera_id}_spot{spot}_*", "main_crop_*.jpg")
+    paths = sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)
+    return paths[:limit]
+
+
+def _detected(results) -> bool:
+    return bool(results and results[0].boxes)
+
+
+def tune_detector_imgsz(
+    model,
+    crops: list[np.ndarray],
+    sizes: list[int],
+    baseline: int = 640,
+    min_recall: float = 0.98,
+) -> dict:
+    """Measure recall and latency of ``model`` on ``crops`` for each size.
+
+    Returns a dict with one entry per size and the recommended size (``None``
+    when no crop is detected at the baseline size).
+    """
+    positives = [i for i, crop in enumerate(crops) if _detected(model(crop, imgsz=baseline))]
+
+    rows = []
+    for size in sorted(set(sizes)):
+        hits = 0
+        elapsed = []
+        for i, crop in enumerate(crops):
+            start = time.perf_counter()
+            results = model(crop, imgsz=size)
+            elapsed.append(time.perf_counter() - start)
+            if i in positives and _detected(results):
+                hits += 1
+        rows.append(
+            {
+                "imgsz": size,
+                "recall": round(hits / len(positives), 4) if positives else None,
+                "mean_ms": round(1000.0 * float(np.mean(elapsed)), 2) if elapsed else None,
+                "p95_ms": round(1000.0 * float(np.percentile(elapsed, 95)), 2) if elapsed else None,
+            }
+        )
+
+    recommended = None
+    if positives:
+        for row in rows:
+            if row["recall"] >= min_recall:
+                recommended = row
+                break
+
+    return {
+        "crops": len(crops),
+        "positives": len(positives),
+        "baseline": baseline,
+        "min_recall": min_recall,
+        "sizes": rows,
+        "recommended": recommended,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--camera", type=int, required=True)
+    parser.add_argument("--spot", type=int, default=None)
+    parser.add_argument("--sizes", default="192,256,320,416,512,640")
+    parser.add_argument("--baseline", type=int, default=640)
+    parser.add_argument("--min-recall", type=float, default=0.98)
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--model", default=YOLO_MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    paths = find_stored_crops(args.camera, args.spot, args.limit)
+    if not paths:
+        print(f"No stored crops found for camera {args.camera}")
+        return 1
+
+    from ultralytics import YOLO
+
+    model = YOLO(args.model)
+    crops = [np.array(Image.open(p).convert("RGB")) for p in paths]
+    # Warm up so the first size is not charged for model initialisation.
+    model(crops[0], imgsz=args.baseline, verbose=False)
+
+    def run(crop, imgsz):
+        return model(crop, imgsz=imgsz, verbose=False)
+
+    report = tune_detector_imgsz(
+        run,
+        crops,
+        [int(s) for s in args.sizes.split(",") if s.strip()],
+        baseline=args.baseline,
+        min_recall=args.min_recall,
+    )
+    print(json.dumps(report, indent=2))
+
+    best = report["recommended"]
+    if best:
+        key = str(args.camera) if args.spot is None else f"{args.camera}:{args.spot}"
+        print(
+            "\nAdd to Location.parameters:\n"
+            + json.dumps({"detector_imgsz_overrides": {key: best["imgsz"]}})
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,13 @@
 # utils.py
 
+import json
+import threading
+
 import cv2
 import numpy as np
 
+from image_decode import decode_roi, read_image
+
 
 def _avg_hash(gray: np.ndarray, hash_size: int = 8) -> np.ndarray:
     """Return average hash of image as boolean array."""
@@ -11,11 +16,308 @@ def _avg_hash(gray: np.ndarray, hash_size: int = 8) -> np.ndarray:
     return (img > avg).astype(np.uint8)
 
 
+def _dhash(gray: np.ndarray, hash_size: int = 8) -> np.ndarray:
+    """Return difference hash (horizontal gradient signs) as boolean array."""
+    img = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return (img[:, 1:] > img[:, :-1]).astype(np.uint8)
+
+
 def _hash_diff(h1: np.ndarray, h2: np.ndarray) -> int:
     """Compute Hamming distance between two binary hashes."""
     return int(np.count_nonzero(h1 != h2))
 
 
+def parse_location_params(raw) -> dict:
+    """Return ``Location.parameters`` as a dict (it may arrive as JSON text)."""
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except Exception:
+            return {}
+    return raw if isinstance(raw, dict) else {}
+
+
+def vehicle_roi(
+    payload: dict,
+    spot_box: tuple[int, int, int, int],
+    image_size: tuple[int, int],
+    margin: float = 0.1,
+    min_overlap: float = 0.3,
+    min_side: int = 32,
+) -> tuple[int, int, int, int] | None:
+    """Return the camera-reported vehicle box as a region of the spot crop.
+
+    ``vehicle_frame_*`` is given in the camera's ``resolution_w`` x
+    ``resolution_y`` space and is scaled to ``image_size``, padded by
+    ``margin`` and intersected with ``spot_box``.  The result is relative to
+    the spot crop.  ``None`` is returned when the box is missing, degenerate,
+    outside the image, mostly outside the spot or too small to search.
+    """
+    try:
+        vx1, vy1, vx2, vy2 = (
+            float(payload[f"vehicle_frame_{k}"]) for k in ("x1", "y1", "x2", "y2")
+        )
+        res_w = float(payload.get("resolution_w") or 0)
+        res_h = float(payload.get("resolution_y") or 0)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    img_w, img_h = image_size
+    sx = img_w / res_w if res_w > 0 else 1.0
+    sy = img_h / res_h if res_h > 0 else 1.0
+    vx1, vx2 = vx1 * sx, vx2 * sx
+    vy1, vy2 = vy1 * sy, vy2 * sy
+    if vx2 <= vx1 or vy2 <= vy1:
+        return None
+    if vx1 < 0 or vy1 < 0 or vx2 > img_w * 1.01 or vy2 > img_h * 1.01:
+        return None
+
+    left, top, right, bottom = spot_box
+    ix1, iy1 = max(left, vx1), max(top, vy1)
+    ix2, iy2 = min(right, vx2), min(bottom, vy2)
+    if ix2 <= ix1 or iy2 <= iy1:
+        return None
+    if (ix2 - ix1) * (iy2 - iy1) < min_overlap * (vx2 - vx1) * (vy2 - vy1):
+        return None
+
+    mx, my = margin * (ix2 - ix1), margin * (iy2 - iy1)
+    x1 = int(max(left, ix1 - mx)) - left
+    y1 = int(max(top, iy1 - my)) - top
+    x2 = int(np.ceil(min(right, ix2 + mx))) - left
+    y2 = int(np.ceil(min(bottom, iy2 + my))) - top
+    if x2 - x1 < min_side or y2 - y1 < min_side:
+        return None
+    return x1, y1, x2, y2
+
+
+def spot_param(params, key: str, camera_id: int, spot_number: int | None = None):
+    """Return a location parameter with per-camera / per-spot overrides.
+
+    ``params[key + "_overrides"]`` may map ``"<camera_id>"`` or
+    ``"<camera_id>:<spot_number>"`` to a value; the most specific entry wins,
+    then ``params[key]``.  Returns ``None`` when nothing is configured.
+    """
+    params = parse_location_params(params)
+    overrides = params.get(f"{key}_overrides") or {}
+    value = None
+    if isinstance(overrides, dict):
+        if spot_number is not None:
+            value = overrides.get(f"{camera_id}:{spot_number}")
+        if value is None:
+            value = overrides.get(str(camera_id))
+    if value is None:
+        value = params.get(key)
+    return value
+
+
+def resolve_detector_imgsz(params, camera_id: int, spot_number: int | None = None) -> int | None:
+    """Return the plate detector input size configured for a camera/spot.
+
+    ``Location.parameters`` may contain ``detector_imgsz`` (location default)
+    and ``detector_imgsz_overrides`` mapping ``"<camera_id>"`` or
+    ``"<camera_id>:<spot_number>"`` to a size.  The most specific entry wins.
+    Sizes are rounded to the detector stride of 32.  Returns ``None`` when
+    nothing is configured so the model default is used.
+    """
+    value = spot_param(params, "detector_imgsz", camera_id, spot_number)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    if value <= 0:
+        return None
+    return max(32, int(round(value / 32.0)) * 32)
+
+
+def resolve_motion_threshold(params, camera_id: int, spot_number: int | None = None) -> float | None:
+    """Return the motion gate threshold configured for a camera/spot.
+
+    Uses ``motion_threshold`` / ``motion_threshold_overrides`` from
+    ``Location.parameters`` like :func:`resolve_detector_imgsz`.  Returns
+    ``None`` (use the global default) when unset or invalid.
+    """
+    value = spot_param(params, "motion_threshold", camera_id, spot_number)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+def plate_crop_score(crop: np.ndarray) -> float:
+    """Score a plate crop for OCR by sharpness weighted by its size.
+
+    Sharpness is the variance of the Laplacian of the grayscale crop; it is
+    multiplied by the square root of the crop area so that a larger plate
+    wins over an equally sharp smaller one without size dominating.
+    """
+    if crop is None or crop.size == 0:
+        return 0.0
+    gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return float(sharpness * np.sqrt(gray.shape[0] * gray.shape[1]))
+
+
+def resize_max(img: np.ndarray, max_dim: int = 800) -> np.ndarray:
+    """Downscale ``img`` so its longest side is at most ``max_dim``."""
+    h, w = img.shape[:2]
+    if max(h, w) <= max_dim:
+        return img
+    scale = max_dim / float(max(h, w))
+    return cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def load_spot_gray(
+    img_path: str,
+    camera_id: int | None = None,
+    spot_number: int | None = None,
+    max_dim: int = 800,
+) -> np.ndarray | None:
+    """Load ``img_path`` as the grayscale image used for same-car comparison.
+
+    When the spot is known the image is cropped to its bounding box (in
+    full-resolution coordinates) first, then resized to ``max_dim``.
+    Returns ``None`` if the file cannot be read.
+    """
+    spot = None
+    if camera_id is not None and spot_number is not None:
+        from spot_index import SPOT_INDEX
+
+        spot = SPOT_INDEX.get(camera_id, spot_number)
+    if spot is not None:
+        try:
+            with open(img_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        img = decode_roi(data, spot.bbox, gray=True, op="compare")
+        if img is not None:
+            return resize_max(img, max_dim)
+    # Decoded at a reduced JPEG scale no smaller than ``max_dim``.
+    img = read_image(img_path, max_dim=max_dim, gray=True, op="compare")
+    if img is None:
+        return None
+    return resize_max(img, max_dim)
+
+
+# SIFT and FLANN objects are reused per thread instead of being rebuilt for
+# every comparison.
+_cv_local = threading.local()
+
+
+def _sift():
+    sift = getattr(_cv_local, "sift", None)
+    if sift is None:
+        sift = _cv_local.sift = cv2.SIFT_create()
+    return sift
+
+
+def _flann():
+    flann = getattr(_cv_local, "flann", None)
+    if flann is None:
+        FLANN_INDEX_KDTREE = 1
+        index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
+        search_params = dict(checks=50)
+        flann = _cv_local.flann = cv2.FlannBasedMatcher(index_params, search_params)
+    return flann
+
+
+def _orb():
+    orb = getattr(_cv_local, "orb", None)
+    if orb is None:
+        orb = _cv_local.orb = cv2.ORB_create(nfeatures=500)
+    return orb
+
+
+def _bf_hamming():
+    bf = getattr(_cv_local, "bf_hamming", None)
+    if bf is None:
+        bf = _cv_local.bf_hamming = cv2.BFMatcher(cv2.NORM_HAMMING)
+    return bf
+
+
+def _keypoints(kp) -> np.ndarray:
+    return np.float32([k.pt for k in kp]).reshape(-1, 2)
+
+
+def _inlier_ratio(pts1: np.ndarray, pts2: np.ndarray, good_matches) -> float | None:
+    """Fraction of ``good_matches`` consistent with a RANSAC homography."""
+    src_pts = np.float32([pts1[m.queryIdx] for m in good_matches]).reshape(-1, 1, 2)
+    dst_pts = np.float32([pts2[m.trainIdx] for m in good_matches]).reshape(-1, 1, 2)
+    M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+    if mask is None:
+        return None
+    return int(np.count_nonzero(mask)) / float(len(good_matches))
+
+
+def orb_features(gray: np.ndarray) -> tuple[np.ndarray, np.ndarray | None]:
+    """Return ORB keypoint coordinates ``(N, 2)`` and binary descriptors ``(N, 32)``."""
+    kp, des = _orb().detectAndCompute(gray, None)
+    return _keypoints(kp), des
+
+
+def orb_match(
+    pts1: np.ndarray,
+    des1: np.ndarray | None,
+    pts2: np.ndarray,
+    des2: np.ndarray | None,
+    ratio: float = 0.75,
+) -> tuple[int, float | None]:
+    """Match ORB features by Hamming distance.
+
+    Returns the number of matches passing the ratio test and their RANSAC
+    inlier ratio (``None`` when there are too few to fit a homography).
+    """
+    if des1 is None or des2 is None or len(des1) < 2 or len(des2) < 2:
+        return 0, None
+    matches = _bf_hamming().knnMatch(des1, des2, k=2)
+    good = [p[0] for p in matches if len(p) == 2 and p[0].distance < ratio * p[1].distance]
+    if len(good) < 4:
+        return len(good), None
+    return len(good), _inlier_ratio(pts1, pts2, good)
+
+
+def sift_features(gray: np.ndarray) -> tuple[np.ndarray, np.ndarray | None]:
+    """Return SIFT keypoint coordinates ``(N, 2)`` and descriptors ``(N, 128)``."""
+    kp, des = _sift().detectAndCompute(gray, None)
+    return _keypoints(kp), des
+
+
+def match_features(
+    pts1: np.ndarray,
+    des1: np.ndarray | None,
+    pts2: np.ndarray,
+    des2: np.ndarray | None,
+    *,
+    min_match_count: int = 50,
+    inlier_ratio_thresh: float = 0.5,
+) -> bool:
+    """SIFT ratio-test matching plus RANSAC homography on precomputed features."""
+    if des1 is None or des2 is None or len(pts1) < 10 or len(pts2) < 10:
+        # Not enough features: treat as different
+        return False
+    des1 = np.asarray(des1, dtype=np.float32)
+    des2 = np.asarray(des2, dtype=np.float32)
+
+    # KNN match (k=2) + Lowe's ratio test
+    matches = _flann().knnMatch(des1, des2, k=2)
+    good_matches = [p[0] for p in matches if len(p) == 2 and p[0].distance < 0.7 * p[1].distance]
+
+    # If too few good matches, return False
+    if len(good_matches) < min_match_count:
+        return False
+
+    # Compute homography with RANSAC on the matched keypoints
+    inlier_ratio = _inlier_ratio(pts1, pts2, good_matches)
+    if inlier_ratio is None:
+        return False
+
+    # Decide “same” if inlier ratio exceeds threshold
+    return inlier_ratio >= inlier_ratio_thresh
+
+
 def is_same_image(
     img_path1: str,
     img_path2: str,
@@ -34,7 +336,9 @@ def is_same_image(
       1) Load both images in grayscale.
       2) Resize them to a reasonable maximum size.
       3) Quickly compare using an average hash; if hashes are almost equal,
-         consider the images identical.
+         consider the images identical.  A large dHash distance, or a
+         confident ORB match, decides the pair without SIFT (see
+         ``SAME_CAR_STAGES``).
       4) Detect SIFT keypoints/descriptors.
       5) Use FLANN to find KNN matches (k=2) and apply Lowe’s ratio test.
       6) If #good_matches < min_match_count, immediately return False.
@@ -46,8 +350,8 @@ def is_same_image(
     Arguments:
       img_path1, img_path2 : filepaths to the two images to compare.
       camera_id, spot_number : optional identifiers for a parking spot. If
-        provided, the bounding box will be looked up in the database and both
-        images will be cropped prior to comparison.
+        provided, the bounding box will be looked up in the spot index and
+        both images will be cropped prior to comparison.
       min_match_count      : minimum number of “good matches” before attempting
         homography. Defaults to 50.
       inlier_ratio_thresh  : fraction of inliers vs. good_matches to consider
@@ -56,106 +360,23 @@ def is_same_image(
     Returns:
       True  if images are “same” under these criteria,
       False otherwise.
+
+    The per-spot entry path uses ``spot_features.SpotFeatureCache`` instead,
+    which keeps the features of the previous image between calls.
     """
-    # return False
-    # 1) Load grayscale
-    img1 = cv2.imread(img_path1, cv2.IMREAD_GRAYSCALE)
-    img2 = cv2.imread(img_path2, cv2.IMREAD_GRAYSCALE)
+    img1 = load_spot_gray(img_path1, camera_id, spot_number)
+    img2 = load_spot_gray(img_path2, camera_id, spot_number)
     if img1 is None or img2 is None:
         # If we can’t load, treat as different
         return False
 
-    # 1a) Optionally resize very large images down to a max dimension (e.g. 800px)
-    def resize_max(img, max_dim=800):
-        h, w = img.shape[:2]
-        if max(h, w) <= max_dim:
-            return img
-        scale = max_dim / float(max(h, w))
-        return cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
-
-    img1 = resize_max(img1, 800)
-    img2 = resize_max(img2, 800)
-
-    # Optional crop based on parking spot bbox looked up from DB
-    if camera_id is not None and spot_number is not None:
-        try:
-            from db import SessionLocal
-            from models import Spot
-
-            db = SessionLocal()
-            spot = (
-                db.query(Spot)
-                .filter_by(camera_id=camera_id, spot_number=spot_number)
-                .first()
-            )
-        finally:
-            try:
-                db.close()
-            except Exception:
-                pass
-
-        if spot:
-            x1, y1, x2, y2 = int(spot.bbox_x1), int(spot.bbox_y1), int(spot.bbox_x2), int(spot.bbox_y2)
-
-            h, w = img1.shape[:2]
-            x1a, x2a = max(0, min(x1, w)), max(0, min(x2, w))
-            y1a, y2a = max(0, min(y1, h)), max(0, min(y2, h))
-            if x2a > x1a and y2a > y1a:
-                img1 = img1[y1a:y2a, x1a:x2a]
-
-            h2, w2 = img2.shape[:2]
-            x1b, x2b = max(0, min(x1, w2)), max(0, min(x2, w2))
-            y1b, y2b = max(0, min(y1, h2)), max(0, min(y2, h2))
-            if x2b > x1b and y2b > y1b:
-                img2 = img2[y1b:y2b, x1b:x2b]
-
-    # Early checks using simple hashing. Identical arrays or nearly identical
-    # average hashes indicate the images are the same without running the more
-    # expensive feature matcher.
-    if img1.shape == img2.shape:
-        if np.array_equal(img1, img2):
-            return True
-        h1 = _avg_hash(img1)
-        h2 = _avg_hash(img2)
-        if _hash_diff(h1, h2) <= 5:
-            return True
-
-    # 2) Detect SIFT keypoints and descriptors
-    sift = cv2.SIFT_create()
-    kp1, des1 = sift.detectAndCompute(img1, None)
-    kp2, des2 = sift.detectAndCompute(img2, None)
-    if des1 is None or des2 is None or len(kp1) < 10 or len(kp2) < 10:
-        # Not enough features: treat as different
-        return False
+    # Hash, ORB and SIFT stages run cheapest first; see
+    # ``spot_features.ComparisonCascade``.
+    from spot_features import SAME_CAR_CASCADE, SpotFeatures
 
-    # 3) FLANN-based matcher setup
-    FLANN_INDEX_KDTREE = 1
-    index_params = dict(algorithm=FLANN_INDEX_KDTREE, trees=5)
-    search_params = dict(checks=50)
-    flann = cv2.FlannBasedMatcher(index_params, search_params)
-
-    # 4) KNN match (k=2) + Lowe's ratio test
-    matches = flann.knnMatch(des1, des2, k=2)
-    good_matches = []
-    for m, n in matches:
-        if m.distance < 0.7 * n.distance:
-            good_matches.append(m)
-
-    # 5) If too few good matches, return False
-    if len(good_matches) < min_match_count:
-        return False
-
-    # 6) Prepare points for findHomography
-    src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-    dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-
-    # 7) Compute homography with RANSAC
-    M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-    if mask is None:
-        return False
-
-    inliers = mask.ravel().tolist().count(1)
-    inlier_ratio = inliers / float(len(good_matches))
-
-    # 8) Decide “same” if inlier ratio exceeds threshold
-    return inlier_ratio >= inlier_ratio_thresh
+    return SAME_CAR_CASCADE.compare(
+        SpotFeatures.from_gray(img1),
+        SpotFeatures.from_gray(img2),
+        min_match_count=min_match_count,
+        inlier_ratio_thresh=inlier_ratio_thresh,
+    )